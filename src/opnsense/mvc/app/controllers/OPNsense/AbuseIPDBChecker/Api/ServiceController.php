@@ -196,6 +196,11 @@ class ServiceController extends ApiMutableServiceControllerBase
         $limit = (int)$this->request->get('limit', 'int', 20);
         $search = $this->request->get('search', 'string', '');
         $include_marked_safe = $this->request->get('include_marked_safe', 'string', 'true') === 'true';
+        // Opaque keyset cursor from the previous response, replaces the offset when set
+        $cursor = $this->request->get('cursor', 'string', '');
+        if (!preg_match('/^[A-Za-z0-9_=-]*$/', $cursor)) {
+            $cursor = '';
+        }
         
         $offset = ($page - 1) * $limit;
         
@@ -204,18 +209,22 @@ class ServiceController extends ApiMutableServiceControllerBase
             escapeshellarg($limit) . " " . 
             escapeshellarg($offset) . " " . 
             escapeshellarg($search) . " " .
-            escapeshellarg($include_marked_safe ? '1' : '0'));
+            escapeshellarg($include_marked_safe ? '1' : '0') . " " .
+            escapeshellarg($cursor));
             
         $bckresult = json_decode(trim($response), true);
         if ($bckresult !== null) {
             // Add pagination info
             if (isset($bckresult['total_count'])) {
+                // Unfiltered totals may be cached for a minute, so the cursors decide next/prev
                 $bckresult['pagination'] = [
                     'page' => $page,
                     'limit' => $limit,
-                    'total_pages' => ceil($bckresult['total_count'] / $limit),
-                    'has_next' => ($offset + $limit) < $bckresult['total_count'],
-                    'has_prev' => $page > 1
+                    'total_pages' => max($page, ceil($bckresult['total_count'] / $limit)),
+                    'has_next' => !empty($bckresult['next_cursor']),
+                    'has_prev' => $page > 1 || !empty($bckresult['prev_cursor']),
+                    'next_cursor' => $bckresult['next_cursor'] ?? '',
+                    'prev_cursor' => $bckresult['prev_cursor'] ?? ''
                 ];
             }
             return $bckresult;
@@ -360,8 +369,11 @@ class ServiceController extends ApiMutableServiceControllerBase
      */
     public function listipsAction()
     {
+        // Optional: only IPs seen in the last N minutes (0 = recent log lines)
+        $minutes = (int)$this->request->get('minutes', 'int', 0);
+        
         $backend = new Backend();
-        $response = $backend->configdRun("abuseipdbchecker listips");
+        $response = $backend->configdRun("abuseipdbchecker listips " . escapeshellarg($minutes));
         $bckresult = json_decode(trim($response), true);
         if ($bckresult !== null) {
             return $bckresult;
@@ -369,6 +381,27 @@ class ServiceController extends ApiMutableServiceControllerBase
         return ["status" => "failed", "message" => "Unable to retrieve external IPs"];
     }
 
+    /**
+     * list recent connections for one IP from the stored flows
+     */
+    public function connectionsAction()
+    {
+        $ip = $this->request->get('ip', 'string', '');
+        $limit = (int)$this->request->get('limit', 'int', 100);
+        
+        if (!filter_var($ip, FILTER_VALIDATE_IP, FILTER_FLAG_IPV4)) {
+            return array("status" => "failed", "message" => "Invalid IP address format");
+        }
+        
+        $backend = new Backend();
+        $response = $backend->configdRun("abuseipdbchecker connections " . escapeshellarg($ip) . " " . escapeshellarg($limit));
+        $bckresult = json_decode(trim($response), true);
+        if ($bckresult !== null) {
+            return $bckresult;
+        }
+        return ["status" => "failed", "message" => "Unable to retrieve connections"];
+    }
+
     public function batchstatusAction()
     {
         $backend = new Backend();
@@ -421,6 +454,11 @@ class ServiceController extends ApiMutableServiceControllerBase
         $page = (int)$this->request->get('page', 'int', 1);
         $limit = (int)$this->request->get('limit', 'int', 20);
         $search = $this->request->get('search', 'string', '');
+        // Opaque keyset cursor from the previous response, replaces the offset when set
+        $cursor = $this->request->get('cursor', 'string', '');
+        if (!preg_match('/^[A-Za-z0-9_=-]*$/', $cursor)) {
+            $cursor = '';
+        }
         
         $offset = ($page - 1) * $limit;
         
@@ -428,18 +466,22 @@ class ServiceController extends ApiMutableServiceControllerBase
         $response = $backend->configdRun("abuseipdbchecker allips " . 
             escapeshellarg($limit) . " " . 
             escapeshellarg($offset) . " " . 
-            escapeshellarg($search));
+            escapeshellarg($search) . " " .
+            escapeshellarg($cursor));
             
         $bckresult = json_decode(trim($response), true);
         if ($bckresult !== null) {
             // Add pagination info
             if (isset($bckresult['total_count'])) {
+                // Unfiltered totals may be cached for a minute, so the cursors decide next/prev
                 $bckresult['pagination'] = [
                     'page' => $page,
                     'limit' => $limit,
-                    'total_pages' => ceil($bckresult['total_count'] / $limit),
-                    'has_next' => ($offset + $limit) < $bckresult['total_count'],
-                    'has_prev' => $page > 1
+                    'total_pages' => max($page, ceil($bckresult['total_count'] / $limit)),
+                    'has_next' => !empty($bckresult['next_cursor']),
+                    'has_prev' => $page > 1 || !empty($bckresult['prev_cursor']),
+                    'next_cursor' => $bckresult['next_cursor'] ?? '',
+                    'prev_cursor' => $bckresult['prev_cursor'] ?? ''
                 ];
             }
             return $bckresult;
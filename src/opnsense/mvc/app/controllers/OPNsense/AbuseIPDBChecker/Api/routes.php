@@ -15,6 +15,7 @@ $router->addRoute('/abuseipdbchecker/service/threats', 'OPNsense\AbuseIPDBChecke
 $router->addRoute('/abuseipdbchecker/service/logs', 'OPNsense\AbuseIPDBChecker\Api\ServiceController', 'logsAction');
 $router->addRoute('/abuseipdbchecker/service/testip', 'OPNsense\AbuseIPDBChecker\Api\ServiceController', 'testipAction');
 $router->addRoute('/abuseipdbchecker/service/listips', 'OPNsense\AbuseIPDBChecker\Api\ServiceController', 'listipsAction');
+$router->addRoute('/abuseipdbchecker/service/connections', 'OPNsense\AbuseIPDBChecker\Api\ServiceController', 'connectionsAction');
 $router->addRoute('/abuseipdbchecker/service/allips', 'OPNsense\AbuseIPDBChecker\Api\ServiceController', 'allipsAction');
 $router->addRoute('/abuseipdbchecker/service/updatealias', 'OPNsense\AbuseIPDBChecker\Api\ServiceController', 'updatealiasAction');
 $router->addRoute('/abuseipdbchecker/service/exportthreats', 'OPNsense\AbuseIPDBChecker\Api\ServiceController', 'exportthreatsAction');
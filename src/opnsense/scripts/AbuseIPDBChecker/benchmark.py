@@ -0,0 +1,576 @@
+#!/usr/local/bin/python3
+
+"""
+AbuseIPDB Checker - Performance Benchmarks
+Measures firewall log parsing throughput on synthetic filterlog data
+and database write/query performance
+
+Usage: benchmark.py {classifier|parser} [lines]
+       benchmark.py suite [lines ...]          (default 10000 1000000 10000000)
+       benchmark.py database [writes]          (default 2000)
+       benchmark.py plans [rows]               (default 1000000, exits 1 on a scan or temp sort)
+       benchmark.py generate <lines> <file>
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import resource
+import tempfile
+import ipaddress
+import tracemalloc
+import multiprocessing
+from datetime import datetime, timezone
+
+# Add lib directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'lib'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from lib.log_parser import FirewallLogParser
+from lib.database import DatabaseManager
+
+BENCH_CONFIG = {
+    'log_file': '/var/log/filter/latest.log',
+    'lan_subnets': ['192.168.0.0/16', '10.0.0.0/8', '172.16.0.0/12'],
+    'ignore_protocols': ['icmp', 'igmp'],
+    'ignore_blocked_connections': False
+}
+
+def generate_lines(count, seed=42):
+    """Generate filterlog lines from a small pool of scanners hitting LAN hosts"""
+    rng = random.Random(seed)
+    scanners = [str(ipaddress.IPv4Address(rng.randint(0x01000000, 0xDFFFFFFF))) for _ in range(2000)]
+    lan_hosts = [f"192.168.1.{i}" for i in range(1, 255)]
+    lines = []
+
+    for i in range(count):
+        src = rng.choice(scanners)
+        dst = rng.choice(lan_hosts)
+        if rng.random() < 0.3:
+            src, dst = dst, src  # Outbound traffic, must be rejected
+        lines.append(
+            f"<134>1 2025-06-12T10:15:30+02:00 OPNsense.localdomain filterlog 12345 - [meta sequenceId=\"{i}\"] "
+            f"96,,,fae559338f65e11c53669fc3642c93c2,igb0,match,pass,in,4,0x0,,64,12345,0,DF,6,tcp,60,"
+            f"{src},{dst},{rng.randint(1024, 65535)},{rng.choice([22, 80, 443, 3389])},0,S,123456789,,64240,,mss\n"
+        )
+    return lines
+
+# Default traffic mix for generated logs, each value is a probability
+DEFAULT_MIX = {
+    'ipv6': 0.1,  # IPv6 records (ignored by the parser)
+    'block': 0.4,  # Blocked instead of passed
+    'inbound': 0.6,  # WAN -> LAN, the rest is LAN -> WAN
+    'udp': 0.2,
+    'icmp': 0.1,  # Remaining protocol share is TCP
+    'malformed': 0.02  # Truncated or garbage lines
+}
+
+SUITE_SIZES = [10000, 1000000, 10000000]
+SUITE_TARGETS = ['parse_log_for_ips', 'parse_log_for_ips_with_connections', 'list_external_to_internal_connections']
+
+class FilterlogGenerator:
+    """Produces realistic OPNsense filterlog lines with a configurable traffic mix"""
+
+    def __init__(self, mix=None, seed=42, start_time=1750000000, lines_per_second=200):
+        self.mix = dict(DEFAULT_MIX, **(mix or {}))
+        self.rng = random.Random(seed)
+        self.start_time = start_time
+        self.lines_per_second = lines_per_second
+        rng = self.rng
+
+        self.wan_v4 = [str(ipaddress.IPv4Address(rng.randint(0x01000000, 0xDFFFFFFF))) for _ in range(5000)]
+        self.lan_v4 = [f"192.168.{rng.randint(0, 3)}.{rng.randint(1, 254)}" for _ in range(200)]
+        self.wan_v6 = [f"2a0{rng.randint(0, 9)}:{rng.randint(0, 0xffff):x}::{rng.randint(1, 0xffff):x}" for _ in range(1000)]
+        self.lan_v6 = [f"fd00::{rng.randint(1, 0xffff):x}" for _ in range(100)]
+
+    def _timestamp(self, index):
+        """RFC 5424 timestamp advancing with the line index"""
+        epoch = self.start_time + index // self.lines_per_second
+        return datetime.fromtimestamp(epoch, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S+00:00')
+
+    def line(self, index):
+        """Build one filterlog line"""
+        rng = self.rng
+        mix = self.mix
+        header = (f"<134>1 {self._timestamp(index)} OPNsense.localdomain filterlog 12345 - "
+                  f"[meta sequenceId=\"{index}\"] ")
+
+        if rng.random() < mix['malformed']:
+            if rng.random() < 0.5:
+                return header + "96,,,fae559338f65e11c53669fc3642c93c2,igb0,match,pass,in,4,0x0\n"
+            return f"<134>1 {self._timestamp(index)} OPNsense.localdomain filterlog 12345 - garbage\n"
+
+        action = 'block' if rng.random() < mix['block'] else 'pass'
+        roll = rng.random()
+        if roll < mix['icmp']:
+            proto_num, proto = 1, 'icmp'
+        elif roll < mix['icmp'] + mix['udp']:
+            proto_num, proto = 17, 'udp'
+        else:
+            proto_num, proto = 6, 'tcp'
+
+        inbound = rng.random() < mix['inbound']
+        prefix = f"96,,,fae559338f65e11c53669fc3642c93c2,{'igb0' if inbound else 'igb1'},match,{action},{'in' if inbound else 'out'},"
+
+        if rng.random() < mix['ipv6']:
+            src, dst = rng.choice(self.wan_v6), rng.choice(self.lan_v6)
+            if not inbound:
+                src, dst = dst, src
+            body = f"6,0x00,0x00000,64,{proto},{proto_num},40,{src},{dst},"
+        else:
+            src, dst = rng.choice(self.wan_v4), rng.choice(self.lan_v4)
+            if not inbound:
+                src, dst = dst, src
+            body = f"4,0x0,,64,{rng.randint(1, 65535)},0,DF,{proto_num},{proto},60,{src},{dst},"
+
+        if proto_num == 6:
+            tail = f"{rng.randint(1024, 65535)},{rng.choice([22, 80, 443, 445, 3389, 8080])},0,S,{rng.randint(1, 4294967295)},,64240,,mss"
+        elif proto_num == 17:
+            tail = f"{rng.randint(1024, 65535)},{rng.choice([53, 123, 161, 1900, 5060])},48"
+        else:
+            tail = f"request,{rng.randint(1, 65535)},{rng.randint(1, 100)}"
+
+        return header + prefix + body + tail + "\n"
+
+    def write(self, path, count, buffer_lines=10000):
+        """Stream count lines to path without holding them in memory"""
+        with open(path, 'w') as f:
+            buffer = []
+            for index in range(count):
+                buffer.append(self.line(index))
+                if len(buffer) >= buffer_lines:
+                    f.write(''.join(buffer))
+                    buffer = []
+            f.write(''.join(buffer))
+        return path
+
+def _legacy_validate_external_to_internal(lan_networks):
+    """Original per-line ipaddress implementation, kept as the benchmark baseline"""
+    def validate(src_ip, dst_ip):
+        try:
+            src_ip_obj = ipaddress.ip_address(src_ip)
+            dst_ip_obj = ipaddress.ip_address(dst_ip)
+
+            if (src_ip_obj.is_loopback or src_ip_obj.is_multicast or
+                    src_ip_obj.is_reserved or src_ip_obj.is_link_local):
+                return None
+
+            src_is_external = not src_ip_obj.is_private
+            for network in lan_networks:
+                if src_ip_obj in network:
+                    src_is_external = False
+                    break
+
+            dst_is_internal = dst_ip_obj.is_private
+            for network in lan_networks:
+                if dst_ip_obj in network:
+                    dst_is_internal = True
+                    break
+
+            if src_is_external and dst_is_internal:
+                return src_ip
+        except ValueError:
+            pass
+        return None
+    return validate
+
+def _legacy_parse_lines(config, lines):
+    """Original per-line parser (full split, per-field strip, per-line ignore list), benchmark baseline"""
+    parser = FirewallLogParser(config)
+    validate = _legacy_validate_external_to_internal(parser.lan_networks)
+    protocol_map = {1: 'icmp', 2: 'igmp', 6: 'tcp', 17: 'udp'}
+    external_connections = {}
+
+    for line in lines:
+        if not line.strip() or 'filterlog' not in line:
+            continue
+        if '] ' not in line:
+            continue
+
+        fields = line.split('] ', 1)[1].split(',')
+        if len(fields) < 22:
+            continue
+
+        action = fields[6].strip() if len(fields) > 6 else ''
+        ip_version = fields[8].strip() if len(fields) > 8 else ''
+        if ip_version != '4':
+            continue
+        if config['ignore_blocked_connections'] and action.lower() == 'block':
+            continue
+
+        try:
+            protocol_num = int(fields[15].strip()) if fields[15].strip() else 0
+            proto_name = protocol_map.get(protocol_num, '')
+            if proto_name and proto_name.lower() in [p.lower() for p in config['ignore_protocols']]:
+                continue
+        except (ValueError, IndexError):
+            pass
+
+        src_ip = fields[18].strip()
+        dst_ip = fields[19].strip()
+        src_port = fields[20].strip()
+        dst_port = fields[21].strip()
+        if not src_ip or not dst_ip:
+            continue
+
+        external_ip = validate(src_ip, dst_ip)
+        if external_ip:
+            src_port_str = src_port if src_port and src_port.isdigit() else 'unknown'
+            dst_port_str = dst_port if dst_port and dst_port.isdigit() else 'unknown'
+            external_connections.setdefault(external_ip, set()).add(
+                f"{src_ip}:{src_port_str} accessing {dst_ip}:{dst_port_str}")
+
+    return external_connections
+
+def _time_parse(parser, lines):
+    """Return (lines/sec, ip -> connections) for parsing lines with the given parser"""
+    start = time.perf_counter()
+    result = parser.parse_lines_for_ips_with_connections(lines)
+    elapsed = time.perf_counter() - start
+    return len(lines) / elapsed if elapsed > 0 else 0, result
+
+def bench_classifier(line_count=200000):
+    """Compare lines/sec of the legacy ipaddress classifier with the precompiled one"""
+    lines = generate_lines(line_count)
+
+    legacy_parser = FirewallLogParser(BENCH_CONFIG)
+    legacy_parser._validate_external_to_internal = _legacy_validate_external_to_internal(legacy_parser.lan_networks)
+    legacy_rate, legacy_result = _time_parse(legacy_parser, lines)
+
+    parser = FirewallLogParser(BENCH_CONFIG)
+    rate, result = _time_parse(parser, lines)
+
+    return {
+        'status': 'ok',
+        'benchmark': 'classifier',
+        'lines': line_count,
+        'legacy_lines_per_sec': round(legacy_rate),
+        'precompiled_lines_per_sec': round(rate),
+        'speedup': round(rate / legacy_rate, 2) if legacy_rate else None,
+        'unique_ips': len(result),
+        'results_match': legacy_result == result,
+        'cache': parser.classifier.cache_info()._asdict()
+    }
+
+def bench_parser(line_count=1000000):
+    """Compare lines/sec of the original line parser with the single-pass FilterRecord parser"""
+    lines = generate_lines(line_count)
+
+    start = time.perf_counter()
+    legacy_result = _legacy_parse_lines(BENCH_CONFIG, lines)
+    legacy_elapsed = time.perf_counter() - start
+    legacy_rate = line_count / legacy_elapsed if legacy_elapsed > 0 else 0
+
+    rate, result = _time_parse(FirewallLogParser(BENCH_CONFIG), lines)
+
+    return {
+        'status': 'ok',
+        'benchmark': 'parser',
+        'lines': line_count,
+        'legacy_lines_per_sec': round(legacy_rate),
+        'single_pass_lines_per_sec': round(rate),
+        'speedup': round(rate / legacy_rate, 2) if legacy_rate else None,
+        'unique_ips': len(result),
+        'results_match': legacy_result == result
+    }
+
+def _run_target(target, log_file, trace):
+    """Child process body: run one parser entry point over the whole log and measure it"""
+    config = dict(BENCH_CONFIG, log_file=log_file)
+    parser = FirewallLogParser(config)
+    method = getattr(parser, target)
+
+    if trace:
+        tracemalloc.start()
+    blocks_before = sys.getallocatedblocks()
+    start = time.perf_counter()
+
+    # since=0 streams the whole file instead of the last N lines
+    result = method(since=0)
+
+    elapsed = time.perf_counter() - start
+    if isinstance(result, dict) and 'status' in result:
+        result_size = result.get('total_connections', 0)
+    else:
+        result_size = len(result)
+
+    stats = {'elapsed': elapsed, 'result_size': result_size}
+    if trace:
+        stats['traced_peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        # Blocks still alive after the call, i.e. what the result retains
+        stats['allocated_blocks'] = sys.getallocatedblocks() - blocks_before
+        tracemalloc.stop()
+
+    # ru_maxrss is KiB on Linux/FreeBSD
+    stats['peak_rss_kib'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return stats
+
+def _measure(target, log_file, trace=False):
+    """Run a target in a fresh process so peak RSS is per benchmark"""
+    with multiprocessing.Pool(1, maxtasksperchild=1) as pool:
+        return pool.apply(_run_target, (target, log_file, trace))
+
+def bench_suite(*sizes):
+    """Lines/sec, peak RSS and allocations of the parser entry points at several log sizes"""
+    sizes = list(sizes) or SUITE_SIZES
+    results = []
+
+    with tempfile.TemporaryDirectory(prefix='abuseipdb-bench-') as work_dir:
+        for size in sizes:
+            log_file = os.path.join(work_dir, f'filter_{size}.log')
+            start = time.perf_counter()
+            FilterlogGenerator().write(log_file, size)
+            generate_seconds = time.perf_counter() - start
+
+            for target in SUITE_TARGETS:
+                timing = _measure(target, log_file)
+                # Allocation tracing slows parsing down, so it gets its own run
+                allocations = _measure(target, log_file, trace=True)
+                results.append({
+                    'target': target,
+                    'lines': size,
+                    'lines_per_sec': round(size / timing['elapsed']) if timing['elapsed'] else None,
+                    'seconds': round(timing['elapsed'], 3),
+                    'peak_rss_kib': timing['peak_rss_kib'],
+                    'traced_peak_bytes': allocations['traced_peak_bytes'],
+                    'allocated_blocks': allocations['allocated_blocks'],
+                    'result_size': timing['result_size']
+                })
+
+            results.append({'target': 'generate', 'lines': size, 'seconds': round(generate_seconds, 3),
+                            'file_bytes': os.path.getsize(log_file)})
+            os.unlink(log_file)
+
+    return {'status': 'ok', 'benchmark': 'suite', 'mix': DEFAULT_MIX, 'results': results}
+
+DB_BENCH_SEED_ROWS = 20000  # checked_ips rows present before measuring, a tenth of them threats
+DB_BENCH_UI_SECONDS = 5  # Length of the UI query phase under a concurrent writer
+
+class _LegacyDatabaseManager(DatabaseManager):
+    """Connection per statement in rollback journal mode, the benchmark baseline"""
+
+    def get_connection(self):
+        conn = sqlite3.connect(self.db_file)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def close(self):
+        pass
+
+def _bench_db_manager(db_file, legacy):
+    """Database manager for one benchmark variant"""
+    return _LegacyDatabaseManager(db_file) if legacy else DatabaseManager(db_file)
+
+def _seed_database(db_file, legacy, rows):
+    """Create the schema and bulk insert checked IPs spread over 30 days, a tenth of them threats"""
+    db = _bench_db_manager(db_file, legacy)
+    newest = time.time()
+
+    def checked_rows():
+        for index in range(rows):
+            ip = str(ipaddress.IPv4Address(0x0B000000 + index))
+            checked = datetime.fromtimestamp(newest - (index * 7919 % rows) * 2592000 / rows).strftime('%Y-%m-%d %H:%M:%S')
+            threat_level = 2 if index % 10 == 0 else 1 if index % 10 == 1 else 0
+            yield (ip, checked, checked, 1, threat_level, 'US', '', f"{ip}:40000 accessing 192.168.1.10:22")
+
+    def threat_rows():
+        rng = random.Random(42)
+        for row in checked_rows():
+            if row[4]:
+                yield (row[0], rng.randint(25, 100), rng.randint(1, 500), row[2], '18,22', 'US', row[4], int(rng.random() < 0.05))
+
+    conn = db.get_connection()
+    with conn:
+        conn.executemany('INSERT INTO checked_ips (ip, first_seen, last_checked, check_count, threat_level, country, '
+                         'destination_port, connection_details) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', checked_rows())
+        conn.executemany('INSERT INTO threats (ip, abuse_score, reports, last_seen, categories, country, threat_level, '
+                         'marked_safe) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', threat_rows())
+    db.close()
+
+def _write_verdicts(db, rng, count):
+    """Store count daemon-style check results, returns the number written"""
+    for _ in range(count):
+        ip = str(ipaddress.IPv4Address(0x0C000000 + rng.randint(0, 200000)))
+        threat_level = 2 if rng.random() < 0.1 else 0
+        db.update_checked_ip(ip, threat_level, 'US', f"{ip}:40000 accessing 192.168.1.10:22")
+        if threat_level:
+            db.update_threat(ip, rng.randint(50, 100), rng.randint(1, 500), '18,22', 'US')
+        db.update_stat('total_checks', str(rng.randint(0, 100000)))
+    return count
+
+def _db_writer(db_file, legacy, stop, written):
+    """Child process body: write verdicts like the daemon until stopped"""
+    db = _bench_db_manager(db_file, legacy)
+    rng = random.Random(os.getpid())
+    while not stop.is_set():
+        _write_verdicts(db, rng, 10)
+        with written.get_lock():
+            written.value += 10
+    db.close()
+
+def _percentile(samples, fraction):
+    """Nearest-rank percentile of a list of samples"""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else None
+
+def _bench_db_variant(work_dir, legacy, write_count):
+    """Writes/sec alone, then UI page latency while a daemon process keeps writing"""
+    db_file = os.path.join(work_dir, 'legacy.db' if legacy else 'wal.db')
+    _seed_database(db_file, legacy, DB_BENCH_SEED_ROWS)
+
+    db = _bench_db_manager(db_file, legacy)
+    start = time.perf_counter()
+    _write_verdicts(db, random.Random(7), write_count)
+    write_seconds = time.perf_counter() - start
+    db.close()
+
+    stop = multiprocessing.Event()
+    written = multiprocessing.Value('l', 0)
+    writer = multiprocessing.Process(target=_db_writer, args=(db_file, legacy, stop, written))
+    writer.start()
+
+    latencies = []
+    deadline = time.perf_counter() + DB_BENCH_UI_SECONDS
+    while time.perf_counter() < deadline:
+        # Each configd call is a new process with its own manager
+        request_start = time.perf_counter()
+        ui_db = _bench_db_manager(db_file, legacy)
+        ui_db.get_recent_threats(limit=20, offset=0)
+        ui_db.get_all_checked_ips(limit=20, offset=0)
+        ui_db.close()
+        latencies.append((time.perf_counter() - request_start) * 1000)
+
+    stop.set()
+    writer.join()
+
+    return {
+        'journal_mode': 'delete, connection per statement' if legacy else 'wal, persistent connection',
+        'writes_per_sec': round(write_count / write_seconds) if write_seconds else None,
+        'concurrent_writes_per_sec': round(written.value / DB_BENCH_UI_SECONDS),
+        'ui_requests': len(latencies),
+        'ui_latency_ms_p50': round(_percentile(latencies, 0.5), 2),
+        'ui_latency_ms_p95': round(_percentile(latencies, 0.95), 2),
+        'ui_latency_ms_max': round(max(latencies), 2)
+    }
+
+def bench_database(write_count=2000):
+    """Compare the per-statement rollback-journal connection with the persistent WAL connection"""
+    with tempfile.TemporaryDirectory(prefix='abuseipdb-bench-') as work_dir:
+        legacy = _bench_db_variant(work_dir, True, write_count)
+        wal = _bench_db_variant(work_dir, False, write_count)
+
+    return {
+        'status': 'ok',
+        'benchmark': 'database',
+        'writes': write_count,
+        'seed_rows': DB_BENCH_SEED_ROWS,
+        'legacy': legacy,
+        'wal': wal,
+        'write_speedup': round(wal['writes_per_sec'] / legacy['writes_per_sec'], 2) if legacy['writes_per_sec'] else None
+    }
+
+PLAN_SEED_ROWS = 1000000
+PLAN_SMALL_TABLES = {'stats'}  # A handful of rows, scanning them is fine
+
+def _run_hot_queries(db):
+    """Call every hot UI/daemon query path once"""
+    db.get_threat_ips_for_alias(2, 500)
+    db.get_ips_needing_check(7)
+    db.get_statistics_summary({'alias_include_suspicious': True})
+    threats = db.get_recent_threats(limit=20, offset=20)
+    db.get_recent_threats(limit=20, cursor=threats['next_cursor'])
+    db.get_recent_threats(limit=20, cursor=threats['prev_cursor'])
+    db.get_recent_threats(limit=20, offset=0, include_marked_safe=False)
+    ips = db.get_all_checked_ips(limit=20, offset=20)
+    db.get_all_checked_ips(limit=20, cursor=ips['next_cursor'])
+    db.get_all_checked_ips(limit=20, cursor=ips['prev_cursor'])
+
+def _plan_violations(plan):
+    """Full table scans and temp B-tree sorts in EXPLAIN QUERY PLAN detail lines"""
+    violations = []
+    for detail in plan:
+        words = detail.split()
+        if words[:1] == ['SCAN'] and 'USING' not in words and words[1] not in PLAN_SMALL_TABLES:
+            violations.append(detail)
+        elif 'TEMP B-TREE' in detail and 'RIGHT PART OF ORDER BY' not in detail:
+            # A right-part sort only orders ties of an index-ordered leading column (alias export)
+            violations.append(detail)
+    return violations
+
+def bench_plans(rows=PLAN_SEED_ROWS):
+    """Fail if any hot query falls back to a full table scan or a temp B-tree sort on a large database"""
+    with tempfile.TemporaryDirectory(prefix='abuseipdb-bench-') as work_dir:
+        db_file = os.path.join(work_dir, 'plans.db')
+        start = time.perf_counter()
+        _seed_database(db_file, False, rows)
+        seed_seconds = time.perf_counter() - start
+
+        db = DatabaseManager(db_file)
+        conn = db.get_connection()
+        statements = []
+        # Bound parameters are inlined in traced statements, so each can be explained as is
+        conn.set_trace_callback(statements.append)
+        start = time.perf_counter()
+        _run_hot_queries(db)
+        query_seconds = time.perf_counter() - start
+        conn.set_trace_callback(None)
+
+        queries = []
+        for statement in statements:
+            if not statement.lstrip().upper().startswith('SELECT'):
+                continue
+            plan = [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {statement}')]
+            queries.append({
+                'query': ' '.join(statement.split()),
+                'plan': plan,
+                'violations': _plan_violations(plan)
+            })
+        db.close()
+
+    failed = [query for query in queries if query['violations']]
+    return {
+        'status': 'failed' if failed else 'ok',
+        'benchmark': 'plans',
+        'rows': rows,
+        'seed_seconds': round(seed_seconds, 3),
+        'query_seconds': round(query_seconds, 3),
+        'queries_checked': len(queries),
+        'failed': len(failed),
+        'queries': queries
+    }
+
+def generate(count, path):
+    """Write a synthetic filterlog file for manual testing"""
+    start = time.perf_counter()
+    FilterlogGenerator().write(path, count)
+    return {'status': 'ok', 'file': path, 'lines': count, 'seconds': round(time.perf_counter() - start, 3)}
+
+def main():
+    """Run the selected benchmark and print JSON results"""
+    benchmarks = {
+        'classifier': bench_classifier,
+        'parser': bench_parser,
+        'suite': bench_suite,
+        'database': bench_database,
+        'plans': bench_plans
+    }
+
+    if len(sys.argv) == 4 and sys.argv[1] == 'generate' and sys.argv[2].isdigit():
+        print(json.dumps(generate(int(sys.argv[2]), sys.argv[3]), indent=2))
+        return
+
+    if len(sys.argv) < 2 or sys.argv[1] not in benchmarks:
+        print(json.dumps({'status': 'error', 'message': f"Usage: benchmark.py {{{'|'.join(benchmarks)}}} [lines] | generate <lines> <file>"}))
+        sys.exit(1)
+
+    args = [int(arg) for arg in sys.argv[2:] if arg.isdigit()]
+    result = benchmarks[sys.argv[1]](*args)
+    print(json.dumps(result, indent=2))
+    if result['status'] != 'ok':
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -7,10 +7,11 @@ With IP management, pagination, search, and port tracking features
 
 import os
 import sys
+import time
 import json
 import argparse
 import subprocess
-from datetime import datetime
+from datetime import datetime, timedelta
 
 # Add lib directory to Python path
 lib_path = os.path.join(os.path.dirname(__file__), 'lib')
@@ -39,6 +40,8 @@ except ImportError as e:
     print(f'{{"status": "error", "message": "Missing required modules: {str(e)}"}}')
     sys.exit(1)
 
+FLOW_LISTING_MINUTES = 60  # Default window for listing IPs from stored flows
+
 class AbuseIPDBChecker:
     """Enhanced main orchestrator class for all AbuseIPDB operations"""
     
@@ -51,43 +54,135 @@ class AbuseIPDBChecker:
         
         # Get current configuration
         self.config = self.config_manager.get_config()
+        self.api_client = None  # Created on first API use
+    
+    def _get_api_client(self):
+        """API client with persisted quota state and the shared response cache"""
+        if self.api_client is None:
+            from lib.response_cache import ResponseCache
+            self.api_client = AbuseIPDBClient(self.config)
+            self.api_client.load_quota_state(self.db_manager.get_api_quota())
+            self.api_client.circuit_breaker.load_state(self.db_manager.get_circuit_state())
+            self.api_client.rate_limiter.set_daily_used(int(self.db_manager.get_stat('daily_checks', '0')))
+            self.api_client.cache = ResponseCache(self.db_manager, self.config)
+            self.api_client.cache.on_revalidated = self._apply_revalidated_report
+        return self.api_client
+    
+    def _apply_revalidated_report(self, ip, report, api_requests):
+        """Store a response refreshed in the background"""
+        # Empty details keep the connections already stored for the IP
+        self._process_ip_result_with_connections(ip, report, '')
+        # The request itself reaches daily_checks through the client's request count
+        if api_requests:
+            self.db_manager.increment_stats({'total_checks': 1})
     
-    def run_check(self):
+    def close(self):
+        """Let background cache revalidations finish and release the API client and database connection"""
+        if self.api_client is not None:
+            self.api_client.close()
+            # Revalidations that finished after the last check was counted
+            api_requests = self.api_client.take_request_count()
+            if api_requests:
+                self.db_manager.increment_stats({'daily_checks': api_requests})
+            self.db_manager.update_api_quota(self.api_client.get_quota_state())
+            self.db_manager.update_circuit_state(self.api_client.circuit_breaker.get_state())
+            self.api_client = None
+        self.db_manager.close()
+    
+    def run_check(self, include_rotated=False):
         """Run manual IP check from firewall logs with port extraction"""
-        log_message("Starting manual IP check operation")
+        log_message(f"Starting manual IP check operation (include_rotated={include_rotated})")
 
         validation = self.config_manager.validate_config()
         if validation['errors']:
             return {'status': 'error', 'message': f"Configuration errors: {', '.join(validation['errors'])}"}
         
         try:
+            # Taken before parsing so lines logged during this check are scanned by the next one
+            scan_started = get_db_timestamp()
+            
             # Parse firewall logs for external IPs with ports
             parser = FirewallLogParser(self.config)
-            external_connections = parser.parse_log_for_ips_with_connections()
+            if include_rotated:
+                # Stream the current log plus rotated/compressed archives
+                external_connections = parser.parse_rotated_logs_for_ips_with_connections()
+            else:
+                # Only scan what was logged since the previous manual check, located by timestamp seek
+                since = self._get_last_check_time()
+                external_connections = parser.parse_log_for_ips_with_connections(since=since)
             
-            if not external_connections:
-                self.db_manager.update_stat('last_check', get_db_timestamp())
-                return {'status': 'ok', 'message': 'No external IPs found to check'}
+            result = self._check_external_connections(external_connections, 'Manual check')
+            if result['status'] == 'ok':
+                self.db_manager.update_stat('manual_last_check', scan_started)
+            return result
             
-            # Check daily limits
-            daily_checks = int(self.db_manager.get_stat('daily_checks', '0'))
-            daily_limit = self.config['daily_check_limit']
+        except Exception as e:
+            error_msg = f'Error during manual check: {str(e)}'
+            log_message(error_msg)
+            return {'status': 'error', 'message': error_msg}
+
+    def _get_last_check_time(self):
+        """Epoch time the previous manual check started scanning, else the recheck window"""
+        # Not last_check, which the daemon moves forward on every batch
+        last_check = self.db_manager.get_stat('manual_last_check')
+        try:
+            return datetime.strptime(last_check, '%Y-%m-%d %H:%M:%S').timestamp()
+        except (ValueError, TypeError):
+            return (datetime.now() - timedelta(days=self.config['check_frequency'])).timestamp()
+
+    def run_backfill(self, include_rotated=True, workers=None):
+        """Parse the whole log (and rotated archives) in parallel and check the unseen IPs"""
+        log_message(f"Starting backfill operation (include_rotated={include_rotated}, workers={workers or 'auto'})")
+
+        validation = self.config_manager.validate_config()
+        if validation['errors']:
+            return {'status': 'error', 'message': f"Configuration errors: {', '.join(validation['errors'])}"}
+        
+        try:
+            from lib.backfill import parallel_parse
+            from lib.log_reader import find_rotated_logs
             
-            if daily_checks >= daily_limit:
-                return {'status': 'limited', 'message': f'Daily API check limit reached ({daily_checks}/{daily_limit})'}
+            if include_rotated:
+                paths = find_rotated_logs(self.config['log_file'], self.config.get('log_archive_pattern'))
+            else:
+                paths = [self.config['log_file']] if os.path.exists(self.config['log_file']) else []
             
-            # Initialize API client and process IPs
-            api_client = AbuseIPDBClient(self.config)
-            result = self._process_manual_check_with_connections(external_connections, api_client)
+            if not paths:
+                return {'status': 'error', 'message': f"Log file not found: {self.config['log_file']}"}
             
-            log_message(f"Manual check completed: {result['ips_checked']} checked, {result['threats_detected']} threats")
+            external_connections = parallel_parse(self.config, paths, workers)
+            result = self._check_external_connections(external_connections, 'Backfill')
+            result['files_scanned'] = len(paths)
+            result['external_ips_found'] = len(external_connections)
             return result
             
         except Exception as e:
-            error_msg = f'Error during manual check: {str(e)}'
+            error_msg = f'Error during backfill: {str(e)}'
             log_message(error_msg)
             return {'status': 'error', 'message': error_msg}
 
+    def _check_external_connections(self, external_connections, operation):
+        """Check parsed external IPs against the API within the daily limit"""
+        if not external_connections:
+            self.db_manager.update_stat('last_check', get_db_timestamp())
+            return {'status': 'ok', 'message': 'No external IPs found to check'}
+        
+        # Check daily limits, capped by the quota last reported by the API
+        daily_checks = int(self.db_manager.get_stat('daily_checks', '0'))
+        daily_limit = self.config['daily_check_limit']
+        
+        if self.db_manager.get_remaining_checks(daily_limit) <= 0:
+            return {'status': 'limited', 'message': f'Daily API check limit reached ({daily_checks}/{daily_limit})'}
+        
+        # Initialize API client and process IPs
+        api_client = self._get_api_client()
+        result = self._process_manual_check_with_connections(external_connections, api_client)
+        self.db_manager.update_api_quota(api_client.get_quota_state())
+        self.db_manager.update_circuit_state(api_client.circuit_breaker.get_state())
+        
+        log_message(f"{operation} completed: {result['ips_checked']} checked, {result['threats_detected']} threats")
+        return result
+
     def _process_manual_check_with_connections(self, external_connections, api_client):
         """Process IPs for manual check with connection information"""
         threats_detected = 0
@@ -96,38 +191,49 @@ class AbuseIPDBChecker:
         daily_checks = int(self.db_manager.get_stat('daily_checks', '0'))
         daily_limit = self.config['daily_check_limit']
         
-        for ip, connections in external_connections.items():
-            if daily_checks >= daily_limit:
-                break
-            
-            # Check if IP needs to be checked
-            existing = self.db_manager.get_checked_ip(ip)
-            if existing and self._is_recent_check(existing):
+        # Skip IPs with a usable cached response before spending API calls, stale ones refresh in the background
+        from lib.response_cache import CACHE_EXPIRED, CACHE_NEGATIVE
+        ips_to_check = []
+        for ip in external_connections:
+            state, report = api_client.lookup_cache(ip)
+            if report is not None or state == CACHE_NEGATIVE:
                 continue
+            existing = self.db_manager.get_checked_ip(ip) if state != CACHE_EXPIRED else None
+            if existing and self._is_recent_check(existing):
+                continue  # Checked before the response cache existed
+            ips_to_check.append(ip)
+        
+        if ips_to_check:
+            api_client.rate_limiter.set_daily_used(daily_checks)
             
-            try:
-                # Check against API
-                report = api_client.check_ip(ip)
-                if report:
-                    connection_strings = list(connections) if isinstance(connections, set) else connections
-                    connection_details = '|'.join(connection_strings[:10])  # Limit to 10 connections
-                    
-                    result = self._process_ip_result_with_connections(ip, report, connection_details)
-                    if result['is_threat']:
-                        threats_detected += 1
-                    ips_checked += 1
-                    daily_checks += 1
-                    
-            except Exception as e:
-                log_message(f"Error checking IP {ip}: {str(e)}")
-                continue
+            # Results arrive as lookups complete, others are still in flight
+            max_checks = self.db_manager.get_remaining_checks(daily_limit)
+            for ip, report, error in api_client.iter_check_ips(ips_to_check, max_checks=max_checks):
+                if error is not None:
+                    log_message(f"Error checking IP {ip}: {str(error)}")
+                    continue
+                
+                try:
+                    if report:
+                        connections = external_connections[ip]
+                        connection_strings = list(connections) if isinstance(connections, set) else connections
+                        connection_details = '|'.join(connection_strings[:10])  # Limit to 10 connections
+                        
+                        result = self._process_ip_result_with_connections(ip, report, connection_details)
+                        if result['is_threat']:
+                            threats_detected += 1
+                        ips_checked += 1
+                        
+                except Exception as e:
+                    log_message(f"Error checking IP {ip}: {str(e)}")
+                    continue
+            
+        # check-block classifies many IPs with one request, so count requests against the limit
+        api_requests = api_client.take_request_count()
         
-        # Update statistics
+        # Update statistics, incremented so background revalidations counting themselves are kept
         self.db_manager.update_stat('last_check', get_db_timestamp())
-        self.db_manager.update_stat('daily_checks', str(daily_checks))
-        
-        total_checks = int(self.db_manager.get_stat('total_checks', '0'))
-        self.db_manager.update_stat('total_checks', str(total_checks + ips_checked))
+        self.db_manager.increment_stats({'daily_checks': api_requests, 'total_checks': ips_checked})
         
         return {
             'status': 'ok',
@@ -264,10 +370,10 @@ class AbuseIPDBChecker:
             log_message(error_msg)
             return {'status': 'error', 'message': error_msg}
 
-    def get_recent_threats(self, limit=20, offset=0, search_ip='', include_marked_safe=True):
+    def get_recent_threats(self, limit=20, offset=0, search_ip='', include_marked_safe=True, cursor=''):
         """Get recent threats - CLEANED UP, no more sqlite3.Row conversion"""
         try:
-            result = self.db_manager.get_recent_threats(limit, offset, search_ip, include_marked_safe)
+            result = self.db_manager.get_recent_threats(limit, offset, search_ip, include_marked_safe, cursor)
             
             # Database layer now returns proper dictionaries, just pass through with formatting
             formatted_threats = []
@@ -280,8 +386,11 @@ class AbuseIPDBChecker:
                 'status': 'ok',
                 'threats': formatted_threats,
                 'total_count': result.get('total_count', 0),
+                'total_cached': result.get('total_cached', False),
                 'limit': limit,
-                'offset': offset
+                'offset': offset,
+                'next_cursor': result.get('next_cursor', ''),
+                'prev_cursor': result.get('prev_cursor', '')
             }
             
         except Exception as e:
@@ -297,10 +406,10 @@ class AbuseIPDBChecker:
                 'offset': offset
             }
 
-    def get_all_checked_ips(self, limit=20, offset=0, search_ip=''):
+    def get_all_checked_ips(self, limit=20, offset=0, search_ip='', cursor=''):
         """Get all checked IPs - CLEANED UP, no more sqlite3.Row conversion"""
         try:
-            result = self.db_manager.get_all_checked_ips(limit, offset, search_ip)
+            result = self.db_manager.get_all_checked_ips(limit, offset, search_ip, cursor)
             
             # Database layer now returns proper dictionaries, just add threat text
             formatted_ips = []
@@ -313,8 +422,11 @@ class AbuseIPDBChecker:
                 'status': 'ok',
                 'ips': formatted_ips,
                 'total_count': result.get('total_count', 0),
+                'total_cached': result.get('total_cached', False),
                 'limit': limit,
-                'offset': offset
+                'offset': offset,
+                'next_cursor': result.get('next_cursor', ''),
+                'prev_cursor': result.get('prev_cursor', '')
             }
             
         except Exception as e:
@@ -421,9 +533,14 @@ class AbuseIPDBChecker:
             return {'status': 'error', 'message': 'Please configure a valid API key in the API settings'}
         
         try:
-            # Initialize API client and test
-            api_client = AbuseIPDBClient(self.config)
-            report = api_client.check_ip(ip_address)
+            # Initialize API client and test, a cached response costs no quota
+            api_client = self._get_api_client()
+            try:
+                report = api_client.check_ip(ip_address)
+            finally:
+                self.db_manager.update_api_quota(api_client.get_quota_state())
+                self.db_manager.update_circuit_state(api_client.circuit_breaker.get_state())
+            api_requests = api_client.take_request_count()
             
             if not report:
                 return {'status': 'error', 'message': 'No response from AbuseIPDB API'}
@@ -468,11 +585,7 @@ class AbuseIPDBChecker:
                     log_message(f"Error sending ntfy notification for manual test: {str(e)}")
             
             # Update statistics
-            daily_checks = int(self.db_manager.get_stat('daily_checks', '0'))
-            self.db_manager.update_stat('daily_checks', str(daily_checks + 1))
-            
-            total_checks = int(self.db_manager.get_stat('total_checks', '0'))
-            self.db_manager.update_stat('total_checks', str(total_checks + 1))
+            self.db_manager.increment_stats({'daily_checks': api_requests, 'total_checks': 1})
             
             self.db_manager.update_stat('last_check', get_db_timestamp())
             
@@ -489,7 +602,8 @@ class AbuseIPDBChecker:
                 "reports": report.get("totalReports", 0),
                 "last_reported": str(report.get("lastReportedAt", "Never")),
                 "last_checked": format_timestamp(),
-                "is_threat": is_threat
+                "is_threat": is_threat,
+                "cached": api_requests == 0
             }
             
             log_message(f"Test completed for {ip_address}: {get_threat_level_text(threat_level)} (Score: {abuse_score}%)")
@@ -593,8 +707,8 @@ class AbuseIPDBChecker:
         except Exception as e:
             return {'status': 'error', 'message': f'Error retrieving logs: {str(e)}'}
     
-    def list_external_ips(self):
-        """List external IPs from firewall logs"""
+    def list_external_ips(self, minutes=None):
+        """List external IPs from firewall logs, optionally only those seen in the last N minutes"""
         try:
             validation = self.config_manager.validate_config()
             if validation['errors']:
@@ -603,8 +717,21 @@ class AbuseIPDBChecker:
                     'message': f"Configuration errors: {', '.join(validation['errors'])}"
                 }
             
+            # Flows stored by the daemon answer with an index lookup instead of a log scan
             parser = FirewallLogParser(self.config)
-            external_ips = parser.parse_log_for_ips(recent_only=True)
+            flow_ips = self.db_manager.get_recent_flow_ips(
+                minutes or FLOW_LISTING_MINUTES,
+                exclude_blocked=parser.ignore_blocked,
+                exclude_protocols=tuple(parser.ignored_protocols)
+            )
+            hits = {row['ip']: row['hits'] for row in flow_ips}
+            
+            if hits:
+                external_ips = set(hits)
+            elif minutes:
+                external_ips = parser.parse_log_for_ips(since=time.time() - minutes * 60)
+            else:
+                external_ips = parser.parse_log_for_ips(recent_only=True)
             
             results = []
             for ip in sorted(list(external_ips)):
@@ -614,7 +741,8 @@ class AbuseIPDBChecker:
                     'ip': ip,
                     'checked': 'No',
                     'threat_status': 'Unknown',
-                    'last_checked': 'Never'
+                    'last_checked': 'Never',
+                    'hits': hits.get(ip, 0)
                 }
                 
                 if db_record:
@@ -636,6 +764,38 @@ class AbuseIPDBChecker:
         except Exception as e:
             return {'status': 'error', 'message': f'Error: {str(e)}'}
   
+    def get_ip_connections(self, ip_address, limit=100):
+        """List recent connections from one IP using the stored flows"""
+        try:
+            import ipaddress
+            ipaddress.IPv4Address(ip_address)
+        except ValueError:
+            return {'status': 'error', 'message': f'Invalid IPv4 address: {ip_address}'}
+        
+        try:
+            connections = self.db_manager.get_flows_for_ip(ip_address, limit)
+            for conn in connections:
+                conn['timestamp'] = datetime.fromtimestamp(conn['timestamp']).strftime('%Y-%m-%d %H:%M:%S')
+            
+            return {
+                'status': 'ok',
+                'ip': ip_address,
+                'connections': connections,
+                'total_connections': len(connections),
+                'message': f'Found {len(connections)} recent connections from {ip_address}'
+            }
+        except Exception as e:
+            return {'status': 'error', 'message': f'Error: {str(e)}'}
+    
+    def update_blacklist(self):
+        """Download the AbuseIPDB blacklist into the local snapshot"""
+        if not self.config['api_key'] or self.config['api_key'] == 'YOUR_API_KEY':
+            return {'status': 'error', 'message': 'Please configure a valid API key in the API settings'}
+        
+        from lib.blacklist import refresh_blacklist
+        api_client = self._get_api_client()
+        return refresh_blacklist(api_client, self.config, api_client.blacklist)
+    
     def get_batch_status(self):
         """Get daemon batch processing status"""
         return self.daemon_manager.get_daemon_status()
@@ -744,6 +904,7 @@ def main():
     print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {startup_message}", file=sys.stderr)
     system_log(startup_message)
     
+    checker = None
     try:
         # Ensure directories exist
         ensure_directories()
@@ -752,8 +913,8 @@ def main():
         # Parse arguments
         parser = argparse.ArgumentParser(description='AbuseIPDB Checker - Enhanced')
         parser.add_argument('mode', choices=[
-            'check', 'stats', 'threats', 'logs', 'testip', 'listips', 'daemon', 'batchstatus', 'allips', 'exportthreats',
-            'createalias', 'updatealias', 'removeip', 'marksafe', 'unmarksafe', 'testntfy'
+            'check', 'backfill', 'stats', 'threats', 'logs', 'testip', 'listips', 'daemon', 'batchstatus', 'allips', 'exportthreats',
+            'createalias', 'updatealias', 'removeip', 'marksafe', 'unmarksafe', 'testntfy', 'connections', 'updateblacklist'
         ], help='Operation mode')
         parser.add_argument('args', nargs='*', help='Additional arguments based on mode')
         
@@ -774,22 +935,31 @@ def main():
         
         # Route to appropriate method
         if args.mode == 'check':
-            result = checker.run_check()
+            # Optional 'all' argument also scans rotated log archives
+            include_rotated = len(args.args) > 0 and args.args[0] == 'all'
+            result = checker.run_check(include_rotated)
+        elif args.mode == 'backfill':
+            # Optional arguments: 'current' to skip rotated archives, worker count
+            include_rotated = 'current' not in args.args
+            workers = next((int(arg) for arg in args.args if arg.isdigit()), None)
+            result = checker.run_backfill(include_rotated, workers)
         elif args.mode == 'stats':
             result = checker.get_statistics()
         elif args.mode == 'threats':
-            # Parse pagination arguments: limit, offset, search, include_marked_safe
+            # Parse pagination arguments: limit, offset, search, include_marked_safe, cursor
             limit = int(args.args[0]) if len(args.args) > 0 and args.args[0].isdigit() else 20
             offset = int(args.args[1]) if len(args.args) > 1 and args.args[1].isdigit() else 0
             search = args.args[2] if len(args.args) > 2 else ''
             include_marked_safe = args.args[3] == '1' if len(args.args) > 3 else True
-            result = checker.get_recent_threats(limit, offset, search, include_marked_safe)
+            cursor = args.args[4] if len(args.args) > 4 else ''
+            result = checker.get_recent_threats(limit, offset, search, include_marked_safe, cursor)
         elif args.mode == 'allips':
-            # Parse pagination arguments: limit, offset, search
+            # Parse pagination arguments: limit, offset, search, cursor
             limit = int(args.args[0]) if len(args.args) > 0 and args.args[0].isdigit() else 20
             offset = int(args.args[1]) if len(args.args) > 1 and args.args[1].isdigit() else 0
             search = args.args[2] if len(args.args) > 2 else ''
-            result = checker.get_all_checked_ips(limit, offset, search)
+            cursor = args.args[3] if len(args.args) > 3 else ''
+            result = checker.get_all_checked_ips(limit, offset, search, cursor)
         elif args.mode == 'testip':
             if not args.args:
                 result = {'status': 'error', 'message': 'IP address is required for testip mode'}
@@ -815,7 +985,17 @@ def main():
         elif args.mode == 'logs':
             result = checker.get_logs()
         elif args.mode == 'listips':
-            result = checker.list_external_ips()
+            # Optional argument: only IPs seen in the last N minutes
+            minutes = int(args.args[0]) if args.args and args.args[0].isdigit() else None
+            result = checker.list_external_ips(minutes)
+        elif args.mode == 'connections':
+            if not args.args:
+                result = {'status': 'error', 'message': 'IP address is required for connections mode'}
+            else:
+                limit = int(args.args[1]) if len(args.args) > 1 and args.args[1].isdigit() else 100
+                result = checker.get_ip_connections(args.args[0], limit)
+        elif args.mode == 'updateblacklist':
+            result = checker.update_blacklist()
         elif args.mode == 'batchstatus':
             result = checker.get_batch_status()
         elif args.mode == 'exportthreats':
@@ -855,6 +1035,11 @@ def main():
         
         print(json.dumps({'status': 'error', 'message': error_msg}, separators=(',', ':')))
         print(error_msg, file=sys.stderr)
+    
+    finally:
+        # Also after a failed operation: finish revalidations, persist quota state, close the database
+        if checker is not None:
+            checker.close()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
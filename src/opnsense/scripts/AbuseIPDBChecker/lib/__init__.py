@@ -21,19 +21,43 @@ try:
         log_timezone_info
     )
     
-    from .config_manager import ConfigManager
-    from .database import DatabaseManager
-    from .api_client import AbuseIPDBClient
-    from .log_parser import FirewallLogParser
-    from .statistics import StatisticsManager
-    from .daemon import DaemonManager
-    from .ntfy_client import NtfyClient
-    
 except ImportError as e:
     import sys
     print(f"Error in lib module imports: {str(e)}", file=sys.stderr)
     raise
 
+# Imported on first access, so schema tools using lib.migrations or lib.database
+# do not pull in requests and the API clients
+_LAZY_EXPORTS = {
+    'ConfigManager': 'config_manager',
+    'DatabaseManager': 'database',
+    'AbuseIPDBClient': 'api_client',
+    'LogTailReader': 'log_reader',
+    'FirewallLogParser': 'log_parser',
+    'FilterRecord': 'log_parser',
+    'StatisticsManager': 'statistics',
+    'DaemonManager': 'daemon',
+    'NtfyClient': 'ntfy_client',
+    'AsyncAbuseIPDBClient': 'async_client',
+    'AsyncNtfyClient': 'async_client'
+}
+
+def __getattr__(name):
+    """Import lazily exported classes from their module"""
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    
+    from importlib import import_module
+    try:
+        value = getattr(import_module(f'.{module_name}', __name__), name)
+    except ImportError as e:
+        import sys
+        print(f"Error in lib module imports: {str(e)}", file=sys.stderr)
+        raise
+    globals()[name] = value
+    return value
+
 __all__ = [
     'log_message',
     'get_local_time', 
@@ -47,8 +71,12 @@ __all__ = [
     'ConfigManager',
     'DatabaseManager', 
     'AbuseIPDBClient',
+    'LogTailReader',
     'FirewallLogParser',
+    'FilterRecord',
     'StatisticsManager',
     'DaemonManager',
-    'NtfyClient'
+    'NtfyClient',
+    'AsyncAbuseIPDBClient',
+    'AsyncNtfyClient'
 ]
\ No newline at end of file
@@ -7,7 +7,235 @@ Handles all interactions with the AbuseIPDB API
 
 import requests
 import time
+import random
+import threading
+import ipaddress
+from collections import deque
+from datetime import date
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from requests.adapters import HTTPAdapter
 from .core_utils import log_message
+from .response_cache import CACHE_FRESH, CACHE_STALE, CACHE_NEGATIVE, LEASE_POLL_INTERVAL
+
+POOL_CONNECTIONS = 2  # Distinct hosts kept in the pool (API endpoint plus spare)
+POOL_MAXSIZE = 8  # Keep-alive connections per host
+MAX_RATE_LIMIT_WAIT = 300  # Longest 429 back-off slept through inside a batch, in seconds
+RETRY = object()  # Returned by _handle_response when the request should be sent again
+BREAKER_FAILURE_THRESHOLD = 5  # Consecutive transient failures before the circuit opens
+BREAKER_COOLDOWN = 60  # Seconds the circuit stays open before a probe request
+BREAKER_MAX_COOLDOWN = 900  # Cap for the cooldown, doubled after each failed probe
+
+class TokenBucket:
+    """Thread-safe token bucket enforcing a per-second request rate and a daily request budget"""
+    
+    def __init__(self, rate, capacity=None, daily_limit=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1, rate))
+        self.tokens = self.capacity
+        self.daily_limit = daily_limit
+        self.daily_used = 0
+        self.quota_remaining = None  # Server-reported requests left until quota_reset
+        self.quota_reset = None
+        self._paused_until = 0
+        self._day = date.today()
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def configure(self, rate, daily_limit=None):
+        """Apply new limits without losing the current usage"""
+        with self._lock:
+            self.rate = float(rate)
+            self.capacity = float(max(1, rate))
+            self.tokens = min(self.tokens, self.capacity)
+            self.daily_limit = daily_limit
+    
+    def set_daily_used(self, used):
+        """Sync the daily counter with the persisted daily_checks stat"""
+        with self._lock:
+            self._day = date.today()
+            self.daily_used = used
+    
+    def sync_quota(self, remaining, reset):
+        """Adopt the authoritative quota reported by the API"""
+        with self._lock:
+            self.quota_remaining = remaining
+            self.quota_reset = reset
+    
+    def pause_until(self, until):
+        """Hold every worker back until the given epoch time"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, until)
+    
+    def remaining_today(self):
+        """Requests left in today's budget, None when unlimited"""
+        with self._lock:
+            self._roll_day()
+            if self.daily_limit is None:
+                return None
+            return max(0, self.daily_limit - self.daily_used)
+    
+    def budget_spent(self):
+        """True once the daily budget or the server-reported quota is used up"""
+        with self._lock:
+            self._roll_day()
+            if self.daily_limit is not None and self.daily_used >= self.daily_limit:
+                return True
+            if self.quota_reset is not None and time.time() >= self.quota_reset:
+                return False
+            return self.quota_remaining is not None and self.quota_remaining <= 0
+    
+    def _roll_day(self):
+        """Reset the daily counter at midnight"""
+        today = date.today()
+        if today != self._day:
+            self._day = today
+            self.daily_used = 0
+    
+    def reserve(self, metered=True, track_quota=True):
+        """Take a token without blocking: 0 when granted, seconds to wait otherwise, None once the budget is spent.
+        Metered requests count against the daily budget, track_quota ones also against the server-reported
+        check quota. Unmetered requests (the blacklist) only take a rate token."""
+        with self._lock:
+            self._roll_day()
+            if metered and self.daily_limit is not None and self.daily_used >= self.daily_limit:
+                return None
+            
+            wall_time = time.time()
+            if wall_time < self._paused_until:
+                # Backing off after a 429
+                return self._paused_until - wall_time
+            
+            if self.quota_reset is not None and wall_time >= self.quota_reset:
+                # Server quota window has rolled over
+                self.quota_remaining = None
+                self.quota_reset = None
+            track_quota = metered and track_quota
+            if track_quota and self.quota_remaining is not None and self.quota_remaining <= 0:
+                return None
+            
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            
+            if self.tokens >= 1:
+                self.tokens -= 1
+                if metered:
+                    self.daily_used += 1
+                if track_quota and self.quota_remaining is not None:
+                    self.quota_remaining -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+    
+    def acquire(self, metered=True, track_quota=True):
+        """Block until a token is available, returns False once the daily budget is spent"""
+        while True:
+            wait_time = self.reserve(metered, track_quota)
+            if wait_time is None:
+                return False
+            if wait_time == 0:
+                return True
+            time.sleep(wait_time)
+
+class CircuitBreaker:
+    """Thread-safe circuit breaker: opens after consecutive transient failures and lets a
+    single probe request through once the cooldown has passed"""
+    
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, cooldown=BREAKER_COOLDOWN, max_cooldown=BREAKER_MAX_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0  # Consecutive transient failures
+        self.trips = 0
+        self.opened_at = None
+        self.retry_at = None
+        self._lock = threading.Lock()
+    
+    def configure(self, failure_threshold, cooldown):
+        """Apply new limits without resetting the current state"""
+        with self._lock:
+            self.failure_threshold = failure_threshold
+            self.base_cooldown = cooldown
+    
+    def allow(self):
+        """Whether a request may be sent now, moving an expired open circuit to half-open"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.time() >= self.retry_at:
+                self.state = self.HALF_OPEN  # This caller sends the probe
+                return True
+            return False
+    
+    def is_closed(self):
+        with self._lock:
+            return self.state == self.CLOSED
+    
+    def record_success(self):
+        """The API answered, close the circuit"""
+        with self._lock:
+            if self.state != self.CLOSED:
+                log_message("API circuit breaker closed, AbuseIPDB is responding again")
+            self.state = self.CLOSED
+            self.failures = 0
+            self.cooldown = self.base_cooldown
+            self.opened_at = None
+            self.retry_at = None
+    
+    def record_failure(self):
+        """Count a transient failure, opening the circuit at the threshold or on a failed probe"""
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN:
+                self._trip(min(self.cooldown * 2, self.max_cooldown))
+            elif self.state == self.CLOSED and self.failures >= self.failure_threshold:
+                self._trip(self.base_cooldown)
+    
+    def release(self):
+        """A probe ended without reaching the API, let the next caller probe instead"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+    
+    def _trip(self, cooldown):
+        """Open the circuit for cooldown seconds"""
+        now = time.time()
+        self.state = self.OPEN
+        self.cooldown = cooldown
+        self.opened_at = now
+        self.retry_at = now + cooldown
+        self.trips += 1
+        log_message(f"API circuit breaker opened after {self.failures} consecutive failures, next probe in {cooldown:.0f}s")
+    
+    def get_state(self):
+        """Snapshot of the breaker for status output and persistence"""
+        with self._lock:
+            return {
+                'state': self.state,
+                'failures': self.failures,
+                'trips': self.trips,
+                'cooldown': self.cooldown,
+                'opened_at': int(self.opened_at) if self.opened_at else None,
+                'retry_at': int(self.retry_at) if self.retry_at else None
+            }
+    
+    def load_state(self, state):
+        """Adopt a persisted open circuit so a new process fails fast as well"""
+        if not state or state.get('state') == self.CLOSED or not state.get('retry_at'):
+            return
+        with self._lock:
+            self.state = self.OPEN  # A probe in flight elsewhere counts as open here
+            self.failures = state.get('failures') or 0
+            self.trips = state.get('trips') or 0
+            self.cooldown = state.get('cooldown') or self.base_cooldown
+            self.opened_at = state.get('opened_at')
+            self.retry_at = state['retry_at']
 
 class AbuseIPDBClient:
     """Centralized AbuseIPDB API client with error handling and rate limiting"""
@@ -18,131 +246,625 @@ class AbuseIPDBClient:
         self.api_endpoint = config['api_endpoint']
         self.max_age = config['max_age']
         self.last_request_time = 0
-        self.min_request_interval = 0.5  # Minimum 500ms between requests
+        self.max_workers = config.get('api_max_workers', 4)
+        self.requests_per_second = config.get('api_requests_per_second', 2)
+        self.min_request_interval = 1.0 / self.requests_per_second
+        # Shared by all worker threads of this client
+        self.rate_limiter = TokenBucket(self.requests_per_second, daily_limit=config.get('daily_check_limit'))
+        self.max_rate_limit_wait = config.get('api_max_rate_limit_wait', MAX_RATE_LIMIT_WAIT)
+        self.quota = None  # Last X-RateLimit-* state reported by the API
+        self.request_count = 0  # Metered requests sent (check and check-block), mirrors the bucket's daily_used
+        self._requests_counted = 0  # request_count already added to the daily_checks stat
+        self._quota_lock = threading.Lock()
+        self.block_endpoint = self._derive_endpoint(self.api_endpoint, 'check-block')
+        self.blacklist_endpoint = self._derive_endpoint(self.api_endpoint, 'blacklist')
+        self.block_prefix = config.get('api_block_prefix', 24)
+        self.block_min_ips = config.get('api_block_min_ips', 4)
+        self._idle_sessions = []  # Keep-alive sessions not in use by a worker, reused across batches
+        self._sessions_lock = threading.Lock()
+        self.blacklist = None  # Local blacklist snapshot answering known-bad IPs without quota
+        self.cache = None  # ResponseCache attached by the owner, consulted before any check request
+        self.circuit_breaker = CircuitBreaker(
+            config.get('api_breaker_failure_threshold', BREAKER_FAILURE_THRESHOLD),
+            config.get('api_breaker_cooldown', BREAKER_COOLDOWN)
+        )
+        if config.get('blacklist_enabled', True):
+            from .blacklist import BlacklistIndex
+            self.blacklist = BlacklistIndex()
+    
+    def _get_session(self):
+        """Check out an idle keep-alive session, creating one when every session is in use.
+        Each worker owns its session until _release_session, so a reset never hits another worker's request."""
+        with self._sessions_lock:
+            while self._idle_sessions:
+                session = self._idle_sessions.pop()
+                if session.headers.get('Key') == self.api_key:
+                    return session
+                # Opened before the API key changed
+                self._reset_session(session)
+        
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=0)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({
+            'Key': self.api_key,
+            'Accept': 'application/json'
+        })
+        return session
+    
+    def _release_session(self, session):
+        """Return a checked out session to the idle pool"""
+        with self._sessions_lock:
+            self._idle_sessions.append(session)
+    
+    def _reset_session(self, session):
+        """Close a session so its connections are not reused"""
+        try:
+            session.close()
+        except Exception:
+            pass
+    
+    def _close_sessions(self):
+        """Close every idle session, the next request reconnects from scratch"""
+        with self._sessions_lock:
+            sessions, self._idle_sessions = self._idle_sessions, []
+        for session in sessions:
+            self._reset_session(session)
+    
+    def update_config(self, config):
+        """Apply reloaded configuration, keeping the sessions unless the credentials changed"""
+        if config['api_key'] != self.api_key or config['api_endpoint'] != self.api_endpoint:
+            self._close_sessions()
+        self.config = config
+        self.api_key = config['api_key']
+        self.api_endpoint = config['api_endpoint']
+        self.block_endpoint = self._derive_endpoint(self.api_endpoint, 'check-block')
+        self.blacklist_endpoint = self._derive_endpoint(self.api_endpoint, 'blacklist')
+        self.block_prefix = config.get('api_block_prefix', 24)
+        self.block_min_ips = config.get('api_block_min_ips', 4)
+        self.max_age = config['max_age']
+        self.max_workers = config.get('api_max_workers', 4)
+        self.requests_per_second = config.get('api_requests_per_second', 2)
+        self.min_request_interval = 1.0 / self.requests_per_second
+        self.rate_limiter.configure(self.requests_per_second, config.get('daily_check_limit'))
+        self.circuit_breaker.configure(
+            config.get('api_breaker_failure_threshold', BREAKER_FAILURE_THRESHOLD),
+            config.get('api_breaker_cooldown', BREAKER_COOLDOWN)
+        )
+        if self.cache is not None:
+            self.cache.config = config
+    
+    def _derive_endpoint(self, api_endpoint, name):
+        """check-block and blacklist live next to the configured check endpoint"""
+        base = api_endpoint.rstrip('/')
+        if base.endswith('/check'):
+            base = base[:-len('/check')]
+        return f"{base}/{name}"
+    
+    def group_by_subnet(self, ip_list):
+        """Split IPs into (subnet -> ips for subnets worth a check-block, remaining single IPs)"""
+        if not self.block_min_ips or self.block_min_ips < 2:
+            return {}, list(ip_list)
+        
+        groups = {}
+        for ip in ip_list:
+            try:
+                network = str(ipaddress.ip_network(f"{ip}/{self.block_prefix}", strict=False))
+            except ValueError:
+                network = None
+            groups.setdefault(network, []).append(ip)
+        
+        blocks = {}
+        singles = []
+        for network, members in groups.items():
+            if network and len(members) >= self.block_min_ips:
+                blocks[network] = members
+            else:
+                singles.extend(members)
+        return blocks, singles
+    
+    def close(self):
+        """Finish background revalidations and close pooled connections"""
+        if self.cache is not None:
+            self.cache.wait()
+        self._close_sessions()
+    
+    def _update_quota(self, response):
+        """Record X-RateLimit-* headers from a response as the authoritative quota"""
+        def header_int(name):
+            value = response.headers.get(name)
+            try:
+                return int(value) if value is not None else None
+            except (TypeError, ValueError):
+                return None
+        
+        limit = header_int('X-RateLimit-Limit')
+        remaining = header_int('X-RateLimit-Remaining')
+        reset = header_int('X-RateLimit-Reset')
+        if remaining is None:
+            return
+        
+        with self._quota_lock:
+            self.quota = {
+                'limit': limit,
+                'remaining': remaining,
+                'reset': reset,
+                'updated': int(time.time())
+            }
+        self.rate_limiter.sync_quota(remaining, reset)
+    
+    def _retry_after(self, response):
+        """Seconds to wait after a 429, from Retry-After or the quota reset time"""
+        value = response.headers.get('Retry-After')
+        if value:
+            try:
+                return max(0, int(value))
+            except ValueError:
+                try:
+                    return max(0, parsedate_to_datetime(value).timestamp() - time.time())
+                except (TypeError, ValueError):
+                    pass
+        
+        quota = self.get_quota_state()
+        if quota and quota.get('reset'):
+            return max(0, quota['reset'] - time.time())
+        return None
+    
+    def take_request_count(self):
+        """Requests sent since the previous call, including background revalidations,
+        so each one is added to daily_checks exactly once"""
+        with self._quota_lock:
+            count = self.request_count - self._requests_counted
+            self._requests_counted = self.request_count
+        return count
+    
+    def get_quota_state(self):
+        """Copy of the last reported quota, None before the first response"""
+        with self._quota_lock:
+            return dict(self.quota) if self.quota else None
+    
+    def load_quota_state(self, quota):
+        """Seed the quota from persisted state so a new process honours it immediately"""
+        if not quota or quota.get('remaining') is None:
+            return
+        if quota.get('reset') and quota['reset'] <= time.time():
+            return  # Stale, the window has reset since
+        with self._quota_lock:
+            self.quota = dict(quota)
+        self.rate_limiter.sync_quota(quota['remaining'], quota.get('reset'))
     
     def check_ip(self, ip_address):
         """Check a single IP against AbuseIPDB API with proper error handling"""
         if not self._validate_api_config():
             raise Exception("API configuration invalid")
         
-        # Rate limiting
-        self._enforce_rate_limit()
+        state, report_data = self.lookup_cache(ip_address)
+        if report_data is not None:
+            return report_data
+        if state == CACHE_NEGATIVE:
+            raise APIValidationError(f"Invalid IP address (cached): {ip_address}")
         
-        headers = {
-            'Key': self.api_key,
-            'Accept': 'application/json'
-        }
+        return self.fetch_report(ip_address)
+    
+    def lookup_cache(self, ip_address):
+        """Cached (state, report), stale reports are returned while a background refresh runs"""
+        if self.cache is None:
+            return None, None
         
+        state, report_data = self.cache.lookup(ip_address)
+        if state == CACHE_STALE:
+            # A refresh is a real API request, keep serving the stale report once the budget is spent
+            if not self.rate_limiter.budget_spent():
+                self._schedule_revalidation(ip_address)
+        elif state != CACHE_FRESH:
+            report_data = None
+        return state, report_data
+    
+    def _schedule_revalidation(self, ip_address):
+        """Refresh a stale cache entry without holding up the caller"""
+        self.cache.revalidate(ip_address, self._fetch_report)
+    
+    def fetch_report(self, ip_address):
+        """Request a check report from the API, bypassing and then refreshing the cache.
+        When another process is already looking the IP up, wait for and reuse its response."""
+        return self._fetch_report(ip_address)[0]
+    
+    def _fetch_report(self, ip_address):
+        """fetch_report returning (report, api_requests), 0 requests when another process's response was reused"""
+        if self.cache is None:
+            return self._request_report(ip_address), 1
+        
+        lease = self.cache.acquire_lease(ip_address)
+        while lease is None:
+            time.sleep(LEASE_POLL_INTERVAL)
+            shared = self.cache.shared_result(ip_address)
+            if shared is not None:
+                return self._shared_report(ip_address, *shared), 0
+            lease = self.cache.acquire_lease(ip_address)
+        
+        try:
+            return self._request_report(ip_address), 1
+        finally:
+            self.cache.release_lease(ip_address, lease)
+    
+    def _shared_report(self, ip_address, state, report_data):
+        """Response another process stored while this one waited on its lease"""
+        log_message(f"Reusing concurrent lookup of {ip_address}")
+        if state == CACHE_NEGATIVE:
+            raise APIValidationError(f"Invalid IP address (cached): {ip_address}")
+        return report_data
+    
+    def _request_report(self, ip_address):
+        """Send the check request and cache its outcome"""
         params = {
             'ipAddress': ip_address,
             'maxAgeInDays': self.max_age
         }
         
         try:
-            log_message(f"API Request: Checking {ip_address}")
-            
-            response = requests.get(
-                self.api_endpoint, 
-                headers=headers, 
-                params=params,
-                timeout=10
-            )
-            
-            self.last_request_time = time.time()
-            
-            log_message(f"API Response: HTTP {response.status_code}")
+            report_data = self._api_get(self.api_endpoint, params, ip_address)
+        except APIValidationError:
+            if self.cache is not None:
+                self.cache.store_invalid(ip_address)
+            raise
+        
+        log_message(f"API Success: {ip_address} scored {report_data.get('abuseConfidenceScore', 0)}%")
+        if self.cache is not None:
+            self.cache.store(ip_address, report_data)
+        return report_data
+    
+    def check_block(self, network):
+        """Check a whole subnet with one check-block request, returns ip -> report for reported addresses"""
+        if not self._validate_api_config():
+            raise Exception("API configuration invalid")
+        
+        params = {
+            'network': network,
+            'maxAgeInDays': self.max_age
+        }
+        
+        # Counts against the daily budget, but check-block has its own quota so its headers must not drive the check quota
+        block_data = self._api_get(self.block_endpoint, params, network, track_quota=False)
+        reports = self._block_reports(block_data)
+        log_message(f"API Success: {network} has {len(reports)} reported addresses")
+        return reports
+    
+    def _block_reports(self, block_data):
+        """Turn a check-block response into ip -> check-style report"""
+        reports = {}
+        for entry in block_data.get('reportedAddress') or []:
+            ip = entry.get('ipAddress')
+            if ip:
+                # Shape the entry like a check response
+                reports[ip] = {
+                    'ipAddress': ip,
+                    'abuseConfidenceScore': entry.get('abuseConfidenceScore', 0),
+                    'countryCode': entry.get('countryCode') or 'Unknown',
+                    'totalReports': entry.get('numReports', 0),
+                    'lastReportedAt': entry.get('mostRecentReport')
+                }
+        return reports
+    
+    def fetch_blacklist(self, confidence_minimum=100, limit=10000):
+        """Download high-confidence IPs from the blacklist endpoint"""
+        if not self._validate_api_config():
+            raise Exception("API configuration invalid")
+        
+        params = {
+            'confidenceMinimum': confidence_minimum,
+            'limit': limit
+        }
+        
+        # The blacklist endpoint has its own quota, so it takes nothing from the check budget
+        entries = self._api_get(self.blacklist_endpoint, params, 'blacklist', track_quota=False, metered=False)
+        log_message(f"API Success: blacklist returned {len(entries)} addresses")
+        return entries
+    
+    def lookup_blacklist(self, ip):
+        """Report from the local blacklist snapshot, None if not listed or no snapshot"""
+        if self.blacklist is None:
+            return None
+        return self.blacklist.lookup(ip)
+    
+    def _api_get(self, url, params, subject, track_quota=True, metered=True):
+        """GET an API endpoint, retrying transient failures with jittered backoff behind the circuit breaker"""
+        attempt = 0
+        while True:
+            self._check_circuit()
+            try:
+                data = self._api_get_attempt(url, params, subject, track_quota, metered)
+            except APIError as e:
+                delay = self._retry_delay(e, attempt, subject)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self.circuit_breaker.record_success()
+            return data
+    
+    def _check_circuit(self):
+        """Fail fast while the circuit breaker is open"""
+        if not self.circuit_breaker.allow():
+            retry_at = self.circuit_breaker.get_state()['retry_at'] or time.time()
+            raise APICircuitOpenError(f"AbuseIPDB unavailable, circuit breaker open for another {max(0, retry_at - time.time()):.0f}s")
+    
+    def _retry_delay(self, error, attempt, subject):
+        """Record a failed attempt with the breaker, returns the backoff before retrying or None to give up"""
+        if isinstance(error, APIRateLimitError):
+            # Budget or quota exhausted, says nothing about API health
+            self.circuit_breaker.release()
+            return None
+        if not isinstance(error, TRANSIENT_ERRORS):
+            # The API answered, just not with data
+            self.circuit_breaker.record_success()
+            return None
+        
+        self.circuit_breaker.record_failure()
+        policy = next((policy for error_class, policy in RETRY_POLICIES if isinstance(error, error_class)), None)
+        if policy is None or attempt >= policy[0] or not self.circuit_breaker.is_closed():
+            return None
+        
+        # Full jitter keeps concurrent workers from retrying in lockstep
+        retries, base_delay, max_delay = policy
+        delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+        log_message(f"API retry {attempt + 1}/{retries} for {subject} in {delay:.1f}s after: {str(error)}")
+        return delay
+    
+    def _api_get_attempt(self, url, params, subject, track_quota=True, metered=True):
+        """GET an API endpoint through the rate limiter, returning the response 'data' object"""
+        waited_for_reset = False
+        while True:
+            # Rate limiting, unmetered endpoints stay out of the daily check budget
+            self._enforce_rate_limit(metered, track_quota)
             
-            if response.status_code == 200:
-                data = response.json()
-                report_data = data.get('data', {})
-                log_message(f"API Success: {ip_address} scored {report_data.get('abuseConfidenceScore', 0)}%")
-                return report_data
+            session = self._get_session()
+            try:
+                log_message(f"API Request: Checking {subject}")
                 
-            elif response.status_code == 401:
-                error_msg = "Authentication failed - invalid API key"
-                log_message(f"API Error 401: {error_msg}")
-                raise APIAuthenticationError(error_msg)
+                # Reuses a pooled connection instead of a fresh TCP/TLS handshake per IP
+                response = session.get(
+                    url, 
+                    params=params,
+                    timeout=10
+                )
                 
-            elif response.status_code == 429:
-                error_msg = "Rate limit exceeded"
-                log_message(f"API Error 429: {error_msg}")
-                raise APIRateLimitError(error_msg)
+                data = self._handle_response(response, subject, track_quota, waited_for_reset, metered)
+                if data is RETRY:
+                    waited_for_reset = True
+                    continue
+                return data
+                    
+            except requests.exceptions.ConnectionError as e:
+                error_msg = f"Connection error: {str(e)}"
+                log_message(f"API Connection Error: {error_msg}")
+                # This session's pooled connections may be stale, other workers keep theirs
+                self._reset_session(session)
+                session = None
+                raise APIConnectionError(error_msg)
                 
-            elif response.status_code == 422:
-                error_msg = f"Invalid IP address: {ip_address}"
-                log_message(f"API Error 422: {error_msg}")
-                raise APIValidationError(error_msg)
+            except requests.exceptions.Timeout as e:
+                error_msg = f"Request timeout: {str(e)}"
+                log_message(f"API Timeout: {error_msg}")
+                raise APITimeoutError(error_msg)
                 
-            else:
-                error_msg = f"HTTP {response.status_code}: {response.text}"
-                log_message(f"API Error {response.status_code}: {response.text}")
+            except requests.exceptions.RequestException as e:
+                error_msg = f"Request error: {str(e)}"
+                log_message(f"API Request Error: {error_msg}")
                 raise APIRequestError(error_msg)
-                
-        except requests.exceptions.ConnectionError as e:
-            error_msg = f"Connection error: {str(e)}"
-            log_message(f"API Connection Error: {error_msg}")
-            raise APIConnectionError(error_msg)
             
-        except requests.exceptions.Timeout as e:
-            error_msg = f"Request timeout: {str(e)}"
-            log_message(f"API Timeout: {error_msg}")
-            raise APITimeoutError(error_msg)
+            finally:
+                if session is not None:
+                    self._release_session(session)
+    
+    def _handle_response(self, response, subject, track_quota, waited_for_reset, metered=True):
+        """Account for a response and return its 'data' object, RETRY after a short 429 pause, or raise"""
+        self.last_request_time = time.time()
+        if metered:
+            # Same requests the bucket charged to daily_used, so daily_checks and the bucket agree
+            with self._quota_lock:
+                self.request_count += 1
+        if track_quota:
+            self._update_quota(response)
+        
+        log_message(f"API Response: HTTP {response.status_code}")
+        
+        if response.status_code == 200:
+            data = response.json()
+            return data.get('data', {})
+            
+        elif response.status_code == 401:
+            error_msg = "Authentication failed - invalid API key"
+            log_message(f"API Error 401: {error_msg}")
+            raise APIAuthenticationError(error_msg)
+            
+        elif response.status_code == 429:
+            wait_seconds = self._retry_after(response)
+            if not waited_for_reset and wait_seconds is not None and wait_seconds <= self.max_rate_limit_wait:
+                # Short window: sleep exactly until the API accepts requests again
+                log_message(f"API 429: rate limited, waiting {wait_seconds:.0f}s for reset")
+                self.rate_limiter.pause_until(time.time() + wait_seconds)
+                return RETRY
+            
+            error_msg = "Rate limit exceeded"
+            if wait_seconds is not None:
+                error_msg += f", resets in {wait_seconds:.0f}s"
+            log_message(f"API Error 429: {error_msg}")
+            raise APIRateLimitError(error_msg)
+            
+        elif response.status_code == 422:
+            error_msg = f"Invalid IP address or network: {subject}"
+            log_message(f"API Error 422: {error_msg}")
+            raise APIValidationError(error_msg)
             
-        except requests.exceptions.RequestException as e:
-            error_msg = f"Request error: {str(e)}"
-            log_message(f"API Request Error: {error_msg}")
+        elif response.status_code >= 500:
+            error_msg = f"HTTP {response.status_code}: {response.text}"
+            log_message(f"API Error {response.status_code}: {response.text}")
+            raise APIServerError(error_msg)
+            
+        else:
+            error_msg = f"HTTP {response.status_code}: {response.text}"
+            log_message(f"API Error {response.status_code}: {response.text}")
             raise APIRequestError(error_msg)
     
-    def batch_check_ips(self, ip_list, max_checks=None):
-        """Check multiple IPs with built-in rate limiting and error handling"""
+    def _resolve_locally(self, ip_list):
+        """Answer IPs from the blacklist snapshot and response cache, returns (results, IPs still needing the API)"""
+        results = []
+        
+        # Known-bad IPs from the local blacklist snapshot cost no quota
+        if self.blacklist is not None:
+            self.blacklist.reload_if_changed()
+            pending = []
+            for ip in ip_list:
+                report = self.blacklist.lookup(ip)
+                if report is None:
+                    pending.append(ip)
+                else:
+                    results.append((ip, report, None))
+            if results:
+                log_message(f"Blacklist snapshot classified {len(results)} IPs locally")
+            ip_list = pending
+        
+        # Cached responses cost no quota either, stale ones are refreshed in the background
+        if self.cache is not None:
+            pending = []
+            for ip in ip_list:
+                state, report = self.lookup_cache(ip)
+                if report is not None:
+                    results.append((ip, report, None))
+                elif state == CACHE_NEGATIVE:
+                    results.append((ip, None, APIValidationError(f"Invalid IP address (cached): {ip}")))
+                else:
+                    pending.append(ip)
+            ip_list = pending
+        
+        return results, ip_list
+    
+    def _plan_tasks(self, ip_list):
+        """Queue of (network, members) lookups: check-block subnets first, then single IPs"""
+        blocks, singles = self.group_by_subnet(ip_list)
+        tasks = deque((network, members) for network, members in blocks.items())
+        tasks.extend((None, [ip]) for ip in singles)
+        if blocks:
+            log_message(f"Using check-block for {len(blocks)} subnets covering {sum(len(m) for m in blocks.values())} IPs")
+        return tasks
+    
+    def iter_check_ips(self, ip_list, max_checks=None, max_workers=None):
+        """Check IPs concurrently behind the shared token bucket, yielding (ip, report, error) as each completes.
+        Subnets holding several pending IPs are classified with one check-block request."""
         if not self._validate_api_config():
             raise Exception("API configuration invalid")
         
+        local_results, ip_list = self._resolve_locally(ip_list)
+        yield from local_results
+        
+        tasks = self._plan_tasks(ip_list)
+        budget = len(ip_list) if max_checks is None else max_checks  # One unit per API request
+        workers = max(1, min(max_workers or self.max_workers, len(tasks) or 1))
+        in_flight = {}
+        stopped = False
+        blocks_failed = False
+        circuit_error = None
+        
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='abuseipdb') as executor:
+            while True:
+                # Keep the pool full until the budget is spent or a fatal error stops the run
+                while not stopped and budget > 0 and tasks and len(in_flight) < workers:
+                    network, members = tasks.popleft()
+                    if network and blocks_failed:
+                        # check-block unavailable, fall back to single lookups
+                        tasks.extendleft((None, [ip]) for ip in reversed(members))
+                        continue
+                    in_flight[executor.submit(self._run_check_task, network, members)] = (network, members)
+                    budget -= 1
+                
+                if not in_flight:
+                    break
+                
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    network, members = in_flight.pop(future)
+                    try:
+                        reports = future.result()
+                    except (APIAuthenticationError, APICircuitOpenError) as e:
+                        stopped = True
+                        if isinstance(e, APICircuitOpenError):
+                            circuit_error = e
+                        for ip in members:
+                            yield ip, None, e
+                        continue
+                    except Exception as e:
+                        if network:
+                            log_message(f"check-block failed for {network}, using single lookups: {str(e)}")
+                            blocks_failed = True
+                            budget += 1
+                            tasks.extendleft((None, [ip]) for ip in reversed(members))
+                            continue
+                        if isinstance(e, APIRateLimitError):
+                            # No point in sending more requests, let in-flight ones finish
+                            stopped = True
+                        yield members[0], None, e
+                        continue
+                    
+                    for ip in members:
+                        yield ip, reports[ip], None
+        
+        if circuit_error is not None:
+            yield from self._fail_queued(tasks, circuit_error)
+    
+    def _fail_queued(self, tasks, error):
+        """Fail every queued IP fast so callers can re-queue them while the circuit is open"""
+        log_message(f"Circuit breaker open, deferring {sum(len(members) for _, members in tasks)} queued IPs")
+        for _, members in tasks:
+            for ip in members:
+                yield ip, None, error
+    
+    def _run_check_task(self, network, members):
+        """Worker body: one check or one check-block request, returns ip -> report"""
+        if network is None:
+            return {members[0]: self.check_ip(members[0])}
+        
+        return self._block_task_results(self.check_block(network), members)
+    
+    def _block_task_results(self, reports, members):
+        """Report for every member of a checked subnet, caching each"""
+        # Addresses absent from the block report have no reports in the max-age window
+        results = {
+            ip: reports.get(ip) or {'ipAddress': ip, 'abuseConfidenceScore': 0, 'countryCode': 'Unknown', 'totalReports': 0}
+            for ip in members
+        }
+        if self.cache is not None:
+            for ip, report in results.items():
+                self.cache.store(ip, report)
+        return results
+    
+    def batch_check_ips(self, ip_list, max_checks=None):
+        """Check multiple IPs concurrently with built-in rate limiting and error handling"""
         results = {}
         checks_performed = 0
-        max_checks = max_checks or len(ip_list)
         
-        for ip in ip_list:
-            if checks_performed >= max_checks:
-                log_message(f"Batch check limit reached: {checks_performed}/{max_checks}")
-                break
-            
-            try:
-                result = self.check_ip(ip)
-                results[ip] = {
-                    'status': 'success',
-                    'data': result
-                }
+        for ip, report, error in self.iter_check_ips(ip_list, max_checks):
+            if error is None:
+                results[ip] = {'status': 'success', 'data': report}
                 checks_performed += 1
-                
-            except APIRateLimitError as e:
+            elif isinstance(error, APIRateLimitError):
                 log_message(f"Rate limit hit during batch check at IP {ip}")
-                results[ip] = {
-                    'status': 'rate_limited',
-                    'error': str(e)
-                }
-                break  # Stop batch on rate limit
-                
-            except (APIAuthenticationError, APIConnectionError) as e:
-                log_message(f"Critical API error during batch check: {str(e)}")
-                results[ip] = {
-                    'status': 'critical_error',
-                    'error': str(e)
-                }
-                break  # Stop batch on critical errors
-                
-            except Exception as e:
-                log_message(f"Error checking IP {ip} in batch: {str(e)}")
-                results[ip] = {
-                    'status': 'error',
-                    'error': str(e)
-                }
-                continue  # Continue batch on individual IP errors
+                results[ip] = {'status': 'rate_limited', 'error': str(error)}
+            elif isinstance(error, APICircuitOpenError):
+                results[ip] = {'status': 'circuit_open', 'error': str(error)}
+            elif isinstance(error, (APIAuthenticationError, APIConnectionError)):
+                log_message(f"Critical API error during batch check: {str(error)}")
+                results[ip] = {'status': 'critical_error', 'error': str(error)}
+            else:
+                log_message(f"Error checking IP {ip} in batch: {str(error)}")
+                results[ip] = {'status': 'error', 'error': str(error)}
         
         return {
             'results': results,
             'checks_performed': checks_performed,
-            'total_requested': len(ip_list)
+            'total_requested': len(ip_list),
+            'circuit_breaker': self.circuit_breaker.get_state()
         }
     
     def test_connection(self):
@@ -189,14 +911,19 @@ class AbuseIPDBClient:
         
         return True
     
-    def _enforce_rate_limit(self):
-        """Enforce minimum time between API requests"""
-        current_time = time.time()
-        time_since_last = current_time - self.last_request_time
-        
-        if time_since_last < self.min_request_interval:
-            sleep_time = self.min_request_interval - time_since_last
-            time.sleep(sleep_time)
+    def _enforce_rate_limit(self, metered=True, track_quota=True):
+        """Wait for a token from the shared bucket, failing once the daily budget is spent"""
+        if not self.rate_limiter.acquire(metered, track_quota):
+            raise self._budget_exhausted_error()
+    
+    def _budget_exhausted_error(self):
+        """APIRateLimitError explaining which budget ran out"""
+        if self.rate_limiter.quota_remaining is not None and self.rate_limiter.quota_remaining <= 0:
+            error_msg = "API quota exhausted until reset"
+        else:
+            error_msg = f"Daily check limit reached ({self.rate_limiter.daily_used}/{self.rate_limiter.daily_limit})"
+        log_message(f"API request skipped: {error_msg}")
+        return APIRateLimitError(error_msg)
     
     def get_api_status(self):
         """Get current API client status"""
@@ -205,7 +932,15 @@ class AbuseIPDBClient:
             'api_endpoint': self.api_endpoint,
             'max_age_days': self.max_age,
             'rate_limit_interval': self.min_request_interval,
-            'last_request_time': self.last_request_time
+            'max_workers': self.max_workers,
+            'daily_remaining': self.rate_limiter.remaining_today(),
+            'quota': self.get_quota_state(),
+            'requests_sent': self.request_count,
+            'blacklist_size': len(self.blacklist) if self.blacklist is not None else 0,
+            'circuit_breaker': self.circuit_breaker.get_state(),
+            'cache_enabled': self.cache is not None,
+            'last_request_time': self.last_request_time,
+            'session_active': bool(self._idle_sessions)
         }
 
 # Custom Exception Classes for better error handling
@@ -236,3 +971,21 @@ class APIValidationError(APIError):
 class APIRequestError(APIError):
     """Raised for general API request errors"""
     pass
+
+class APIServerError(APIRequestError):
+    """Raised when the API answers with a 5xx status"""
+    pass
+
+class APICircuitOpenError(APIConnectionError):
+    """Raised without contacting the API while the circuit breaker is open"""
+    pass
+
+# Failures that say the API is unhealthy: they count towards the circuit breaker and are retried
+TRANSIENT_ERRORS = (APIConnectionError, APITimeoutError, APIServerError)
+
+# Per error class: (retries, base delay, max delay) for jittered exponential backoff
+RETRY_POLICIES = (
+    (APIConnectionError, (3, 1.0, 8.0)),
+    (APITimeoutError, (1, 2.0, 10.0)),  # Each attempt already waited the full request timeout
+    (APIServerError, (2, 2.0, 15.0)),
+)
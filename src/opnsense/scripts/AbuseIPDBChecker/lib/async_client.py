@@ -0,0 +1,543 @@
+#!/usr/local/bin/python3
+
+"""
+Async Client Module
+asyncio variants of the AbuseIPDB and ntfy clients on a small keep-alive HTTP/1.1 transport,
+so many lookups and notifications overlap on one thread
+"""
+
+import ssl
+import json
+import asyncio
+from collections import deque
+from urllib.parse import urlsplit, urlencode
+from .core_utils import log_message
+from .api_client import (
+    AbuseIPDBClient, RETRY, POOL_MAXSIZE, APIError,
+    APIAuthenticationError, APIRateLimitError, APIConnectionError,
+    APITimeoutError, APIValidationError, APIRequestError, APICircuitOpenError
+)
+from .ntfy_client import NtfyClient
+from .response_cache import CACHE_NEGATIVE, LEASE_POLL_INTERVAL
+
+class AsyncResponse:
+    """Response with the attributes the shared response handlers use"""
+
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+class _Headers(dict):
+    """Response headers keyed in lower case with case-insensitive get()"""
+
+    def get(self, key, default=None):
+        return super().get(key.lower(), default)
+
+class AsyncHTTPTransport:
+    """Minimal asyncio HTTP/1.1 client keeping idle connections per host for reuse.
+    Raises OSError/EOFError on connection failures and asyncio.TimeoutError on timeouts."""
+
+    def __init__(self, max_idle=POOL_MAXSIZE):
+        self.max_idle = max_idle
+        self._idle = {}  # (scheme, host, port) -> deque of (reader, writer)
+        self._ssl_context = None
+
+    def _checkout(self, key):
+        """Idle connection for the host, None when none is usable"""
+        idle = self._idle.get(key)
+        while idle:
+            reader, writer = idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                return reader, writer
+            writer.close()
+        return None
+
+    def _checkin(self, key, connection):
+        """Return a connection to the idle pool, closing it when the pool is full"""
+        idle = self._idle.setdefault(key, deque())
+        if len(idle) < self.max_idle:
+            idle.append(connection)
+        else:
+            connection[1].close()
+
+    async def _connect(self, scheme, host, port):
+        """Open a new TCP/TLS connection"""
+        ssl_context = None
+        if scheme == 'https':
+            if self._ssl_context is None:
+                self._ssl_context = ssl.create_default_context()
+            ssl_context = self._ssl_context
+        return await asyncio.open_connection(host, port, ssl=ssl_context)
+
+    async def request(self, method, url, params=None, headers=None, data=None, timeout=10):
+        """Send one request and return an AsyncResponse"""
+        parts = urlsplit(url)
+        scheme = parts.scheme or 'http'
+        port = parts.port or (443 if scheme == 'https' else 80)
+        key = (scheme, parts.hostname, port)
+
+        target = parts.path or '/'
+        query = '&'.join(q for q in (parts.query, urlencode(params or {})) if q)
+        if query:
+            target += f"?{query}"
+
+        lines = [f"{method} {target} HTTP/1.1", f"Host: {parts.netloc}", "Accept-Encoding: identity"]
+        lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+        if data is not None:
+            lines.append(f"Content-Length: {len(data)}")
+        raw_request = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + (data or b'')
+
+        return await asyncio.wait_for(self._send(key, raw_request, method), timeout)
+
+    async def _send(self, key, raw_request, method):
+        """Send on an idle connection if one is usable, moving on when the server already closed it"""
+        while True:
+            connection = self._checkout(key)
+            reused = connection is not None
+            if connection is None:
+                connection = await self._connect(*key)
+
+            try:
+                return await self._exchange(key, connection, raw_request, method)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                connection[1].close()
+                if reused:
+                    continue  # The server closed the idle keep-alive connection
+                raise
+            except BaseException:
+                connection[1].close()
+                raise
+
+    async def _exchange(self, key, connection, raw_request, method):
+        """Write the request and read the full response from one connection"""
+        reader, writer = connection
+        writer.write(raw_request)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed by server")
+        try:
+            status_code = int(status_line.split()[1])
+        except (IndexError, ValueError):
+            raise ValueError(f"Malformed HTTP status line: {status_line[:64]!r}")
+
+        headers = _Headers()
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = headers.get('connection', '').lower() != 'close'
+        if method == 'HEAD' or status_code in (204, 304) or status_code < 200:
+            content = b''
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    # Skip trailers up to the terminating blank line
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            content = b''.join(chunks)
+        elif headers.get('content-length') is not None:
+            content = await reader.readexactly(int(headers.get('content-length')))
+        else:
+            content = await reader.read()
+            keep_alive = False
+
+        if keep_alive:
+            self._checkin(key, connection)
+        else:
+            writer.close()
+        return AsyncResponse(status_code, headers, content)
+
+    async def close(self):
+        """Close every idle connection"""
+        idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for _, writer in connections:
+                writer.close()
+                try:
+                    await writer.wait_closed()
+                except Exception:
+                    pass
+
+class AsyncAbuseIPDBClient(AbuseIPDBClient):
+    """asyncio variant of AbuseIPDBClient sharing its rate limiter, quota, cache and exceptions"""
+
+    def __init__(self, config, transport=None):
+        super().__init__(config)
+        self.transport = transport or AsyncHTTPTransport()
+        self._semaphore = asyncio.Semaphore(self.max_workers)  # Concurrent requests in flight
+
+    def update_config(self, config):
+        """Apply reloaded configuration, resizing the concurrency limit"""
+        super().update_config(config)
+        self._semaphore = asyncio.Semaphore(self.max_workers)
+
+    def _schedule_revalidation(self, ip_address):
+        """Refresh a stale cache entry as a task on the running event loop"""
+        self.cache.revalidate_async(ip_address, self._fetch_report)
+
+    async def check_ip(self, ip_address):
+        """Check a single IP against AbuseIPDB API with proper error handling"""
+        if not self._validate_api_config():
+            raise Exception("API configuration invalid")
+
+        state, report_data = self.lookup_cache(ip_address)
+        if report_data is not None:
+            return report_data
+        if state == CACHE_NEGATIVE:
+            raise APIValidationError(f"Invalid IP address (cached): {ip_address}")
+
+        return await self.fetch_report(ip_address)
+
+    async def fetch_report(self, ip_address):
+        """Request a check report from the API, bypassing and then refreshing the cache.
+        When another process is already looking the IP up, wait for and reuse its response."""
+        return (await self._fetch_report(ip_address))[0]
+
+    async def _fetch_report(self, ip_address):
+        """fetch_report returning (report, api_requests), 0 requests when another process's response was reused"""
+        if self.cache is None:
+            return await self._request_report(ip_address), 1
+
+        lease = self.cache.acquire_lease(ip_address)
+        while lease is None:
+            await asyncio.sleep(LEASE_POLL_INTERVAL)
+            shared = self.cache.shared_result(ip_address)
+            if shared is not None:
+                return self._shared_report(ip_address, *shared), 0
+            lease = self.cache.acquire_lease(ip_address)
+
+        try:
+            return await self._request_report(ip_address), 1
+        finally:
+            self.cache.release_lease(ip_address, lease)
+
+    async def _request_report(self, ip_address):
+        """Send the check request and cache its outcome"""
+        params = {
+            'ipAddress': ip_address,
+            'maxAgeInDays': self.max_age
+        }
+
+        try:
+            report_data = await self._api_get(self.api_endpoint, params, ip_address)
+        except APIValidationError:
+            if self.cache is not None:
+                self.cache.store_invalid(ip_address)
+            raise
+
+        log_message(f"API Success: {ip_address} scored {report_data.get('abuseConfidenceScore', 0)}%")
+        if self.cache is not None:
+            self.cache.store(ip_address, report_data)
+        return report_data
+
+    async def check_block(self, network):
+        """Check a whole subnet with one check-block request, returns ip -> report for reported addresses"""
+        if not self._validate_api_config():
+            raise Exception("API configuration invalid")
+
+        params = {
+            'network': network,
+            'maxAgeInDays': self.max_age
+        }
+
+        # Counts against the daily budget, but check-block has its own quota so its headers must not drive the check quota
+        block_data = await self._api_get(self.block_endpoint, params, network, track_quota=False)
+        reports = self._block_reports(block_data)
+        log_message(f"API Success: {network} has {len(reports)} reported addresses")
+        return reports
+
+    def fetch_blacklist(self, confidence_minimum=100, limit=10000):
+        """Synchronous download for refresh_blacklist, run on a private event loop outside async batches"""
+        async def fetch():
+            try:
+                return await self.fetch_blacklist_async(confidence_minimum, limit)
+            finally:
+                # Pooled connections belong to this loop
+                await self.transport.close()
+
+        return asyncio.run(fetch())
+
+    async def fetch_blacklist_async(self, confidence_minimum=100, limit=10000):
+        """Download high-confidence IPs from the blacklist endpoint"""
+        if not self._validate_api_config():
+            raise Exception("API configuration invalid")
+
+        params = {
+            'confidenceMinimum': confidence_minimum,
+            'limit': limit
+        }
+
+        # The blacklist endpoint has its own quota, so it takes nothing from the check budget
+        entries = await self._api_get(self.blacklist_endpoint, params, 'blacklist', track_quota=False, metered=False)
+        log_message(f"API Success: blacklist returned {len(entries)} addresses")
+        return entries
+
+    async def _api_get(self, url, params, subject, track_quota=True, metered=True):
+        """GET an API endpoint, retrying transient failures with jittered backoff behind the circuit breaker"""
+        attempt = 0
+        while True:
+            self._check_circuit()
+            try:
+                data = await self._api_get_attempt(url, params, subject, track_quota, metered)
+            except APIError as e:
+                delay = self._retry_delay(e, attempt, subject)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self.circuit_breaker.record_success()
+            return data
+
+    async def _api_get_attempt(self, url, params, subject, track_quota=True, metered=True):
+        """GET an API endpoint through the rate limiter and semaphore, returning the response 'data' object"""
+        headers = {
+            'Key': self.api_key,
+            'Accept': 'application/json'
+        }
+        waited_for_reset = False
+        while True:
+            # Unmetered endpoints stay out of the daily check budget
+            await self._enforce_rate_limit(metered, track_quota)
+
+            try:
+                log_message(f"API Request: Checking {subject}")
+                async with self._semaphore:
+                    response = await self.transport.request('GET', url, params=params, headers=headers, timeout=10)
+                data = self._handle_response(response, subject, track_quota, waited_for_reset, metered)
+
+            except asyncio.TimeoutError as e:
+                error_msg = f"Request timeout: {str(e) or 'no response within 10s'}"
+                log_message(f"API Timeout: {error_msg}")
+                raise APITimeoutError(error_msg)
+
+            except (OSError, EOFError) as e:
+                error_msg = f"Connection error: {str(e)}"
+                log_message(f"API Connection Error: {error_msg}")
+                raise APIConnectionError(error_msg)
+
+            except ValueError as e:
+                error_msg = f"Request error: {str(e)}"
+                log_message(f"API Request Error: {error_msg}")
+                raise APIRequestError(error_msg)
+
+            if data is RETRY:
+                waited_for_reset = True
+                continue
+            return data
+
+    async def _enforce_rate_limit(self, metered=True, track_quota=True):
+        """Wait for a token from the shared bucket without blocking the event loop"""
+        while True:
+            wait_time = self.rate_limiter.reserve(metered, track_quota)
+            if wait_time is None:
+                raise self._budget_exhausted_error()
+            if wait_time == 0:
+                return
+            await asyncio.sleep(wait_time)
+
+    async def iter_check_ips(self, ip_list, max_checks=None, max_workers=None):
+        """Check IPs concurrently, yielding (ip, report, error) as each completes.
+        Same budget, check-block and error semantics as AbuseIPDBClient.iter_check_ips."""
+        if not self._validate_api_config():
+            raise Exception("API configuration invalid")
+
+        local_results, ip_list = self._resolve_locally(ip_list)
+        for result in local_results:
+            yield result
+
+        tasks = self._plan_tasks(ip_list)
+        budget = len(ip_list) if max_checks is None else max_checks  # One unit per API request
+        workers = max(1, max_workers or self.max_workers)
+        in_flight = {}
+        stopped = False
+        blocks_failed = False
+        circuit_error = None
+
+        try:
+            while True:
+                while not stopped and budget > 0 and tasks and len(in_flight) < workers:
+                    network, members = tasks.popleft()
+                    if network and blocks_failed:
+                        # check-block unavailable, fall back to single lookups
+                        tasks.extendleft((None, [ip]) for ip in reversed(members))
+                        continue
+                    in_flight[asyncio.ensure_future(self._run_check_task(network, members))] = (network, members)
+                    budget -= 1
+
+                if not in_flight:
+                    break
+
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    network, members = in_flight.pop(future)
+                    try:
+                        reports = future.result()
+                    except (APIAuthenticationError, APICircuitOpenError) as e:
+                        stopped = True
+                        if isinstance(e, APICircuitOpenError):
+                            circuit_error = e
+                        for ip in members:
+                            yield ip, None, e
+                        continue
+                    except Exception as e:
+                        if network:
+                            log_message(f"check-block failed for {network}, using single lookups: {str(e)}")
+                            blocks_failed = True
+                            budget += 1
+                            tasks.extendleft((None, [ip]) for ip in reversed(members))
+                            continue
+                        if isinstance(e, APIRateLimitError):
+                            # No point in sending more requests, let in-flight ones finish
+                            stopped = True
+                        yield members[0], None, e
+                        continue
+
+                    for ip in members:
+                        yield ip, reports[ip], None
+
+            if circuit_error is not None:
+                for result in self._fail_queued(tasks, circuit_error):
+                    yield result
+        finally:
+            # Consumer stopped early
+            for future in in_flight:
+                future.cancel()
+
+    async def _run_check_task(self, network, members):
+        """Task body: one check or one check-block request, returns ip -> report"""
+        if network is None:
+            return {members[0]: await self.check_ip(members[0])}
+        return self._block_task_results(await self.check_block(network), members)
+
+    async def batch_check_ips(self, ip_list, max_checks=None):
+        """Check multiple IPs concurrently with built-in rate limiting and error handling"""
+        results = {}
+        checks_performed = 0
+
+        async for ip, report, error in self.iter_check_ips(ip_list, max_checks):
+            if error is None:
+                results[ip] = {'status': 'success', 'data': report}
+                checks_performed += 1
+            elif isinstance(error, APIRateLimitError):
+                log_message(f"Rate limit hit during batch check at IP {ip}")
+                results[ip] = {'status': 'rate_limited', 'error': str(error)}
+            elif isinstance(error, APICircuitOpenError):
+                results[ip] = {'status': 'circuit_open', 'error': str(error)}
+            elif isinstance(error, (APIAuthenticationError, APIConnectionError)):
+                log_message(f"Critical API error during batch check: {str(error)}")
+                results[ip] = {'status': 'critical_error', 'error': str(error)}
+            else:
+                log_message(f"Error checking IP {ip} in batch: {str(error)}")
+                results[ip] = {'status': 'error', 'error': str(error)}
+
+        return {
+            'results': results,
+            'checks_performed': checks_performed,
+            'total_requested': len(ip_list),
+            'circuit_breaker': self.circuit_breaker.get_state()
+        }
+
+    async def test_connection(self):
+        """Test API connectivity and authentication"""
+        test_ip = "8.8.8.8"  # Google DNS - safe test IP
+
+        try:
+            result = await self.check_ip(test_ip)
+            return {
+                'status': 'success',
+                'message': 'API connection successful',
+                'test_ip': test_ip,
+                'response': result
+            }
+        except APIAuthenticationError:
+            return {
+                'status': 'auth_error',
+                'message': 'API key authentication failed'
+            }
+        except APIConnectionError:
+            return {
+                'status': 'connection_error',
+                'message': 'Unable to connect to AbuseIPDB API'
+            }
+        except Exception as e:
+            return {
+                'status': 'error',
+                'message': f'API test failed: {str(e)}'
+            }
+
+    async def close(self):
+        """Finish background revalidations and close pooled connections"""
+        if self.cache is not None:
+            await self.cache.wait_async()
+        await self.transport.close()
+
+    def get_api_status(self):
+        """Get current API client status"""
+        status = super().get_api_status()
+        status['session_active'] = bool(self.transport._idle)
+        status['transport'] = 'asyncio'
+        return status
+
+class AsyncNtfyClient(NtfyClient):
+    """asyncio variant of NtfyClient.send_threat_notification"""
+
+    def __init__(self, config, transport=None):
+        super().__init__(config)
+        self.transport = transport or AsyncHTTPTransport()
+
+    async def send_threat_notification(self, ip_address, abuse_score, threat_level, country='Unknown',
+                                       connection_details='', is_new_threat=False):
+        """Send ntfy notification for detected threat"""
+        if not self.should_notify(threat_level, abuse_score):
+            return {'status': 'skipped', 'reason': 'notification disabled for this threat level'}
+
+        try:
+            notification = self._build_threat_notification(ip_address, abuse_score, threat_level, country,
+                                                            connection_details, is_new_threat)
+            if notification is None:
+                return {'status': 'skipped', 'reason': 'threat level too low'}
+            headers, message, threat_text = notification
+
+            response = await self.transport.request('POST', self.url, headers=headers,
+                                                    data=message.encode('utf-8'), timeout=10)
+            return self._notification_result(response, ip_address, threat_text, abuse_score)
+
+        except (OSError, EOFError, asyncio.TimeoutError) as e:
+            error_msg = f"ntfy notification request failed: {str(e) or type(e).__name__}"
+            log_message(error_msg)
+            return {
+                'status': 'error',
+                'message': error_msg,
+                'exception': str(e)
+            }
+        except Exception as e:
+            error_msg = f"ntfy notification error: {str(e)}"
+            log_message(error_msg)
+            return {
+                'status': 'error',
+                'message': error_msg,
+                'exception': str(e)
+            }
+
+    async def close(self):
+        """Close pooled connections"""
+        await self.transport.close()
@@ -0,0 +1,105 @@
+#!/usr/local/bin/python3
+
+"""
+Backfill Module
+Parses large or rotated firewall logs in parallel byte-range chunks across all CPU cores
+"""
+
+import os
+import time
+import multiprocessing
+from .core_utils import log_message
+from .log_reader import open_log_file
+
+CHUNK_SIZE = 32 * 1024 * 1024  # bytes per task for plain log files
+MAX_CONNECTIONS_PER_IP = 20  # bound per-IP connection sets shipped back from workers
+
+# Per-process parser, built once by the pool initializer
+_worker_parser = None
+
+def _init_worker(config):
+    """Build the firewall log parser once per worker process"""
+    global _worker_parser
+    from .log_parser import FirewallLogParser
+    _worker_parser = FirewallLogParser(config)
+
+def _read_chunk_lines(path, start, end):
+    """Read the lines starting inside [start, end) with one bulk read, realigned to line boundaries"""
+    with open(path, 'rb') as f:
+        if start > 0:
+            # The line spanning the boundary belongs to the previous chunk
+            f.seek(start - 1)
+            start = start - 1 + len(f.readline())
+            if start >= end:
+                return []
+
+        f.seek(start)
+        data = f.read(end - start)
+        if data and not data.endswith(b'\n'):
+            # Finish the last line past the chunk end
+            data += f.readline()
+
+    return data.decode('utf-8', errors='ignore').splitlines()
+
+def _iter_file_lines(path):
+    """Yield all lines of a (possibly compressed) file"""
+    with open_log_file(path) as f:
+        for line in f:
+            yield line
+
+def _parse_chunk(task):
+    """Worker entry point: parse one chunk into ip -> connection strings"""
+    path, start, end = task
+    try:
+        lines = _iter_file_lines(path) if end is None else _read_chunk_lines(path, start, end)
+        result = _worker_parser.parse_lines_for_ips_with_connections(lines)
+        for ip, connections in result.items():
+            if len(connections) > MAX_CONNECTIONS_PER_IP:
+                result[ip] = set(list(connections)[:MAX_CONNECTIONS_PER_IP])
+        return path, result, None
+    except Exception as e:
+        return path, {}, str(e)
+
+def plan_chunks(paths, chunk_size=CHUNK_SIZE):
+    """Split plain files into byte ranges; compressed files are one task each (end=None)"""
+    tasks = []
+    for path in paths:
+        if path.endswith(('.gz', '.bz2')):
+            tasks.append((path, 0, None))
+            continue
+
+        try:
+            size = os.path.getsize(path)
+        except OSError as e:
+            log_message(f"Skipping unreadable log {path}: {str(e)}")
+            continue
+
+        for start in range(0, size, chunk_size):
+            tasks.append((path, start, min(start + chunk_size, size)))
+    return tasks
+
+def parallel_parse(config, paths, workers=None, chunk_size=CHUNK_SIZE):
+    """Parse log files in a process pool and merge the per-IP connection maps"""
+    tasks = plan_chunks(paths, chunk_size)
+    if not tasks:
+        return {}
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(tasks)))
+    log_message(f"Backfill: {len(paths)} files, {len(tasks)} chunks, {workers} workers")
+    started = time.time()
+
+    merged = {}
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(config,)) as pool:
+        for path, result, error in pool.imap_unordered(_parse_chunk, tasks):
+            if error:
+                log_message(f"Backfill error in {path}: {error}")
+                continue
+            for ip, connections in result.items():
+                existing = merged.get(ip)
+                if existing is None:
+                    merged[ip] = connections
+                elif len(existing) < MAX_CONNECTIONS_PER_IP:
+                    existing.update(connections)
+
+    log_message(f"Backfill parsed {len(merged)} external IPs in {time.time() - started:.1f}s")
+    return merged
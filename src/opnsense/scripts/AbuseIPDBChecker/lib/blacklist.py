@@ -0,0 +1,126 @@
+#!/usr/local/bin/python3
+
+"""
+Blacklist Snapshot Module
+Keeps a local index of the AbuseIPDB blacklist so known-bad IPs are classified without API quota
+"""
+
+import os
+import json
+import time
+import socket
+import bisect
+from array import array
+from .core_utils import log_message, DB_DIR
+
+BLACKLIST_FILE = os.path.join(DB_DIR, 'blacklist.idx')
+
+class BlacklistIndex:
+    """Sorted IPv4 integer array with parallel score/country arrays and the snapshot fetch time"""
+
+    def __init__(self, path=BLACKLIST_FILE):
+        self.path = path
+        self.fetched_at = 0
+        self.confidence_minimum = None
+        self._addresses = array('I')  # Sorted IPv4 addresses as integers
+        self._scores = array('B')
+        self._countries = array('H')  # Two ASCII characters packed into one value
+        self._mtime = None
+        self.reload_if_changed()
+
+    def __len__(self):
+        return len(self._addresses)
+
+    def reload_if_changed(self):
+        """(Re)load the snapshot when the file was replaced since the last load"""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return False
+        if mtime == self._mtime:
+            return False
+
+        try:
+            with open(self.path, 'rb') as f:
+                meta = json.loads(f.readline())
+                count = meta['count']
+                addresses, scores, countries = array('I'), array('B'), array('H')
+                addresses.fromfile(f, count)
+                scores.fromfile(f, count)
+                countries.fromfile(f, count)
+        except (OSError, ValueError, KeyError, EOFError) as e:
+            log_message(f"Ignoring unreadable blacklist snapshot: {str(e)}")
+            return False
+
+        self._addresses, self._scores, self._countries = addresses, scores, countries
+        self.fetched_at = meta.get('fetched_at', 0)
+        self.confidence_minimum = meta.get('confidence_minimum')
+        self._mtime = mtime
+        return True
+
+    def is_stale(self, max_age_hours):
+        """Whether the snapshot is missing or older than max_age_hours"""
+        return not self.fetched_at or time.time() - self.fetched_at > max_age_hours * 3600
+
+    def lookup(self, ip):
+        """Return a check-style report for a blacklisted IPv4 address, None if not listed"""
+        try:
+            value = int.from_bytes(socket.inet_aton(ip), 'big')
+        except OSError:
+            return None
+
+        index = bisect.bisect_left(self._addresses, value)
+        if index == len(self._addresses) or self._addresses[index] != value:
+            return None
+
+        country = self._countries[index]
+        return {
+            'ipAddress': ip,
+            'abuseConfidenceScore': self._scores[index],
+            'countryCode': (chr(country >> 8) + chr(country & 0xFF)) if country else 'Unknown',
+            'totalReports': 0,
+            'source': 'blacklist'
+        }
+
+    def save(self, entries, confidence_minimum=None):
+        """Write blacklist API entries as a new snapshot, replacing the old one atomically"""
+        rows = {}
+        for entry in entries:
+            try:
+                value = int.from_bytes(socket.inet_aton(entry['ipAddress']), 'big')
+            except (OSError, KeyError, TypeError):
+                continue  # IPv6 or malformed, the index only holds IPv4
+            code = (entry.get('countryCode') or '')[:2]
+            country = (ord(code[0]) << 8 | ord(code[1])) if len(code) == 2 and code.isascii() else 0
+            rows[value] = (max(0, min(100, int(entry.get('abuseConfidenceScore') or 0))), country)
+
+        addresses = array('I', sorted(rows))
+        scores = array('B', (rows[value][0] for value in addresses))
+        countries = array('H', (rows[value][1] for value in addresses))
+        meta = {'fetched_at': int(time.time()), 'count': len(addresses), 'confidence_minimum': confidence_minimum}
+
+        tmp_file = f"{self.path}.tmp"
+        with open(tmp_file, 'wb') as f:
+            f.write(json.dumps(meta).encode() + b'\n')
+            addresses.tofile(f)
+            scores.tofile(f)
+            countries.tofile(f)
+        os.replace(tmp_file, self.path)
+
+        self.reload_if_changed()
+        return len(addresses)
+
+def refresh_blacklist(api_client, config, index=None):
+    """Download the blacklist endpoint into the local snapshot"""
+    if index is None:
+        index = BlacklistIndex()
+    confidence_minimum = config.get('blacklist_confidence_minimum', 100)
+
+    try:
+        entries = api_client.fetch_blacklist(confidence_minimum, config.get('blacklist_limit', 10000))
+        count = index.save(entries, confidence_minimum)
+        log_message(f"Blacklist snapshot updated: {count} IPv4 addresses (confidence >= {confidence_minimum})")
+        return {'status': 'ok', 'message': f'Blacklist snapshot updated with {count} addresses', 'count': count}
+    except Exception as e:
+        log_message(f"Error updating blacklist snapshot: {str(e)}")
+        return {'status': 'error', 'message': f'Error updating blacklist: {str(e)}'}
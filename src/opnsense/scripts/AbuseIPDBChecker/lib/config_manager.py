@@ -11,6 +11,37 @@ from .core_utils import log_message, CONFIG_DIR
 
 CONFIG_FILE = os.path.join(CONFIG_DIR, 'abuseipdbchecker.conf')
 
+def _optional_int(value):
+    """Integer option where an empty value means unset"""
+    return int(value) if value.strip() else None
+
+def _flag(value):
+    """Checkbox option"""
+    return value == '1'
+
+# [api] tuning options: INI option -> (config key, parser)
+API_TUNING_OPTIONS = {
+    'MaxWorkers': ('api_max_workers', int),
+    'RequestsPerSecond': ('api_requests_per_second', float),
+    'MaxRateLimitWait': ('api_max_rate_limit_wait', int),
+    'UseAsyncio': ('api_use_asyncio', _flag),
+    'BlockPrefix': ('api_block_prefix', int),
+    'BlockMinIps': ('api_block_min_ips', int),
+    'BreakerFailureThreshold': ('api_breaker_failure_threshold', int),
+    'BreakerCooldown': ('api_breaker_cooldown', int),
+    'InflightLeaseSeconds': ('api_inflight_lease_seconds', int),
+    'MaxDeferredIps': ('max_deferred_ips', int),
+    'BlacklistEnabled': ('blacklist_enabled', _flag),
+    'BlacklistRefreshHours': ('blacklist_refresh_hours', int),
+    'BlacklistConfidenceMinimum': ('blacklist_confidence_minimum', int),
+    'BlacklistLimit': ('blacklist_limit', int),
+    'CacheTtlCleanHours': ('cache_ttl_clean_hours', _optional_int),
+    'CacheTtlSuspiciousHours': ('cache_ttl_suspicious_hours', int),
+    'CacheTtlMaliciousHours': ('cache_ttl_malicious_hours', int),
+    'CacheTtlInvalidHours': ('cache_ttl_invalid_hours', int),
+    'CacheStaleHours': ('cache_stale_hours', int),
+}
+
 class ConfigManager:
     """Centralized configuration management"""
     
@@ -22,6 +53,8 @@ class ConfigManager:
         """Return default configuration values"""
         return {
             'log_file': '/var/log/filter/latest.log',
+            'log_archive_pattern': '',  # Empty = filter_*.log* next to log_file
+            'flow_retention_hours': 24,
             'check_frequency': 7,
             'suspicious_threshold': 40,
             'malicious_threshold': 70,
@@ -32,6 +65,25 @@ class ConfigManager:
             'api_endpoint': 'https://api.abuseipdb.com/api/v2/check',
             'max_age': 90,
             'daily_check_limit': 100,
+            'api_max_workers': 4,  # Concurrent lookups
+            'api_requests_per_second': 2,
+            'api_max_rate_limit_wait': 300,  # Seconds a 429 may pause a batch before giving up
+            'api_block_prefix': 24,  # Subnet size for check-block lookups
+            'api_block_min_ips': 4,  # Pending IPs in one subnet before check-block is used, 0 disables
+            'api_breaker_failure_threshold': 5,  # Consecutive connection/timeout/5xx failures before failing fast
+            'api_breaker_cooldown': 60,  # Seconds before probing a tripped API again
+            'api_use_asyncio': False,  # Run daemon batches on an asyncio event loop instead of threads
+            'blacklist_enabled': True,  # Answer known-bad IPs from a local blacklist snapshot
+            'blacklist_refresh_hours': 24,
+            'blacklist_confidence_minimum': 100,
+            'blacklist_limit': 10000,
+            'cache_ttl_clean_hours': None,  # Defaults to check_frequency days
+            'cache_ttl_suspicious_hours': 24,
+            'cache_ttl_malicious_hours': 72,
+            'cache_ttl_invalid_hours': 720,  # Addresses the API rejected with 422
+            'cache_stale_hours': 24,  # Expired responses still served while refreshing
+            'api_inflight_lease_seconds': 60,  # Longest wait for another process looking up the same IP
+            'max_deferred_ips': 1000,  # Unchecked IPs carried over to the next batch once the quota is spent
             'alias_enabled': True,
             'alias_include_suspicious': False,
             'alias_max_recent_hosts': 500,
@@ -89,6 +141,10 @@ class ConfigManager:
         # Remove Enabled loading completely
         if cp.has_option(section, 'LogFile'):
             self._config['log_file'] = cp.get(section, 'LogFile')
+        if cp.has_option(section, 'LogArchivePattern'):
+            self._config['log_archive_pattern'] = cp.get(section, 'LogArchivePattern')
+        if cp.has_option(section, 'FlowRetentionHours'):
+            self._config['flow_retention_hours'] = int(cp.get(section, 'FlowRetentionHours'))
         if cp.has_option(section, 'CheckFrequency'):
             self._config['check_frequency'] = int(cp.get(section, 'CheckFrequency'))
         if cp.has_option(section, 'SuspiciousThreshold'):
@@ -125,6 +181,13 @@ class ConfigManager:
             self._config['max_age'] = int(cp.get(section, 'MaxAge'))
         if cp.has_option(section, 'DailyCheckLimit'):
             self._config['daily_check_limit'] = int(cp.get(section, 'DailyCheckLimit'))
+        
+        for option, (key, parse) in API_TUNING_OPTIONS.items():
+            if cp.has_option(section, option):
+                try:
+                    self._config[key] = parse(cp.get(section, option))
+                except ValueError:
+                    log_message(f"Invalid value for {section}.{option}, using default {self._config[key]}")
     
     def _load_alias_section(self, cp):
         """Load alias configuration section"""
@@ -199,6 +262,24 @@ class ConfigManager:
         if self._config['suspicious_threshold'] >= self._config['malicious_threshold']:
             errors.append('Suspicious threshold must be less than malicious threshold')
         
+        # Check API tuning
+        if not 1 <= self._config['api_max_workers'] <= 32:
+            errors.append('Concurrent lookups must be between 1 and 32')
+        if self._config['api_requests_per_second'] <= 0:
+            errors.append('Requests per second must be greater than 0')
+        if not 24 <= self._config['api_block_prefix'] <= 32:
+            errors.append('Check-block prefix must be between 24 and 32')
+        if not 25 <= self._config['blacklist_confidence_minimum'] <= 100:
+            errors.append('Blacklist confidence minimum must be between 25 and 100')
+        if self._config['blacklist_limit'] < 1:
+            errors.append('Blacklist limit must be at least 1')
+        cache_hours = [self._config[key] for key in ('cache_ttl_suspicious_hours', 'cache_ttl_malicious_hours',
+                                                     'cache_ttl_invalid_hours', 'cache_stale_hours')]
+        if self._config['cache_ttl_clean_hours'] is not None:
+            cache_hours.append(self._config['cache_ttl_clean_hours'])
+        if min(cache_hours) < 0:
+            errors.append('Cache lifetimes cannot be negative')
+        
         # Check OPNsense API credentials for alias
         if self._config['alias_enabled']:
             if not self._config['opnsense_api_key'] or not self._config['opnsense_api_secret']:
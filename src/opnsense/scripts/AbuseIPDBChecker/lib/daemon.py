@@ -6,14 +6,16 @@ Handles daemon operations, batch processing, and automated threat detection with
 """
 
 import os
-import sys
 import time
 import signal
 import json
+import asyncio
 import subprocess
+from collections import Counter
 from datetime import datetime, timedelta
-from .core_utils import log_message, classify_threat_level, get_threat_level_text
+from .core_utils import log_message, classify_threat_level, get_threat_level_text, get_db_timestamp
 from .ntfy_client import NtfyClient
+from .api_client import TRANSIENT_ERRORS
 
 class DaemonManager:
     """Enhanced daemon operations with batch processing, alias updates, and port tracking"""
@@ -24,13 +26,26 @@ class DaemonManager:
         self.db_manager = db_manager
         self.running = False
         self.batch_interval = 15  # seconds
-        self.poll_interval = 2.5  # seconds
+        self.poll_interval = 2.5  # seconds, wait after activity
+        self.max_idle_wait = 60  # seconds, upper bound of idle back-off
+        self.config_reload_interval = 50  # seconds
+        self.log_reader = None  # Persistent tail reader, only new log lines per poll
+        self.log_watcher = None  # Wakes the loop when the log changes
+        self.log_parser = None  # Rebuilt only when configuration is reloaded
+        self.api_client = None  # Kept across batches to reuse keep-alive connections
+        self.threat_ips = None  # Threat history for scheduling, reloaded with the configuration
+        self._wake_fds = None  # (read, write) pipe, written by the signal handler to end the current wait
+        self.last_blacklist_attempt = 0
+        self.blacklist_retry_interval = 3600  # seconds between failed snapshot downloads
         
     def start_daemon(self):
         """Start the daemon with signal handling and batch processing"""
         log_message(f"AbuseIPDB Checker daemon starting - PID: {os.getpid()}")
         
         # Set up signal handlers for graceful shutdown
+        self._wake_fds = os.pipe()
+        for fd in self._wake_fds:
+            os.set_blocking(fd, False)
         signal.signal(signal.SIGTERM, self._signal_handler)
         signal.signal(signal.SIGINT, self._signal_handler)
         
@@ -41,15 +56,28 @@ class DaemonManager:
         """Handle shutdown signals gracefully"""
         log_message(f"Received signal {signum}, stopping daemon gracefully")
         self.running = False
-        sys.exit(0)
+        # Waits resume after a handler returns, wake the log watcher so the loop reaches its cleanup
+        if self._wake_fds:
+            try:
+                os.write(self._wake_fds[1], b'\0')
+            except OSError:
+                pass
+
+    def _sleep(self, seconds):
+        """Sleep that ends early once a shutdown signal arrives"""
+        # Import locally to avoid circular imports
+        from .log_watcher import sleep_unless_woken
+        sleep_unless_woken(seconds, self._wake_fds[0] if self._wake_fds else None)
 
     def _run_daemon_loop(self):
         """Main daemon loop with batch collection and processing including port tracking"""
-        ip_connections = {}  # ip -> {ports: set, last_seen: timestamp}
+        ip_connections = {}  # ip -> {ports: set, last_seen: timestamp, hits: int}
         last_batch_time = time.time()
+        last_reload_time = time.time()
+        idle_wait = self.poll_interval
         poll_count = 0
         
-        log_message(f"Daemon configured: batch_interval={self.batch_interval}s, poll_interval={self.poll_interval}s")
+        log_message(f"Daemon configured: batch_interval={self.batch_interval}s, poll_interval={self.poll_interval}s, max_idle_wait={self.max_idle_wait}s")
         
         while self.running:
             try:
@@ -57,8 +85,14 @@ class DaemonManager:
                 current_time = time.time()
                 
                 # Reload configuration periodically
-                if poll_count % 20 == 0:  # Every 50 seconds
+                if current_time - last_reload_time >= self.config_reload_interval:
                     self.config_manager.reload()
+                    self.log_parser = None
+                    self.threat_ips = None  # Pick up threats removed or added outside the daemon
+                    last_reload_time = current_time
+                    self.db_manager.prune_flows(self.config_manager.get_config()['flow_retention_hours'])
+                    self.db_manager.prune_api_cache(self.config_manager.get_config()['cache_stale_hours'])
+                    self._refresh_blacklist_if_stale(self.config_manager.get_config())
                 
                 config = self.config_manager.get_config()
                 
@@ -67,17 +101,17 @@ class DaemonManager:
                 if validation['errors']:
                     log_message(f"Configuration errors detected: {', '.join(validation['errors'])}")
                     log_message("Skipping processing until configuration is fixed")
-                    time.sleep(self.poll_interval)
+                    self._sleep(self.poll_interval)
                     continue
                 
                 # Collect external IPs with port information from current logs
-                new_connections = self._collect_external_connections(config)
+                new_connections, new_hits = self._collect_external_connections(config)
                 new_count = 0
                 
                 if new_connections:
                     for ip, ports in new_connections.items():
                         if ip not in ip_connections:
-                            ip_connections[ip] = {'ports': set(), 'last_seen': current_time}
+                            ip_connections[ip] = {'ports': set(), 'last_seen': current_time, 'hits': 0}
                             new_count += 1
                         
                         # Convert ports to set and check for new ports
@@ -94,34 +128,87 @@ class DaemonManager:
                         # Add new ports and update last seen
                         ip_connections[ip]['ports'].update(new_ports_set)
                         ip_connections[ip]['last_seen'] = current_time
+                        ip_connections[ip]['hits'] += new_hits.get(ip, 1)
                 
                 if new_count > 0:
                     log_message(f"Poll #{poll_count}: Found {new_count} new external IPs")
                 
+                # Adaptive back-off: stay responsive after activity, slow down while idle
+                if new_connections:
+                    idle_wait = self.poll_interval
+                else:
+                    idle_wait = min(idle_wait * 2, self.max_idle_wait)
+                
                 # Check if it's time to process the batch
                 if current_time - last_batch_time >= self.batch_interval:
                     if ip_connections:
                         log_message(f"=== BATCH PROCESSING: {len(ip_connections)} unique IPs ===")
                         result = self._process_ip_batch_with_connections(ip_connections, config)
                         self._log_batch_result(result)
+                        # IPs that hit an unavailable API or did not fit the quota are retried with the next batch
+                        requeued = {ip: ip_connections[ip] for ip in result.get('requeue', ()) if ip in ip_connections}
+                        deferred = {ip: ip_connections[ip] for ip in result.get('deferred', ()) if ip in ip_connections}
                         ip_connections.clear()
+                        ip_connections.update(requeued)
+                        ip_connections.update(deferred)
+                        if requeued:
+                            log_message(f"Re-queued {len(requeued)} IPs for the next batch (API unavailable)")
+                        if deferred:
+                            log_message(f"Carried {len(deferred)} lower-priority IPs over to the next batch (API quota)")
                     else:
                         log_message("=== BATCH PROCESSING: No IPs to process ===")
                     
                     last_batch_time = current_time
                 
-                # Sleep until next poll
-                time.sleep(self.poll_interval)
+                # Wait for log activity, waking no later than the pending batch deadline
+                timeout = idle_wait
+                if ip_connections:
+                    timeout = min(timeout, max(0, last_batch_time + self.batch_interval - time.time()))
+                self._wait_for_log_activity(config, timeout)
                 
             except KeyboardInterrupt:
                 log_message("Received keyboard interrupt, stopping daemon")
                 break
             except Exception as e:
                 log_message(f"Error in daemon loop: {str(e)}")
-                time.sleep(self.poll_interval)
+                self._sleep(self.poll_interval)
         
+        if self.log_reader:
+            self.log_reader.close()
+        if self.log_watcher:
+            self.log_watcher.close()
+        if self.api_client:
+            self.api_client.close()
+            self._count_remaining_requests(self.api_client)
+        self.db_manager.close()
+        if self._wake_fds:
+            for fd in self._wake_fds:
+                os.close(fd)
+            self._wake_fds = None
         log_message("AbuseIPDB Checker daemon shutting down")
 
+    def _wait_for_log_activity(self, config, timeout):
+        """Block until the firewall log changes or timeout expires"""
+        try:
+            # Import locally to avoid circular imports
+            from .log_watcher import create_log_watcher
+            
+            if self.log_watcher is None or self.log_watcher.log_file != config['log_file']:
+                if self.log_watcher:
+                    self.log_watcher.close()
+                wake_fd = self._wake_fds[0] if self._wake_fds else None
+                self.log_watcher = create_log_watcher(config['log_file'], self.poll_interval, wake_fd)
+                log_message(f"Watching firewall log with {self.log_watcher.name} backend")
+            
+            return self.log_watcher.wait(timeout)
+        except Exception as e:
+            log_message(f"Error watching log file: {str(e)}")
+            if self.log_watcher:
+                self.log_watcher.close()
+            self.log_watcher = None
+            self._sleep(min(timeout, self.poll_interval))
+            return False
+
     def _format_connection_strings(self, connection_strings):
         """Format connection strings efficiently"""
         if not connection_strings:
@@ -146,15 +233,40 @@ class DaemonManager:
         return result
 
     def _collect_external_connections(self, config):
-        """Collect external IPs with full connection details from firewall logs"""
+        """Collect external IPs with full connection details from newly appended log lines"""
         try:
             # Import locally to avoid circular imports
             from .log_parser import FirewallLogParser
-            parser = FirewallLogParser(config)
-            return parser.parse_log_for_ips_with_connections(recent_only=True)
+            from .log_reader import LogTailReader, TAIL_STATE_FILE
+            
+            # (Re)create the tail reader when started or the log file setting changed
+            if self.log_reader is None or self.log_reader.log_file != config['log_file']:
+                if self.log_reader:
+                    self.log_reader.close()
+                self.log_reader = LogTailReader(config['log_file'], state_file=TAIL_STATE_FILE)
+                log_message(f"Tailing firewall log: {config['log_file']}")
+            
+            lines = self.log_reader.read_new_lines()
+            if not lines:
+                return {}, {}
+            
+            if self.log_parser is None:
+                self.log_parser = FirewallLogParser(config)
+            connections, records = self.log_parser.parse_lines_for_flows(lines)
+            
+            # Persist every ingested flow so the UI can query them without rereading the log
+            if records:
+                now = time.time()
+                self.db_manager.insert_flows(
+                    (record.epoch or now, record.src_ip, record.dst_ip, record.dst_port, record.protocol, record.action)
+                    for record in records
+                )
+            # Log hits per external IP, used to prioritize lookups
+            hits = Counter(record.src_ip for record in records if record.src_ip in connections)
+            return connections, hits
         except Exception as e:
             log_message(f"Error collecting connections: {str(e)}")
-            return {}
+            return {}, {}
 
     def _process_ip_batch_with_connections(self, ip_connections, config):
         """Process a batch of collected IPs with connection information"""
@@ -165,36 +277,37 @@ class DaemonManager:
             # Reset daily checks if needed
             self.db_manager.reset_daily_checks_if_needed()
             
-            # Check daily limits
+            # Check daily limits, capped by the quota last reported by the API
             daily_checks = int(self.db_manager.get_stat('daily_checks', '0'))
             daily_limit = config['daily_check_limit']
+            available_checks = self.db_manager.get_remaining_checks(daily_limit)
+            
+            # Import locally to avoid circular imports
+            from .scheduler import PriorityScheduler
+            
+            scheduler = PriorityScheduler(self.db_manager)
+            max_deferred = config.get('max_deferred_ips', 1000)
             
-            if daily_checks >= daily_limit:
+            if available_checks <= 0:
+                # Keep the most valuable IPs for when the quota resets
                 return {
                     'status': 'limited',
                     'message': f'Daily API limit reached ({daily_checks}/{daily_limit})',
-                    'ips_checked': 0, 'threats_detected': 0, 'skipped': len(ip_connections)
+                    'ips_checked': 0, 'threats_detected': 0, 'skipped': len(ip_connections),
+                    'deferred': list(scheduler.prioritize(ip_connections, self._get_threat_ips()))[:max_deferred]
                 }
             
             # Filter IPs that need checking
             ips_to_check = self._filter_ips_for_checking_with_connections(ip_connections, config)
             skipped_count = len(ip_connections) - len(ips_to_check)
             
-            # Limit to daily quota
-            available_checks = daily_limit - daily_checks
-            if len(ips_to_check) > available_checks:
-                original_to_check = ips_to_check.copy()
-                ips_to_check = dict(list(ips_to_check.items())[:available_checks])
-                skipped_count = len(ip_connections) - len(ips_to_check)
-            
             log_message(f"Enhanced batch filter: {len(ips_to_check)} to check, {skipped_count} skipped")
             
-            # Process each IP with connection information
-            result = self._check_ips_with_api_and_connections(ips_to_check, config)
-            result['skipped'] = skipped_count
-            
-            # Update statistics
-            self._update_batch_stats(result)
+            # Spend the available_checks API requests on the highest priority IPs first
+            ips_to_check = scheduler.prioritize(ips_to_check, self._get_threat_ips())
+            result = self._check_ips_with_api_and_connections(ips_to_check, config, available_checks)
+            result['deferred'] = result['deferred'][:max_deferred]
+            result['skipped'] = skipped_count + len(result['deferred'])
             
             # Auto-update alias ONLY if NEW threats detected
             if result.get('new_threats_detected', 0) > 0:
@@ -206,14 +319,33 @@ class DaemonManager:
             log_message(f"Error in process_ip_batch_with_connections: {str(e)}")
             return {'status': 'error', 'message': f'Enhanced batch processing error: {str(e)}'}
 
+    def _get_threat_ips(self):
+        """Threat history for the scheduler, loaded once per reload interval and kept current by _store_verdicts"""
+        if self.threat_ips is None:
+            try:
+                self.threat_ips = self.db_manager.get_threat_ip_set()
+            except Exception as e:
+                log_message(f"Error loading threat history for scheduling: {str(e)}")
+                return set()
+        return self.threat_ips
+
     def _filter_ips_for_checking_with_connections(self, ip_connections, config):
-        """Filter IPs that need to be checked based on frequency, keeping connection info"""
+        """Filter IPs without a usable cached response, keeping connection info.
+        Stale responses stay in use while they are refreshed in the background."""
+        # Import locally to avoid circular imports
+        from .response_cache import CACHE_EXPIRED, CACHE_NEGATIVE
+        
+        api_client = self._get_api_client(config)
         ips_to_check = {}
         
         for ip, connections in ip_connections.items():
-            existing = self.db_manager.get_checked_ip(ip)
+            state, report = api_client.lookup_cache(ip)
+            if report is not None or state == CACHE_NEGATIVE:
+                continue
             
+            existing = self.db_manager.get_checked_ip(ip) if state != CACHE_EXPIRED else None
             if existing:
+                # Checked before the response cache existed
                 last_checked = datetime.strptime(existing['last_checked'], '%Y-%m-%d %H:%M:%S')
                 if last_checked > (datetime.now() - timedelta(days=config['check_frequency'])):
                     continue
@@ -222,143 +354,337 @@ class DaemonManager:
         
         return ips_to_check
 
-    def _check_ips_with_api_and_connections(self, ips_to_check, config):
-        """Check IPs against AbuseIPDB API with connection information tracking"""
+    def _get_api_client(self, config):
+        """Return the long-lived API client, applying the current configuration"""
         # Import locally to avoid circular imports
         from .api_client import AbuseIPDBClient
+        from .response_cache import ResponseCache
         
-        api_client = AbuseIPDBClient(config)
+        if self.api_client is None:
+            self.api_client = AbuseIPDBClient(config)
+            self.api_client.load_quota_state(self.db_manager.get_api_quota())
+            self.api_client.circuit_breaker.load_state(self.db_manager.get_circuit_state())
+            self.api_client.cache = ResponseCache(self.db_manager, config)
+            self.api_client.cache.on_revalidated = self._apply_revalidated_report
+        else:
+            self.api_client.update_config(config)
+        return self.api_client
+
+    def _apply_revalidated_report(self, ip, report, api_requests):
+        """Bring checked_ips/threats in line with a response refreshed in the background"""
+        # Empty details keep the connections already stored for the IP
+        verdict = self._build_verdict(ip, report, self.config_manager.get_config(), '')
+        # The request itself reaches daily_checks through the client's request count
+        self._store_verdicts([verdict], {'total_checks': 1} if api_requests else None)
+
+    def _count_remaining_requests(self, api_client):
+        """Add requests not yet counted by a batch (late revalidations) to daily_checks"""
+        api_requests = api_client.take_request_count()
+        if api_requests:
+            self.db_manager.increment_stats({'daily_checks': api_requests})
+
+    def _format_connection_details(self, ip, connections):
+        """Normalise collected connections into the stored 'conn|conn' detail string"""
+        # FIX: Properly handle different connection data types
+        if isinstance(connections, set):
+            connection_strings = list(connections)
+        elif isinstance(connections, (list, tuple)):
+            connection_strings = list(connections)
+        elif isinstance(connections, str):
+            connection_strings = [connections]
+        else:
+            # Handle any other type - convert to string first
+            try:
+                connection_strings = [str(connections)]
+            except Exception as e:
+                log_message(f"Warning: Could not convert connections for {ip}: {str(e)}")
+                connection_strings = []
+
+        # FIX: Ensure we only work with strings and avoid slice objects
+        safe_connection_strings = []
+        for conn in connection_strings:
+            try:
+                # Ensure each connection is a string
+                if isinstance(conn, str):
+                    safe_connection_strings.append(conn)
+                else:
+                    safe_connection_strings.append(str(conn))
+            except Exception as e:
+                log_message(f"Warning: Skipping invalid connection for {ip}: {str(e)}")
+                continue
+
+        # Limit to 10 connections safely
+        limited_connections = safe_connection_strings[:10] if safe_connection_strings else []
+        return '|'.join(limited_connections)
+
+    def _refresh_blacklist_if_stale(self, config):
+        """Download a new blacklist snapshot once the current one is older than the refresh interval"""
+        if not config.get('blacklist_enabled', True):
+            return
+        if time.time() - self.last_blacklist_attempt < self.blacklist_retry_interval:
+            return
+        
+        try:
+            # Import locally to avoid circular imports
+            from .blacklist import refresh_blacklist
+            
+            api_client = self._get_api_client(config)
+            if api_client.blacklist is None or not api_client.blacklist.is_stale(config['blacklist_refresh_hours']):
+                return
+            
+            self.last_blacklist_attempt = time.time()
+            refresh_blacklist(api_client, config, api_client.blacklist)
+        except Exception as e:
+            log_message(f"Error refreshing blacklist snapshot: {str(e)}")
+
+    def _check_ips_with_api_and_connections(self, ips_to_check, config, max_checks=None):
+        """Check IPs concurrently against AbuseIPDB, storing all results in one transaction"""
+        if config.get('api_use_asyncio', False):
+            return asyncio.run(self._check_ips_async(ips_to_check, config, max_checks))
+        
+        api_client = self._get_api_client(config)
+        results_seen = set()
+        api_client.rate_limiter.set_daily_used(int(self.db_manager.get_stat('daily_checks', '0')))
         threats_detected = 0
         new_threats_detected = 0  # Track NEW threats only
-        ips_checked = 0
+        verdicts = []
+        requeue = []  # Failed on connection errors, timeouts or an open circuit breaker
         
+        connection_details_by_ip = {}
         for ip, connections in ips_to_check.items():
-            try:
-                # FIX: Properly handle different connection data types
-                if isinstance(connections, set):
-                    connection_strings = list(connections)
-                elif isinstance(connections, (list, tuple)):
-                    connection_strings = list(connections)
-                elif isinstance(connections, str):
-                    connection_strings = [connections]
-                else:
-                    # Handle any other type - convert to string first
-                    try:
-                        connection_strings = [str(connections)]
-                    except Exception as e:
-                        log_message(f"Warning: Could not convert connections for {ip}: {str(e)}")
-                        connection_strings = []
+            connection_details_by_ip[ip] = self._format_connection_details(ip, connections)
+        log_message(f"Checking {len(ips_to_check)} IPs with up to {api_client.max_workers} concurrent lookups")
+        
+        for ip, report, error in api_client.iter_check_ips(list(ips_to_check), max_checks):
+            results_seen.add(ip)
+            if error is not None:
+                log_message(f"Error checking IP {ip}: {str(error)}")
+                if isinstance(error, TRANSIENT_ERRORS):
+                    requeue.append(ip)
+                continue
+            
+            if report:
+                try:
+                    verdicts.append(self._build_verdict(ip, report, config, connection_details_by_ip[ip]))
+                except Exception as e:
+                    log_message(f"Error processing result for IP {ip}: {str(e)}")
+        
+        # Also counts revalidations that finished since the previous batch
+        api_requests = api_client.take_request_count()
+        self._store_batch(verdicts, api_requests, api_client)
+        
+        # Initialize ntfy client if enabled
+        ntfy_client = None
+        if any(verdict['threat_level'] >= 1 for verdict in verdicts):
+            if config.get('ntfy_enabled', False):
+                try:
+                    ntfy_client = NtfyClient(config)
+                    log_message(f"ntfy client initialized successfully - will notify on malicious: {config.get('ntfy_notify_malicious', True)}, suspicious: {config.get('ntfy_notify_suspicious', False)}")
+                except Exception as e:
+                    log_message(f"Failed to initialize ntfy client: {str(e)}")
+            else:
+                log_message("ntfy notifications disabled in configuration")
+        
+        for verdict in verdicts:
+            ip = verdict['ip']
+            threat_level = verdict['threat_level']
+            abuse_score = verdict['abuse_score']
+            was_threat = verdict['was_threat']
+            
+            # Handle threats
+            if threat_level >= 1:  # Suspicious or Malicious
+                threats_detected += 1
                 
-                # FIX: Ensure we only work with strings and avoid slice objects
-                safe_connection_strings = []
-                for conn in connection_strings:
+                # Only count as NEW threat if it wasn't a threat before
+                if not was_threat:
+                    new_threats_detected += 1
+
+                if ntfy_client:
                     try:
-                        # Ensure each connection is a string
-                        if isinstance(conn, str):
-                            safe_connection_strings.append(conn)
+                        log_message(f"Attempting to send ntfy notification for {ip} (threat_level: {threat_level}, score: {abuse_score}%)")
+                        
+                        # Send notification for detected threat
+                        ntfy_result = ntfy_client.send_threat_notification(
+                            ip_address=ip,
+                            abuse_score=abuse_score,
+                            threat_level=threat_level,
+                            country=verdict['country'],
+                            connection_details=verdict['connection_details'],
+                            is_new_threat=not was_threat
+                        )
+                        
+                        log_message(f"ntfy notification result for {ip}: {ntfy_result['status']} - {ntfy_result.get('message', 'no message')}")
+                        
+                        if ntfy_result['status'] == 'success':
+                            log_message(f"✓ ntfy notification sent successfully for {ip}")
+                        elif ntfy_result['status'] == 'skipped':
+                            log_message(f"ntfy notification skipped for {ip}: {ntfy_result.get('reason', 'unknown reason')}")
                         else:
-                            safe_connection_strings.append(str(conn))
+                            log_message(f"✗ ntfy notification failed for {ip}: {ntfy_result['message']}")
+                            
                     except Exception as e:
-                        log_message(f"Warning: Skipping invalid connection for {ip}: {str(e)}")
-                        continue
-                
-                # Limit to 10 connections safely
-                limited_connections = safe_connection_strings[:10] if safe_connection_strings else []
-                connection_details = '|'.join(limited_connections)
-                
-                log_message(f"Checking IP: {ip} (connections: {len(limited_connections)})")
-                
-                # Check if IP was previously a threat
-                existing_threat = self.db_manager.get_threat(ip)
-                was_threat = existing_threat is not None
-                
-                # Check against AbuseIPDB
-                report = api_client.check_ip(ip)
+                        log_message(f"Exception sending ntfy notification for {ip}: {str(e)}")
+                        import traceback
+                        log_message(f"Full traceback: {traceback.format_exc()}")
+                else:
+                    log_message(f"No ntfy notification sent for {ip} - ntfy_client: {ntfy_client is not None}, threat_level: {threat_level}")
+        
+        ips_checked = len(verdicts)
+        return {
+            'status': 'ok',
+            'ips_checked': ips_checked,
+            'api_requests': api_requests,
+            'deferred': [ip for ip in ips_to_check if ip not in results_seen],  # Left over once the budget ran out
+            'requeue': requeue,
+            'threats_detected': threats_detected,
+            'new_threats_detected': new_threats_detected,
+            'message': f'Enhanced batch processed: {ips_checked} checked, {threats_detected} threats ({new_threats_detected} new)'
+        }
+   
+    async def _check_ips_async(self, ips_to_check, config, max_checks=None):
+        """asyncio counterpart of _check_ips_with_api_and_connections, overlapping lookups on one thread"""
+        # Import locally to avoid circular imports
+        from .async_client import AsyncAbuseIPDBClient, AsyncNtfyClient
+        from .response_cache import ResponseCache
+        
+        # Connections belong to the event loop, so each batch gets its own client
+        api_client = AsyncAbuseIPDBClient(config)
+        api_client.load_quota_state(self.db_manager.get_api_quota())
+        api_client.circuit_breaker.load_state(self.db_manager.get_circuit_state())
+        api_client.rate_limiter.set_daily_used(int(self.db_manager.get_stat('daily_checks', '0')))
+        api_client.cache = ResponseCache(self.db_manager, config)
+        api_client.cache.on_revalidated = self._apply_revalidated_report
+        ntfy_client = AsyncNtfyClient(config) if config.get('ntfy_enabled', False) else None
+        
+        verdicts = []
+        requeue = []
+        results_seen = set()
+        threats_detected = 0
+        new_threats_detected = 0
+        log_message(f"Checking {len(ips_to_check)} IPs with up to {api_client.max_workers} concurrent async lookups")
+        
+        try:
+            async for ip, report, error in api_client.iter_check_ips(list(ips_to_check), max_checks):
+                results_seen.add(ip)
+                if error is not None:
+                    log_message(f"Error checking IP {ip}: {str(error)}")
+                    if isinstance(error, TRANSIENT_ERRORS):
+                        requeue.append(ip)
+                    continue
+                if not report:
+                    continue
                 
-                if report:
-                    abuse_score = report.get('abuseConfidenceScore', 0)
-                    threat_level = classify_threat_level(abuse_score, config)
-                    country = report.get('countryCode', 'Unknown')
-                    
-                    # Update database with connection information
-                    self.db_manager.update_checked_ip(ip, threat_level, country, connection_details)
-                    
-                    # Handle threats
-                    if threat_level >= 1:  # Suspicious or Malicious
-                        categories = self._extract_categories(report)
-                        self.db_manager.update_threat(ip, abuse_score, report.get('totalReports', 0), categories, country)
-                        threats_detected += 1
-                        
-                        # Only count as NEW threat if it wasn't a threat before
-                        if not was_threat:
-                            new_threats_detected += 1
-                            log_message(f"🚨 NEW THREAT DETECTED: {ip} (Score: {abuse_score}%, Level: {get_threat_level_text(threat_level)})")
-                        else:
-                            log_message(f"Updated existing threat: {ip} (Score: {abuse_score}%, Level: {get_threat_level_text(threat_level)})")
-
-                        # Initialize ntfy client if enabled
-                        ntfy_client = None
-                        if config.get('ntfy_enabled', False):
-                            try:
-                                ntfy_client = NtfyClient(config)
-                                log_message(f"ntfy client initialized successfully - will notify on malicious: {config.get('ntfy_notify_malicious', True)}, suspicious: {config.get('ntfy_notify_suspicious', False)}")
-                            except Exception as e:
-                                log_message(f"Failed to initialize ntfy client: {str(e)}")
-                        else:
-                            log_message("ntfy notifications disabled in configuration")
-
-                        if ntfy_client and threat_level >= 1:
-                            try:
-                                log_message(f"Attempting to send ntfy notification for {ip} (threat_level: {threat_level}, score: {abuse_score}%)")
-                                
-                                # Send notification for detected threat
-                                ntfy_result = ntfy_client.send_threat_notification(
-                                    ip_address=ip,
-                                    abuse_score=abuse_score,
-                                    threat_level=threat_level,
-                                    country=country,
-                                    connection_details=connection_details,
-                                    is_new_threat=not was_threat
-                                )
-                                
-                                log_message(f"ntfy notification result for {ip}: {ntfy_result['status']} - {ntfy_result.get('message', 'no message')}")
-                                
-                                if ntfy_result['status'] == 'success':
-                                    log_message(f"✓ ntfy notification sent successfully for {ip}")
-                                elif ntfy_result['status'] == 'skipped':
-                                    log_message(f"ntfy notification skipped for {ip}: {ntfy_result.get('reason', 'unknown reason')}")
-                                else:
-                                    log_message(f"✗ ntfy notification failed for {ip}: {ntfy_result['message']}")
-                                    
-                            except Exception as e:
-                                log_message(f"Exception sending ntfy notification for {ip}: {str(e)}")
-                                import traceback
-                                log_message(f"Full traceback: {traceback.format_exc()}")
-                        else:
-                            if threat_level >= 1:
-                                log_message(f"No ntfy notification sent for {ip} - ntfy_client: {ntfy_client is not None}, threat_level: {threat_level}")
-                    else:
-                        # Remove from threats if now safe
-                        if was_threat:
-                            log_message(f"IP now safe (removed from threats): {ip}")
-                        self.db_manager.remove_threat(ip)
-                    
-                    ips_checked += 1
-                    time.sleep(0.3)  # Rate limiting
-                    
-
-
-            except Exception as e:
-                log_message(f"Error checking IP {ip}: {str(e)}")
-                continue
+                try:
+                    connection_details = self._format_connection_details(ip, ips_to_check[ip])
+                    verdicts.append(self._build_verdict(ip, report, config, connection_details))
+                except Exception as e:
+                    log_message(f"Error processing result for IP {ip}: {str(e)}")
+            
+            api_requests = api_client.take_request_count()
+            self._store_batch(verdicts, api_requests, api_client)
+            
+            notifications = []
+            for verdict in verdicts:
+                if verdict['threat_level'] < 1:
+                    continue
+                threats_detected += 1
+                if not verdict['was_threat']:
+                    new_threats_detected += 1
+                if ntfy_client:
+                    # Sent concurrently once the batch is stored
+                    notifications.append(ntfy_client.send_threat_notification(
+                        ip_address=verdict['ip'],
+                        abuse_score=verdict['abuse_score'],
+                        threat_level=verdict['threat_level'],
+                        country=verdict['country'],
+                        connection_details=verdict['connection_details'],
+                        is_new_threat=not verdict['was_threat']
+                    ))
+            
+            for ntfy_result in await asyncio.gather(*notifications, return_exceptions=True):
+                if isinstance(ntfy_result, Exception):
+                    log_message(f"Exception sending ntfy notification: {str(ntfy_result)}")
+        finally:
+            await api_client.close()
+            # Revalidations still running when the batch was stored
+            self._count_remaining_requests(api_client)
+            if ntfy_client:
+                await ntfy_client.close()
         
+        ips_checked = len(verdicts)
         return {
             'status': 'ok',
             'ips_checked': ips_checked,
+            'api_requests': api_requests,
+            'deferred': [ip for ip in ips_to_check if ip not in results_seen],  # Left over once the budget ran out
+            'requeue': requeue,
             'threats_detected': threats_detected,
             'new_threats_detected': new_threats_detected,
             'message': f'Enhanced batch processed: {ips_checked} checked, {threats_detected} threats ({new_threats_detected} new)'
         }
+
+    def _build_verdict(self, ip, report, config, connection_details):
+        """Classify a check report into the values stored for the IP"""
+        abuse_score = report.get('abuseConfidenceScore', 0)
+        return {
+            'ip': ip,
+            'abuse_score': abuse_score,
+            'threat_level': classify_threat_level(abuse_score, config),
+            'country': report.get('countryCode', 'Unknown'),
+            'reports': report.get('totalReports', 0),
+            'categories': self._extract_categories(report),
+            'connection_details': connection_details
+        }
+
+    def _store_verdicts(self, verdicts, stat_increments=None, stats=None):
+        """Store verdicts in one transaction, marking each with was_threat"""
+        try:
+            previous_threats = self.db_manager.write_verdicts(verdicts, stat_increments, stats)
+        except Exception:
+            if len(verdicts) <= 1:
+                raise
+            # Keep every result that can be stored instead of losing the whole batch
+            log_message(f"Batch write failed, storing {len(verdicts)} results one by one")
+            previous_threats = set()
+            for verdict in verdicts:
+                try:
+                    # Counters ride along with the first row that stores, so they are applied exactly once
+                    previous_threats |= self.db_manager.write_verdicts([verdict], stat_increments, stats)
+                    stat_increments = stats = None
+                except Exception as e:
+                    log_message(f"Error storing result for IP {verdict['ip']}: {str(e)}")
+            if stat_increments or stats:
+                self.db_manager.write_verdicts([], stat_increments, stats)
+        
+        for verdict in verdicts:
+            verdict['was_threat'] = verdict['ip'] in previous_threats
+            ip = verdict['ip']
+            if self.threat_ips is not None:
+                if verdict['threat_level'] >= 1:
+                    self.threat_ips.add(ip)
+                else:
+                    self.threat_ips.discard(ip)
+            abuse_score = verdict['abuse_score']
+            threat_level = verdict['threat_level']
+            if threat_level >= 1:  # Suspicious or Malicious
+                if not verdict['was_threat']:
+                    log_message(f"🚨 NEW THREAT DETECTED: {ip} (Score: {abuse_score}%, Level: {get_threat_level_text(threat_level)})")
+                else:
+                    log_message(f"Updated existing threat: {ip} (Score: {abuse_score}%, Level: {get_threat_level_text(threat_level)})")
+            elif verdict['was_threat']:
+                log_message(f"IP now safe (removed from threats): {ip}")
+        return verdicts
+
+    def _store_batch(self, verdicts, api_requests, api_client):
+        """Store a batch's verdicts together with its counters and the API quota and breaker state"""
+        stats = {'last_check': get_db_timestamp()}
+        # Keep the API-reported quota as the authoritative daily budget
+        stats.update(self.db_manager.api_quota_stats(api_client.get_quota_state()))
+        stats.update(self.db_manager.circuit_state_stats(api_client.circuit_breaker.get_state()))
+        # check-block classifies many IPs with one request, so count requests against the limit
+        stat_increments = {'daily_checks': api_requests, 'total_checks': len(verdicts)}
+        return self._store_verdicts(verdicts, stat_increments, stats)
+
    
     def _extract_categories(self, report):
         """Extract categories from API report"""
@@ -368,18 +694,6 @@ class DaemonManager:
                 categories = ','.join(str(cat) for cat in report['reports'][0]['categories'])
         return categories
     
-    def _update_batch_stats(self, result):
-        """Update database statistics after batch processing"""
-        if result['status'] == 'ok':
-            current_daily = int(self.db_manager.get_stat('daily_checks', '0'))
-            self.db_manager.update_stat('daily_checks', current_daily + result['ips_checked'])
-            
-            total_checks = int(self.db_manager.get_stat('total_checks', '0'))
-            self.db_manager.update_stat('total_checks', total_checks + result['ips_checked'])
-            
-            from .core_utils import get_db_timestamp
-            self.db_manager.update_stat('last_check', get_db_timestamp())
-
     def _auto_update_alias(self, config, new_threats_count):
         """Automatically update alias when NEW threats detected"""
         try:
@@ -445,10 +759,12 @@ class DaemonManager:
                 'daemon_running': daemon_running,
                 'daemon_pid': result.stdout.strip() if daemon_running else None,
                 'batch_interval': f'{self.batch_interval} seconds',
-                'poll_interval': f'{self.poll_interval} seconds',
+                'poll_interval': f'{self.poll_interval} seconds (event-driven, idle back-off up to {self.max_idle_wait} seconds)',
                 'recent_batches': recent_batches,
                 'daily_checks_used': stats.get('daily_checks', '0'),
                 'daily_limit': config.get('daily_check_limit', 100),
+                'api_quota': self.db_manager.get_api_quota() if self.db_manager else None,
+                'api_circuit_breaker': self.db_manager.get_circuit_state() if self.db_manager else None,
                 'api_configured': bool(config.get('api_key') and config.get('api_key') != 'YOUR_API_KEY'),
                 'alias_configured': bool(config.get('opnsense_api_key') and config.get('opnsense_api_secret')),
                 'enhanced_features': 'Port tracking enabled'
@@ -7,148 +7,114 @@ Handles all SQLite database operations with new features:
 - Port tracking  
 - Pagination support
 - Search functionality
+- Parsed flow store for log-free UI queries
 """
 
 import os
+import json
+import time
+import base64
+import socket
 import sqlite3
+import threading
 from datetime import datetime, timedelta
 from .core_utils import log_message, get_db_timestamp, DB_DIR
+from .migrations import migrate, SCHEMA_VERSION
 
 DB_FILE = os.path.join(DB_DIR, 'abuseipdb.db')
 
+# Flow actions are stored as small integers
+FLOW_ACTIONS = {'pass': 0, 'block': 1, 'reject': 2}
+FLOW_ACTION_NAMES = {value: name for name, value in FLOW_ACTIONS.items()}
+FLOW_PROTOCOL_NAMES = {1: 'icmp', 2: 'igmp', 6: 'tcp', 17: 'udp'}
+
+BUSY_TIMEOUT = 5000  # Milliseconds a statement waits for a lock held by another process
+STATEMENT_CACHE_SIZE = 256  # Prepared statements kept per connection
+
+# Applied to every connection, WAL lets UI readers run while the daemon writes
+CONNECTION_PRAGMAS = (
+    ('busy_timeout', BUSY_TIMEOUT),
+    ('synchronous', 'NORMAL'),  # No fsync per commit, WAL stays consistent on power loss
+    ('cache_size', -8192),  # Negative is KiB instead of pages
+    ('mmap_size', 67108864),
+    ('temp_store', 'MEMORY'),
+)
+
+SQL_VARIABLE_CHUNK = 500  # IPs per IN (...) lookup, below SQLite's bound parameter limit
+PAGE_TOTAL_TTL = 60  # Seconds an unfiltered page total is served from stats before recounting
+
+# Adds to a counter stat, atomic against concurrent writers unlike a read-modify-write
+STAT_INCREMENT_SQL = '''
+    INSERT INTO stats (key, value) VALUES (?, ?)
+    ON CONFLICT(key) DO UPDATE SET value = CAST(CAST(value AS INTEGER) + CAST(excluded.value AS INTEGER) AS TEXT)
+'''
+
+_local = threading.local()  # Per-thread connections, keyed by database file
+_inherited_connections = []  # Opened before a fork, kept referenced so the child never closes them
+
+def ip_to_int(ip):
+    """Pack a dotted IPv4 address into an integer"""
+    return int.from_bytes(socket.inet_aton(ip), 'big')
+
+def int_to_ip(value):
+    """Unpack an integer into a dotted IPv4 address"""
+    return socket.inet_ntoa(value.to_bytes(4, 'big'))
+
 class DatabaseManager:
     """Centralized database operations with enhanced functionality"""
     
-    def __init__(self):
-        self.db_file = DB_FILE
+    def __init__(self, db_file=None):
+        self.db_file = db_file or DB_FILE
         self._ensure_database()
     
     def _ensure_database(self):
-        """Ensure database exists and is properly initialized"""
-        if not os.path.exists(self.db_file):
-            log_message("Database not found, initializing...")
-            self._initialize_database()
-        else:
-            # Check for schema updates
-            self._update_schema()
-    
-    def _initialize_database(self):
-        """Initialize database with required tables including new columns"""
+        """Ensure database exists and its schema is at the current version"""
         try:
-            os.makedirs(DB_DIR, mode=0o750, exist_ok=True)
-            
-            with self.get_connection() as conn:
-                c = conn.cursor()
-                
-                # Create enhanced checked_ips table
-                c.execute('''
-                CREATE TABLE IF NOT EXISTS checked_ips (
-                    ip TEXT PRIMARY KEY,
-                    first_seen TEXT,
-                    last_checked TEXT,
-                    check_count INTEGER,
-                    threat_level INTEGER DEFAULT 0,
-                    country TEXT DEFAULT 'Unknown',
-                    destination_port TEXT DEFAULT ''
-                )
-                ''')
-                
-                # Create enhanced threats table
-                c.execute('''
-                CREATE TABLE IF NOT EXISTS threats (
-                    ip TEXT PRIMARY KEY,
-                    abuse_score INTEGER,
-                    reports INTEGER,
-                    last_seen TEXT,
-                    categories TEXT,
-                    country TEXT,
-                    threat_level INTEGER DEFAULT 2,
-                    marked_safe BOOLEAN DEFAULT 0,
-                    marked_safe_date TEXT DEFAULT '',
-                    marked_safe_by TEXT DEFAULT '',
-                    FOREIGN KEY (ip) REFERENCES checked_ips(ip)
-                )
-                ''')
-                
-                # Create stats table
-                c.execute('''
-                CREATE TABLE IF NOT EXISTS stats (
-                    key TEXT PRIMARY KEY,
-                    value TEXT
-                )
-                ''')
-                
-                # Initialize stats
-                c.execute('INSERT OR IGNORE INTO stats (key, value) VALUES (?, ?)', ('last_check', 'Never'))
-                c.execute('INSERT OR IGNORE INTO stats (key, value) VALUES (?, ?)', ('daily_checks', '0'))
-                c.execute('INSERT OR IGNORE INTO stats (key, value) VALUES (?, ?)', ('total_checks', '0'))
-                c.execute('INSERT OR IGNORE INTO stats (key, value) VALUES (?, ?)', ('last_reset', ''))
-                
-                conn.commit()
-                log_message("Enhanced database initialized successfully")
-                
+            os.makedirs(os.path.dirname(self.db_file), mode=0o750, exist_ok=True)
+            version = migrate(self.get_connection())
+            if version > SCHEMA_VERSION:
+                log_message(f"Database schema version {version} is newer than this plugin ({SCHEMA_VERSION})")
         except Exception as e:
-            log_message(f"Error initializing database: {str(e)}")
+            log_message(f"Error migrating database schema: {str(e)}")
             raise
 
-    def _update_schema(self):
-        """Update existing database schema with new columns"""
-        try:
-            with self.get_connection() as conn:
-                c = conn.cursor()
-                
-                # Check and add new columns to checked_ips
-                c.execute('PRAGMA table_info(checked_ips)')
-                columns = [column[1] for column in c.fetchall()]
-                
-                if 'country' not in columns:
-                    c.execute('ALTER TABLE checked_ips ADD COLUMN country TEXT DEFAULT "Unknown"')
-                    log_message("Added country column to checked_ips")
-                
-                if 'threat_level' not in columns:
-                    c.execute('ALTER TABLE checked_ips ADD COLUMN threat_level INTEGER DEFAULT 0')
-                    log_message("Added threat_level column to checked_ips")
-                
-                if 'destination_port' not in columns:
-                    c.execute('ALTER TABLE checked_ips ADD COLUMN destination_port TEXT DEFAULT ""')
-                    log_message("Added destination_port column to checked_ips")
-                
-                # NEW: Add connection_details column to store full connection info
-                if 'connection_details' not in columns:
-                    c.execute('ALTER TABLE checked_ips ADD COLUMN connection_details TEXT DEFAULT ""')
-                    log_message("Added connection_details column to checked_ips")
-                
-                # Check and add new columns to threats
-                c.execute('PRAGMA table_info(threats)')
-                threat_columns = [column[1] for column in c.fetchall()]
-                
-                if 'threat_level' not in threat_columns:
-                    c.execute('ALTER TABLE threats ADD COLUMN threat_level INTEGER DEFAULT 2')
-                    log_message("Added threat_level column to threats")
-                
-                if 'marked_safe' not in threat_columns:
-                    c.execute('ALTER TABLE threats ADD COLUMN marked_safe BOOLEAN DEFAULT 0')
-                    log_message("Added marked_safe column to threats")
-                
-                if 'marked_safe_date' not in threat_columns:
-                    c.execute('ALTER TABLE threats ADD COLUMN marked_safe_date TEXT DEFAULT ""')
-                    log_message("Added marked_safe_date column to threats")
-                
-                if 'marked_safe_by' not in threat_columns:
-                    c.execute('ALTER TABLE threats ADD COLUMN marked_safe_by TEXT DEFAULT ""')
-                    log_message("Added marked_safe_by column to threats")
-                
-                conn.commit()
-                
-        except Exception as e:
-            log_message(f"Error updating schema: {str(e)}")
-
     def get_connection(self):
-        """Get database connection with row factory"""
-        conn = sqlite3.connect(self.db_file)
+        """Get this thread's long-lived database connection, opening it on first use"""
+        connections = getattr(_local, 'connections', None)
+        if connections is None or _local.pid != os.getpid():
+            if connections:
+                _inherited_connections.append(connections)
+            _local.connections = connections = {}
+            _local.pid = os.getpid()
+        
+        conn = connections.get(self.db_file)
+        if conn is None:
+            conn = self._open_connection()
+            connections[self.db_file] = conn
+        return conn
+    
+    def _open_connection(self):
+        """Open a connection in WAL mode with the tuned pragma profile"""
+        conn = sqlite3.connect(self.db_file, timeout=BUSY_TIMEOUT / 1000, cached_statements=STATEMENT_CACHE_SIZE)
         conn.row_factory = sqlite3.Row
+        try:
+            # Persistent in the database file, a no-op once set
+            conn.execute('PRAGMA journal_mode=WAL')
+        except sqlite3.DatabaseError as e:
+            log_message(f"Could not enable WAL journal mode: {str(e)}")
+        for name, value in CONNECTION_PRAGMAS:
+            conn.execute(f'PRAGMA {name}={value}')
         return conn
     
+    def close(self):
+        """Close this thread's connection, checkpointing the WAL"""
+        conn = getattr(_local, 'connections', {}).pop(self.db_file, None)
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception as e:
+                log_message(f"Error closing database connection: {str(e)}")
+    
     def execute_query(self, query, params=None, fetch_one=False, fetch_all=False):
         """Execute query with proper error handling"""
         try:
@@ -259,6 +225,73 @@ class DatabaseManager:
             log_message(f"Error updating threat {ip}: {str(e)}")
             raise
     
+    def write_verdicts(self, verdicts, stat_increments=None, stats=None):
+        """Store a batch of check results and the batch counters in one transaction.
+        verdicts are dicts with ip, threat_level, country, connection_details, abuse_score,
+        reports and categories. Returns the set of IPs that were threats beforehand."""
+        check_date = get_db_timestamp()
+        ips = [verdict['ip'] for verdict in verdicts]
+        conn = self.get_connection()
+        
+        try:
+            # Take the write lock up front so the reads below stay consistent with the writes
+            conn.execute('BEGIN IMMEDIATE')
+            existing_details = {}
+            previous_threats = set()
+            for start in range(0, len(ips), SQL_VARIABLE_CHUNK):
+                chunk = ips[start:start + SQL_VARIABLE_CHUNK]
+                placeholders = ','.join('?' * len(chunk))
+                for row in conn.execute(f'SELECT ip, connection_details FROM checked_ips WHERE ip IN ({placeholders})', chunk):
+                    existing_details[row['ip']] = row['connection_details'] or ''
+                for row in conn.execute(f'SELECT ip FROM threats WHERE ip IN ({placeholders})', chunk):
+                    previous_threats.add(row['ip'])
+            
+            conn.executemany('''
+                INSERT INTO checked_ips (ip, first_seen, last_checked, check_count, threat_level, country, connection_details)
+                VALUES (?, ?, ?, 1, ?, ?, ?)
+                ON CONFLICT(ip) DO UPDATE SET
+                    last_checked = excluded.last_checked,
+                    check_count = check_count + 1,
+                    threat_level = excluded.threat_level,
+                    country = excluded.country,
+                    connection_details = excluded.connection_details
+            ''', [
+                (verdict['ip'], check_date, check_date, verdict['threat_level'], verdict['country'],
+                 self._merge_connection_details(existing_details[verdict['ip']], verdict['connection_details'])
+                 if verdict['ip'] in existing_details else verdict['connection_details'])
+                for verdict in verdicts
+            ])
+            
+            # Preserve marked_safe status when updating
+            conn.executemany('''
+                INSERT INTO threats (ip, abuse_score, reports, last_seen, categories, country, marked_safe)
+                VALUES (?, ?, ?, ?, ?, ?, 0)
+                ON CONFLICT(ip) DO UPDATE SET
+                    abuse_score = excluded.abuse_score,
+                    reports = excluded.reports,
+                    last_seen = excluded.last_seen,
+                    categories = excluded.categories,
+                    country = excluded.country
+            ''', [
+                (verdict['ip'], verdict['abuse_score'], verdict['reports'], check_date, verdict['categories'], verdict['country'])
+                for verdict in verdicts if verdict['threat_level'] >= 1
+            ])
+            conn.executemany('DELETE FROM threats WHERE ip = ?', [
+                (verdict['ip'],) for verdict in verdicts if verdict['threat_level'] < 1 and verdict['ip'] in previous_threats
+            ])
+            
+            conn.executemany(STAT_INCREMENT_SQL, [(key, str(amount)) for key, amount in (stat_increments or {}).items()])
+            conn.executemany('INSERT OR REPLACE INTO stats (key, value) VALUES (?, ?)',
+                             [(key, str(value)) for key, value in (stats or {}).items()])
+            
+            conn.commit()
+            log_message(f"Stored {len(verdicts)} check results in one transaction")
+            return previous_threats
+        except Exception as e:
+            conn.rollback()
+            log_message(f"Error storing check results: {str(e)}")
+            raise
+    
     def remove_threat(self, ip):
         """Remove IP from threats table completely"""
         try:
@@ -317,18 +350,118 @@ class DatabaseManager:
             (ip,), 
             fetch_one=True
         )
+    
+    def get_threat_ip_set(self):
+        """Set of all IPs ever recorded as threats"""
+        rows = self.execute_query('SELECT ip FROM threats', fetch_all=True)
+        return {row['ip'] for row in rows or ()}
+
+    def _encode_cursor(self, direction, partition_value, ts, ip):
+        """Opaque page cursor for the row a page ends ('next') or starts ('prev') at"""
+        payload = json.dumps([direction, partition_value, ts, ip], separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def _decode_cursor(self, cursor):
+        """Return (direction, partition_value, ts, ip) from a page cursor"""
+        direction, partition_value, ts, ip = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if direction not in ('next', 'prev'):
+            raise ValueError(f"unknown cursor direction {direction}")
+        return direction, partition_value, ts, ip
+
+    def _fetch_page(self, query, where_conditions, params, order_columns, limit, offset, cursor, partition=None):
+        """Run a page query newest first, returns (rows, next_cursor, prev_cursor).
+
+        With a cursor the page is a keyset seek on (timestamp, ip) from the cursor row, so every
+        page costs the same as the first. Without one it falls back to OFFSET for page jumps.
+        partition is (column, row key, values) for an ascending leading sort column.
+        """
+        (ts_column, ts_key), (ip_column, ip_key) = order_columns
+        part_column, part_key, part_values = partition or (None, None, [None])
+
+        def run(conditions, condition_params, order, row_limit, row_offset=0):
+            all_conditions = where_conditions + conditions
+            where_clause = "WHERE " + " AND ".join(all_conditions) if all_conditions else ""
+            sql = query.format(where_clause=where_clause) + f" ORDER BY {order} LIMIT ? OFFSET ?"
+            return self.execute_query(sql, params + condition_params + [row_limit, row_offset], fetch_all=True) or []
+
+        def partition_filter(value):
+            return ([f"{part_column} = ?"], [value]) if part_column else ([], [])
 
-    def get_recent_threats(self, limit=20, offset=0, search_ip='', include_marked_safe=True):
-        """Get recent threats with pagination and search - FIXED sqlite3.Row conversion"""
+        def row_cursor(direction, row):
+            return self._encode_cursor(direction, row[part_key] if part_key else None, row[ts_key], row[ip_key])
+
+        if cursor:
+            try:
+                direction, cursor_part, cursor_ts, cursor_ip = self._decode_cursor(cursor)
+                start = part_values.index(cursor_part)
+            except (ValueError, TypeError) as e:
+                log_message(f"Ignoring invalid page cursor: {str(e)}")
+                cursor = ''
+
+        if not cursor:
+            conditions, condition_params = [], []
+            order = f"{ts_column} DESC, {ip_column} DESC"
+            if part_column:
+                conditions = [f"{part_column} IN ({', '.join('?' * len(part_values))})"]
+                condition_params = list(part_values)
+                order = f"{part_column} ASC, " + order
+            rows = run(conditions, condition_params, order, limit + 1, offset)
+            page = rows[:limit]
+            next_cursor = row_cursor('next', page[-1]) if len(rows) > limit else ''
+            prev_cursor = row_cursor('prev', page[0]) if page and offset > 0 else ''
+            return page, next_cursor, prev_cursor
+
+        # Walk partitions away from the cursor until the page (plus one lookahead row) is full
+        forward = direction == 'next'
+        partitions = part_values[start:] if forward else part_values[start::-1]
+        comparison, sort = ('<', 'DESC') if forward else ('>', 'ASC')
+        rows = []
+        for index, value in enumerate(partitions):
+            conditions, condition_params = partition_filter(value)
+            if index == 0:
+                conditions = conditions + [f"({ts_column}, {ip_column}) {comparison} (?, ?)"]
+                condition_params = condition_params + [cursor_ts, cursor_ip]
+            rows.extend(run(conditions, condition_params, f"{ts_column} {sort}, {ip_column} {sort}", limit + 1 - len(rows)))
+            if len(rows) > limit:
+                break
+
+        more = len(rows) > limit
+        page = rows[:limit]
+        if not forward:
+            page.reverse()
+        if not page:
+            return page, '', ''
+        next_cursor = row_cursor('next', page[-1]) if more or not forward else ''
+        prev_cursor = row_cursor('prev', page[0]) if more or forward else ''
+        return page, next_cursor, prev_cursor
+
+    def _page_total(self, name, count_query, where_conditions, params, cacheable=False):
+        """Row count for a paged list, returns (total, cached).
+
+        Unfiltered totals are kept in stats for PAGE_TOTAL_TTL seconds so paging does not
+        recount the whole table on every request. Searches are always counted exactly.
+        """
+        key = f'page_total_{name}'
+        now = int(time.time())
+        if cacheable:
+            try:
+                total, counted_at = (int(part) for part in (self.get_stat(key) or '').split(':'))
+                if now - counted_at < PAGE_TOTAL_TTL:
+                    return total, True
+            except ValueError:
+                pass
+
+        where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
+        result = self.execute_query(count_query.format(where_clause=where_clause), params, fetch_one=True)
+        total = result['total'] if result else 0
+        if cacheable:
+            self.update_stat(key, f"{total}:{now}")
+        return total, False
+
+    def get_recent_threats(self, limit=20, offset=0, search_ip='', include_marked_safe=True, cursor=''):
+        """Get recent threats with pagination and search, active threats first, newest first.
+        A cursor from a previous page replaces offset and costs the same on any page."""
         try:
-            # First check if connection_details column exists
-            conn = self.get_connection()
-            c = conn.cursor()
-            c.execute('PRAGMA table_info(checked_ips)')
-            columns = [column[1] for column in c.fetchall()]
-            has_connection_details = 'connection_details' in columns
-            conn.close()
-            
             # Build WHERE clause
             where_conditions = []
             params = []
@@ -337,66 +470,44 @@ class DatabaseManager:
                 where_conditions.append("t.ip LIKE ?")
                 params.append(f"%{search_ip}%")
             
-            if not include_marked_safe:
-                where_conditions.append("(t.marked_safe = 0 OR t.marked_safe IS NULL)")
-            
-            where_clause = ""
-            if where_conditions:
-                where_clause = "WHERE " + " AND ".join(where_conditions)
+            # marked_safe partitions the order, active threats (0) come first
+            marked_safe_values = [0, 1] if include_marked_safe else [0]
             
             # Get total count
-            count_query = f'''
-                SELECT COUNT(*) as total
-                FROM threats t
-                JOIN checked_ips c ON t.ip = c.ip
-                {where_clause}
-            '''
-            total_result = self.execute_query(count_query, params, fetch_one=True)
-            total_count = total_result['total'] if total_result else 0
-            
-            # Get paginated results with conditional connection details
-            params.extend([limit, offset])
-            
-            if has_connection_details:
-                query = f'''
-                    SELECT 
-                        t.ip, 
-                        t.abuse_score, 
-                        t.reports, 
-                        t.last_seen, 
-                        t.country, 
-                        t.categories,
-                        t.marked_safe,
-                        t.marked_safe_date,
-                        t.marked_safe_by,
-                        COALESCE(c.connection_details, '') as connection_details
-                    FROM threats t
-                    JOIN checked_ips c ON t.ip = c.ip
-                    {where_clause}
-                    ORDER BY t.marked_safe ASC, c.last_checked DESC
-                    LIMIT ? OFFSET ?
+            total_count, total_cached = self._page_total(
+                'threats' if include_marked_safe else 'active_threats',
                 '''
-            else:
-                query = f'''
-                    SELECT 
-                        t.ip, 
-                        t.abuse_score, 
-                        t.reports, 
-                        t.last_seen, 
-                        t.country, 
-                        t.categories,
-                        t.marked_safe,
-                        t.marked_safe_date,
-                        t.marked_safe_by,
-                        '' as connection_details
+                    SELECT COUNT(*) as total
                     FROM threats t
                     JOIN checked_ips c ON t.ip = c.ip
                     {where_clause}
-                    ORDER BY t.marked_safe ASC, c.last_checked DESC
-                    LIMIT ? OFFSET ?
-                '''
+                ''',
+                where_conditions + ([] if include_marked_safe else ["t.marked_safe = 0"]),
+                params,
+                cacheable=not search_ip
+            )
             
-            results = self.execute_query(query, params, fetch_all=True)
+            # Get paginated results
+            query = '''
+                SELECT 
+                    t.ip, 
+                    t.abuse_score, 
+                    t.reports, 
+                    t.last_seen, 
+                    t.country, 
+                    t.categories,
+                    t.marked_safe,
+                    t.marked_safe_date,
+                    t.marked_safe_by,
+                    COALESCE(c.connection_details, '') as connection_details
+                FROM threats t
+                JOIN checked_ips c ON t.ip = c.ip
+                {where_clause}
+            '''
+            results, next_cursor, prev_cursor = self._fetch_page(
+                query, where_conditions, params, (('t.last_seen', 'last_seen'), ('t.ip', 'ip')), limit, offset, cursor,
+                partition=('t.marked_safe', 'marked_safe', marked_safe_values)
+            )
             
             # Convert sqlite3.Row objects to proper dictionaries
             threats_list = []
@@ -418,89 +529,64 @@ class DatabaseManager:
             return {
                 'threats': threats_list,
                 'total_count': total_count,
+                'total_cached': total_cached,
                 'limit': limit,
-                'offset': offset
+                'offset': offset,
+                'next_cursor': next_cursor,
+                'prev_cursor': prev_cursor
             }
             
         except Exception as e:
             log_message(f"Error getting recent threats: {str(e)}")
-            return {'threats': [], 'total_count': 0, 'limit': limit, 'offset': offset}
+            return {'threats': [], 'total_count': 0, 'limit': limit, 'offset': offset, 'next_cursor': '', 'prev_cursor': ''}
 
-    def get_all_checked_ips(self, limit=20, offset=0, search_ip=''):
-        """Get all checked IPs with pagination and search - FIXED sqlite3.Row conversion"""
+    def get_all_checked_ips(self, limit=20, offset=0, search_ip='', cursor=''):
+        """Get all checked IPs with pagination and search, most recently checked first.
+        A cursor from a previous page replaces offset and costs the same on any page."""
         try:
-            # First check if connection_details column exists
-            conn = self.get_connection()
-            c = conn.cursor()
-            c.execute('PRAGMA table_info(checked_ips)')
-            columns = [column[1] for column in c.fetchall()]
-            has_connection_details = 'connection_details' in columns
-            conn.close()
-            
             # Build WHERE clause
-            where_clause = ""
+            where_conditions = []
             params = []
             
             if search_ip:
-                where_clause = "WHERE ci.ip LIKE ?"
+                where_conditions.append("ci.ip LIKE ?")
                 params.append(f"%{search_ip}%")
             
             # Get total count
-            count_query = f'''
-                SELECT COUNT(*) as total
-                FROM checked_ips ci
-                {where_clause}
-            '''
-            total_result = self.execute_query(count_query, params, fetch_one=True)
-            total_count = total_result['total'] if total_result else 0
-            
-            # Build main query with conditional connection_details
-            params.extend([limit, offset])
-            
-            if has_connection_details:
-                query = f'''
-                    SELECT 
-                        ci.ip,
-                        ci.last_checked,
-                        ci.threat_level,
-                        ci.check_count,
-                        ci.country,
-                        COALESCE(ci.connection_details, '') as connection_details,
-                        t.abuse_score,
-                        t.reports,
-                        t.categories,
-                        t.marked_safe,
-                        t.marked_safe_date,
-                        t.marked_safe_by
-                    FROM checked_ips ci
-                    LEFT JOIN threats t ON ci.ip = t.ip
-                    {where_clause}
-                    ORDER BY ci.last_checked DESC
-                    LIMIT ? OFFSET ?
+            total_count, total_cached = self._page_total(
+                'checked_ips',
                 '''
-            else:
-                query = f'''
-                    SELECT 
-                        ci.ip,
-                        ci.last_checked,
-                        ci.threat_level,
-                        ci.check_count,
-                        ci.country,
-                        '' as connection_details,
-                        t.abuse_score,
-                        t.reports,
-                        t.categories,
-                        t.marked_safe,
-                        t.marked_safe_date,
-                        t.marked_safe_by
+                    SELECT COUNT(*) as total
                     FROM checked_ips ci
-                    LEFT JOIN threats t ON ci.ip = t.ip
                     {where_clause}
-                    ORDER BY ci.last_checked DESC
-                    LIMIT ? OFFSET ?
-                '''
+                ''',
+                where_conditions,
+                params,
+                cacheable=not search_ip
+            )
             
-            results = self.execute_query(query, params, fetch_all=True)
+            # Build main query
+            query = '''
+                SELECT 
+                    ci.ip,
+                    ci.last_checked,
+                    ci.threat_level,
+                    ci.check_count,
+                    ci.country,
+                    COALESCE(ci.connection_details, '') as connection_details,
+                    t.abuse_score,
+                    t.reports,
+                    t.categories,
+                    t.marked_safe,
+                    t.marked_safe_date,
+                    t.marked_safe_by
+                FROM checked_ips ci
+                LEFT JOIN threats t ON ci.ip = t.ip
+                {where_clause}
+            '''
+            results, next_cursor, prev_cursor = self._fetch_page(
+                query, where_conditions, params, (('ci.last_checked', 'last_checked'), ('ci.ip', 'ip')), limit, offset, cursor
+            )
             
             # Convert sqlite3.Row objects to proper dictionaries
             ips_list = []
@@ -524,14 +610,139 @@ class DatabaseManager:
             return {
                 'ips': ips_list,
                 'total_count': total_count,
+                'total_cached': total_cached,
                 'limit': limit,
-                'offset': offset
+                'offset': offset,
+                'next_cursor': next_cursor,
+                'prev_cursor': prev_cursor
             }
             
         except Exception as e:
             log_message(f"Error getting all checked IPs: {str(e)}")
-            return {'ips': [], 'total_count': 0, 'limit': limit, 'offset': offset}
+            return {'ips': [], 'total_count': 0, 'limit': limit, 'offset': offset, 'next_cursor': '', 'prev_cursor': ''}
 
+    def insert_flows(self, flows):
+        """Store parsed flows (ts, src_ip, dst_ip, dst_port, protocol, action) in one transaction"""
+        rows = []
+        for ts, src_ip, dst_ip, dst_port, protocol, action in flows:
+            try:
+                rows.append((
+                    int(ts), ip_to_int(src_ip), ip_to_int(dst_ip),
+                    int(dst_port) if str(dst_port).isdigit() else None,
+                    protocol, FLOW_ACTIONS.get(action)
+                ))
+            except OSError:
+                continue  # Not an IPv4 address
+        
+        if not rows:
+            return 0
+        
+        try:
+            with self.get_connection() as conn:
+                conn.executemany(
+                    'INSERT INTO flows (ts, src, dst, dst_port, protocol, action) VALUES (?, ?, ?, ?, ?, ?)',
+                    rows
+                )
+            return len(rows)
+        except Exception as e:
+            log_message(f"Error storing flows: {str(e)}")
+            return 0
+    
+    def prune_flows(self, retention_hours):
+        """Delete flows older than the retention window"""
+        cutoff = int(time.time() - retention_hours * 3600)
+        try:
+            return self.execute_query('DELETE FROM flows WHERE ts < ?', (cutoff,))
+        except Exception as e:
+            log_message(f"Error pruning flows: {str(e)}")
+            return 0
+    
+    def get_recent_flow_ips(self, minutes, exclude_blocked=False, exclude_protocols=()):
+        """External IPs seen in the last N minutes with hit counts, most recent first"""
+        conditions = ['ts >= ?']
+        params = [int(time.time() - minutes * 60)]
+        
+        if exclude_blocked:
+            conditions.append('action != ?')
+            params.append(FLOW_ACTIONS['block'])
+        if exclude_protocols:
+            conditions.append(f"protocol NOT IN ({','.join('?' * len(exclude_protocols))})")
+            params.extend(exclude_protocols)
+        
+        rows = self.execute_query(
+            f'''SELECT src, COUNT(*) AS hits, MAX(ts) AS last_seen
+               FROM flows WHERE {' AND '.join(conditions)}
+               GROUP BY src ORDER BY last_seen DESC''',
+            params,
+            fetch_all=True
+        )
+        return [
+            {'ip': int_to_ip(row['src']), 'hits': row['hits'], 'last_seen': row['last_seen']}
+            for row in rows
+        ]
+    
+    def get_flows_for_ip(self, ip, limit=100):
+        """Most recent flows from one external IP"""
+        rows = self.execute_query(
+            '''SELECT ts, dst, dst_port, protocol, action
+               FROM flows WHERE src = ?
+               ORDER BY ts DESC LIMIT ?''',
+            (ip_to_int(ip), limit),
+            fetch_all=True
+        )
+        return [
+            {
+                'timestamp': row['ts'],
+                'external_ip': ip,
+                'internal_ip': int_to_ip(row['dst']),
+                'internal_port': '' if row['dst_port'] is None else str(row['dst_port']),
+                'protocol': FLOW_PROTOCOL_NAMES.get(row['protocol']) or str(row['protocol'] or ''),
+                'action': FLOW_ACTION_NAMES.get(row['action'], '')
+            }
+            for row in rows
+        ]
+    
+    def get_api_cache_entry(self, ip):
+        """Cached API response row for an IP, None if not cached"""
+        row = self.execute_query(
+            'SELECT report, negative, fetched_at, expires_at FROM api_cache WHERE ip = ?',
+            (ip,),
+            fetch_one=True
+        )
+        return dict(row) if row else None
+    
+    def store_api_cache_entry(self, ip, report, negative, fetched_at, expires_at):
+        """Insert or replace the cached API response for an IP"""
+        return self.execute_query(
+            '''INSERT OR REPLACE INTO api_cache (ip, report, negative, fetched_at, expires_at)
+               VALUES (?, ?, ?, ?, ?)''',
+            (ip, report, 1 if negative else 0, fetched_at, expires_at)
+        )
+    
+    def acquire_inflight_lease(self, ip, owner, lease_seconds):
+        """Claim the right to look up an IP, False while another owner holds an unexpired lease"""
+        now = time.time()
+        return self.execute_query(
+            '''INSERT INTO api_inflight (ip, owner, expires_at) VALUES (?, ?, ?)
+               ON CONFLICT (ip) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+               WHERE api_inflight.expires_at <= ?''',
+            (ip, owner, now + lease_seconds, now)
+        ) == 1
+    
+    def release_inflight_lease(self, ip, owner):
+        """Drop a lease held by owner"""
+        return self.execute_query('DELETE FROM api_inflight WHERE ip = ? AND owner = ?', (ip, owner))
+    
+    def prune_api_cache(self, stale_hours):
+        """Delete cache entries past their stale-serving window and abandoned leases"""
+        cutoff = int(time.time() - stale_hours * 3600)
+        try:
+            self.execute_query('DELETE FROM api_inflight WHERE expires_at < ?', (time.time(),))
+            return self.execute_query('DELETE FROM api_cache WHERE expires_at < ?', (cutoff,))
+        except Exception as e:
+            log_message(f"Error pruning API cache: {str(e)}")
+            return 0
+    
     def get_ips_needing_check(self, check_frequency_days):
         """Get IPs that need to be checked based on frequency"""
         cutoff_date = (datetime.now() - timedelta(days=check_frequency_days)).strftime('%Y-%m-%d %H:%M:%S')
@@ -577,6 +788,79 @@ class DatabaseManager:
             log_message(f"Error getting stat {key}: {str(e)}")
             return default
     
+    def update_stats(self, values):
+        """Update several statistics in one transaction"""
+        try:
+            with self.get_connection() as conn:
+                conn.executemany('INSERT OR REPLACE INTO stats (key, value) VALUES (?, ?)',
+                                 [(key, str(value)) for key, value in values.items()])
+        except Exception as e:
+            log_message(f"Error updating stats: {str(e)}")
+    
+    def increment_stats(self, increments):
+        """Add to counter statistics in one transaction"""
+        try:
+            with self.get_connection() as conn:
+                conn.executemany(STAT_INCREMENT_SQL, [(key, str(amount)) for key, amount in increments.items()])
+        except Exception as e:
+            log_message(f"Error incrementing stats: {str(e)}")
+    
+    def api_quota_stats(self, quota):
+        """Stats rows for the API-reported quota (limit, remaining, reset, updated)"""
+        if not quota:
+            return {}
+        return {f'api_quota_{key}': str(quota[key]) for key in ('limit', 'remaining', 'reset', 'updated') if quota.get(key) is not None}
+    
+    def update_api_quota(self, quota):
+        """Persist the API-reported quota (limit, remaining, reset, updated) as stats"""
+        self.update_stats(self.api_quota_stats(quota))
+    
+    def get_api_quota(self):
+        """Last API-reported quota, None if the API never sent rate-limit headers"""
+        stats = self.get_stats()
+        if 'api_quota_remaining' not in stats:
+            return None
+        
+        quota = {}
+        for key in ('limit', 'remaining', 'reset', 'updated'):
+            value = stats.get(f'api_quota_{key}')
+            quota[key] = int(value) if value and value.lstrip('-').isdigit() else None
+        return quota
+    
+    def circuit_state_stats(self, state):
+        """Stats rows for the API circuit breaker state"""
+        if not state:
+            return {}
+        return {
+            f'api_circuit_{key}': '' if state.get(key) is None else str(state[key])
+            for key in ('state', 'failures', 'trips', 'cooldown', 'opened_at', 'retry_at')
+        }
+    
+    def update_circuit_state(self, state):
+        """Persist the API circuit breaker state as stats"""
+        self.update_stats(self.circuit_state_stats(state))
+    
+    def get_circuit_state(self):
+        """Last persisted API circuit breaker state, None if never recorded"""
+        stats = self.get_stats()
+        if 'api_circuit_state' not in stats:
+            return None
+        
+        state = {'state': stats['api_circuit_state']}
+        for key in ('failures', 'trips', 'cooldown', 'opened_at', 'retry_at'):
+            value = stats.get(f'api_circuit_{key}')
+            state[key] = int(float(value)) if value else None
+        return state
+    
+    def get_remaining_checks(self, daily_limit):
+        """Checks left today: the local daily limit, capped by the API quota while its window is open"""
+        remaining = daily_limit - int(self.get_stat('daily_checks', '0'))
+        
+        quota = self.get_api_quota()
+        if quota and quota['remaining'] is not None and quota['reset'] and quota['reset'] > time.time():
+            remaining = min(remaining, quota['remaining'])
+        return max(0, remaining)
+    
     def reset_daily_checks_if_needed(self):
         """Reset daily checks count if it's a new day"""
         try:
@@ -597,7 +881,7 @@ class DatabaseManager:
                 SELECT t.ip, t.abuse_score
                 FROM threats t
                 JOIN checked_ips ci ON t.ip = ci.ip
-                WHERE ci.threat_level >= ? AND (t.marked_safe = 0 OR t.marked_safe IS NULL)
+                WHERE ci.threat_level >= ? AND t.marked_safe = 0
                 ORDER BY 
                     t.abuse_score DESC,
                     ci.last_checked DESC
@@ -624,7 +908,7 @@ class DatabaseManager:
                 SELECT COUNT(*) as count 
                 FROM threats t
                 JOIN checked_ips ci ON t.ip = ci.ip
-                WHERE ci.threat_level >= ? AND (t.marked_safe = 0 OR t.marked_safe IS NULL)
+                WHERE ci.threat_level >= ? AND t.marked_safe = 0
             ''', (min_threat_level,), fetch_one=True)['count']
             
             # Breakdown counts
@@ -0,0 +1,105 @@
+#!/usr/local/bin/python3
+
+"""
+IP Classifier Module
+Precompiled LAN/external address classification using sorted integer ranges
+"""
+
+import socket
+import bisect
+import ipaddress
+from functools import lru_cache
+
+# Ranges as the ipaddress module classifies them (is_private / is_loopback /
+# is_multicast / is_reserved / is_link_local), expanded once into integer intervals
+IPV4_PRIVATE = [
+    '0.0.0.0/8', '10.0.0.0/8', '127.0.0.0/8', '169.254.0.0/16', '172.16.0.0/12',
+    '192.0.0.0/29', '192.0.0.170/31', '192.0.2.0/24', '192.168.0.0/16', '198.18.0.0/15',
+    '198.51.100.0/24', '203.0.113.0/24', '240.0.0.0/4', '255.255.255.255/32'
+]
+IPV4_INVALID_SOURCE = ['127.0.0.0/8', '224.0.0.0/4', '240.0.0.0/4', '169.254.0.0/16']
+
+# ::ffff:0:0/96 (IPv4-mapped) is private only if the embedded IPv4 address is
+IPV6_PRIVATE = [
+    '::1/128', '::/128', '100::/64', '2001::/23', '2001:2::/48',
+    '2001:db8::/32', '2001:10::/28', 'fc00::/7', 'fe80::/10'
+]
+IPV6_INVALID_SOURCE = [
+    '::1/128', 'ff00::/8', 'fe80::/10', '::/8', '100::/8', '200::/7', '400::/6', '800::/5',
+    '1000::/4', '4000::/3', '6000::/3', '8000::/3', 'a000::/3', 'c000::/3', 'e000::/4',
+    'f000::/5', 'f800::/6', 'fe00::/9'
+]
+
+class RangeSet:
+    """Sorted, merged integer intervals with O(log n) membership lookups"""
+
+    def __init__(self, networks):
+        intervals = sorted((int(n.network_address), int(n.broadcast_address)) for n in networks)
+        merged = []
+        for start, end in intervals:
+            if merged and start <= merged[-1][1] + 1:
+                if end > merged[-1][1]:
+                    merged[-1][1] = end
+            else:
+                merged.append([start, end])
+
+        self.starts = [start for start, _ in merged]
+        self.ends = [end for _, end in merged]
+
+    def __contains__(self, value):
+        index = bisect.bisect_right(self.starts, value) - 1
+        return index >= 0 and value <= self.ends[index]
+
+    def __len__(self):
+        return len(self.starts)
+
+class AddressClassifier:
+    """Classifies raw address strings as valid external sources and/or internal destinations"""
+
+    def __init__(self, lan_networks, cache_size=65536):
+        v4_lan = [n for n in lan_networks if n.version == 4]
+        v6_lan = [n for n in lan_networks if n.version == 6]
+
+        # Internal = private or LAN; a source is external only outside internal and invalid ranges
+        v4_private = [ipaddress.ip_network(n) for n in IPV4_PRIVATE]
+        v6_private = [ipaddress.ip_network(n) for n in IPV6_PRIVATE]
+        v4_invalid = [ipaddress.ip_network(n) for n in IPV4_INVALID_SOURCE]
+        v6_invalid = [ipaddress.ip_network(n) for n in IPV6_INVALID_SOURCE]
+
+        self._v4_private = RangeSet(v4_private)
+        self._internal = {4: RangeSet(v4_private + v4_lan), 6: RangeSet(v6_private + v6_lan)}
+        self._not_external = {
+            4: RangeSet(v4_private + v4_lan + v4_invalid),
+            6: RangeSet(v6_private + v6_lan + v6_invalid)
+        }
+
+        # Memoise verdicts per raw address string, scanners repeat a handful of addresses
+        self.classify = lru_cache(maxsize=cache_size)(self._classify)
+
+    def _classify(self, address):
+        """Return (is_external_source, is_internal_destination) for an address string"""
+        try:
+            if ':' in address:
+                value = int.from_bytes(socket.inet_pton(socket.AF_INET6, address), 'big')
+                version = 6
+            else:
+                value = int.from_bytes(socket.inet_pton(socket.AF_INET, address), 'big')
+                version = 4
+        except (OSError, ValueError):
+            return (False, False)
+
+        if version == 6 and value >> 32 == 0xFFFF:
+            # IPv4-mapped addresses are reserved as sources
+            return (False, (value & 0xFFFFFFFF) in self._v4_private or value in self._internal[6])
+
+        return (value not in self._not_external[version], value in self._internal[version])
+
+    def external_to_internal(self, src_ip, dst_ip):
+        """Return src_ip when traffic flows from an external source to an internal destination"""
+        if self.classify(src_ip)[0] and self.classify(dst_ip)[1]:
+            return src_ip
+        return None
+
+    def cache_info(self):
+        """Expose memo hit statistics"""
+        return self.classify.cache_info()
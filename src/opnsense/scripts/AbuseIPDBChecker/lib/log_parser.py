@@ -7,7 +7,45 @@ Handles parsing OPNsense firewall logs and extracting external IPs with port inf
 
 import os
 import ipaddress
+from collections import namedtuple
 from .core_utils import log_message
+from .log_reader import read_last_lines, read_lines_between, parse_syslog_timestamp, find_rotated_logs, iter_log_lines
+from .ip_classifier import AddressClassifier
+
+PROTOCOL_NAMES = {1: 'icmp', 2: 'igmp', 6: 'tcp', 17: 'udp'}
+
+# filterlog CSV columns used by the parser (after the syslog header)
+FIELD_ACTION = 6
+FIELD_IP_VERSION = 8
+FIELD_PROTOCOL = 15
+FIELD_SRC_IP = 18
+FIELD_DST_IP = 19
+FIELD_SRC_PORT = 20
+FIELD_DST_PORT = 21
+MIN_FIELDS = FIELD_DST_PORT + 1  # Need at least 22 fields for ports, shorter lines are truncated records
+
+# The IP version column always appears as ',4,' in an IPv4 record
+IPV4_MARKER = ',4,'
+
+class FilterRecord(namedtuple('FilterRecord', ['timestamp', 'action', 'protocol', 'src_ip', 'dst_ip', 'src_port', 'dst_port'])):
+    """Compact external→internal filterlog entry"""
+    __slots__ = ()
+    
+    @property
+    def protocol_name(self):
+        """Protocol name, falls back to the number for unmapped protocols"""
+        return PROTOCOL_NAMES.get(self.protocol) or (str(self.protocol) if self.protocol else '')
+    
+    @property
+    def epoch(self):
+        """Syslog timestamp as epoch seconds, None if unparsable"""
+        return parse_syslog_timestamp(self.timestamp)
+    
+    def connection_string(self):
+        """SourceIP:Port accessing DestIP:Port"""
+        src_port = self.src_port if self.src_port.isdigit() else 'unknown'
+        dst_port = self.dst_port if self.dst_port.isdigit() else 'unknown'
+        return f"{self.src_ip}:{src_port} accessing {self.dst_ip}:{dst_port}"
 
 class FirewallLogParser:
     """Handles all firewall log parsing operations with port extraction"""
@@ -15,6 +53,12 @@ class FirewallLogParser:
     def __init__(self, config):
         self.config = config
         self.lan_networks = self._parse_lan_networks()
+        self.classifier = AddressClassifier(self.lan_networks)
+        
+        # Filters precomputed once instead of per line
+        self.ignore_blocked = bool(self.config.get('ignore_blocked_connections', False))
+        ignored_names = {p.strip().lower() for p in self.config.get('ignore_protocols', [])}
+        self.ignored_protocols = frozenset(num for num, name in PROTOCOL_NAMES.items() if name in ignored_names)
     
     def _parse_lan_networks(self):
         """Convert LAN subnets to proper network objects"""
@@ -27,7 +71,13 @@ class FirewallLogParser:
                 continue
         return networks
     
-    def parse_log_for_ips(self, recent_only=False):
+    def _read_lines(self, line_count, since=None, until=None):
+        """Lines logged in [since, until] (epoch seconds) via timestamp seek, else the last line_count lines"""
+        if since is None and until is None:
+            return read_last_lines(self.config['log_file'], line_count)
+        return read_lines_between(self.config['log_file'], since, until)
+    
+    def parse_log_for_ips(self, recent_only=False, since=None, until=None):
         """Parse OPNsense firewall log for external IPs"""
         external_ips = set()
         
@@ -36,23 +86,11 @@ class FirewallLogParser:
             return external_ips
         
         try:
-            with open(self.config['log_file'], 'r', encoding='utf-8', errors='ignore') as f:
-                if recent_only:
-                    # For daemon mode - only recent activity
-                    lines = f.readlines()
-                    lines = lines[-200:] if len(lines) > 200 else lines
-                else:
-                    # For full checking - process more lines
-                    lines = f.readlines()
-                    lines = lines[-1000:] if len(lines) > 1000 else lines
+            # Recent activity only for daemon/listing, more lines for full checking
+            lines = self._read_lines(200 if recent_only else 1000, since, until)
             
-            for line in lines:
-                if not line.strip() or 'filterlog' not in line:
-                    continue
-                
-                ip = self._parse_log_line(line)
-                if ip:
-                    external_ips.add(ip)
+            for record in self.iter_records(lines):
+                external_ips.add(record.src_ip)
                     
         except Exception as e:
             if not recent_only:
@@ -60,7 +98,7 @@ class FirewallLogParser:
         
         return external_ips
     
-    def parse_log_for_ips_with_connections(self, recent_only=False):
+    def parse_log_for_ips_with_connections(self, recent_only=False, since=None, until=None):
         """Parse OPNsense firewall log for external IPs with full connection details"""
         external_connections = {}  # ip -> set of connection strings
         
@@ -69,26 +107,8 @@ class FirewallLogParser:
             return external_connections
         
         try:
-            with open(self.config['log_file'], 'r', encoding='utf-8', errors='ignore') as f:
-                if recent_only:
-                    lines = f.readlines()
-                    lines = lines[-200:] if len(lines) > 200 else lines
-                else:
-                    lines = f.readlines()
-                    lines = lines[-1000:] if len(lines) > 1000 else lines
-            
-            for line in lines:
-                if not line.strip() or 'filterlog' not in line:
-                    continue
-                
-                connection_info = self._parse_log_line_with_connection(line)
-                if connection_info:
-                    external_ip = connection_info['external_ip']
-                    connection_string = connection_info['connection_string']
-                    
-                    if external_ip not in external_connections:
-                        external_connections[external_ip] = set()
-                    external_connections[external_ip].add(connection_string)
+            lines = self._read_lines(200 if recent_only else 1000, since, until)
+            external_connections = self.parse_lines_for_ips_with_connections(lines)
                     
         except Exception as e:
             if not recent_only:
@@ -96,162 +116,114 @@ class FirewallLogParser:
         
         return external_connections
 
-    def _parse_log_line_with_connection(self, line):
-        """Parse a single log line and return external IP with full connection details"""
-        try:
-            # Extract CSV data after syslog header
-            if '] ' not in line:
-                return None
-            
-            csv_part = line.split('] ', 1)[1]
-            fields = csv_part.split(',')
-            
-            if len(fields) < 22:  # Need at least 22 fields for ports
-                return None
-            
-            action = fields[6].strip() if len(fields) > 6 else ''
-            ip_version = fields[8].strip() if len(fields) > 8 else ''
-            
-            # Only IPv4
-            if ip_version != '4':
-                return None
-            
-            # Skip blocked if configured
-            if self.config['ignore_blocked_connections'] and action.lower() == 'block':
-                return None
-            
-            # Parse protocol and skip ignored protocols
-            protocol_num = 0
-            if len(fields) > 15:
-                try:
-                    protocol_num = int(fields[15].strip()) if fields[15].strip() else 0
-                    proto_name = self._get_protocol_name(protocol_num)
-                    
-                    if proto_name and proto_name.lower() in [p.lower() for p in self.config['ignore_protocols']]:
-                        return None
-                except (ValueError, IndexError):
-                    pass
-            
-            # Get source and destination IPs and ports
-            src_ip = fields[18].strip() if len(fields) > 18 else ''
-            dst_ip = fields[19].strip() if len(fields) > 19 else ''
-            src_port = fields[20].strip() if len(fields) > 20 else ''
-            dst_port = fields[21].strip() if len(fields) > 21 else ''
-            
-            
-            if not src_ip or not dst_ip:
-                return None
-            
-            # Validate external→internal
-            external_ip = self._validate_external_to_internal(src_ip, dst_ip)
-            if external_ip:
-                # Create connection string: SourceIP:Port -> DestIP:Port
-                src_port_str = src_port if src_port and src_port.isdigit() else 'unknown'
-                dst_port_str = dst_port if dst_port and dst_port.isdigit() else 'unknown'
-                
-                connection_string = f"{src_ip}:{src_port_str} accessing {dst_ip}:{dst_port_str}"
-                
-                return {
-                    'external_ip': external_ip,
-                    'connection_string': connection_string,
-                    'protocol': protocol_num,
-                    'internal_ip': dst_ip,
-                    'internal_port': dst_port_str
-                }
+    def parse_rotated_logs_for_ips_with_connections(self, pattern=None):
+        """Parse the log file and all rotated/compressed archives for external IPs with connections"""
+        paths = find_rotated_logs(self.config['log_file'], pattern or self.config.get('log_archive_pattern'))
+        if not paths:
+            log_message(f"No log files found for: {self.config['log_file']}")
+            return {}
+        
+        log_message(f"Scanning {len(paths)} log files (oldest: {os.path.basename(paths[0])})")
+        return self.parse_lines_for_ips_with_connections(iter_log_lines(paths))
+
+    def parse_lines_for_ips_with_connections(self, lines, external_connections=None):
+        """Parse already-read log lines (e.g. from LogTailReader) into ip -> connection strings"""
+        if external_connections is None:
+            external_connections = {}
+        
+        for record in self.iter_records(lines):
+            connections = external_connections.get(record.src_ip)
+            if connections is None:
+                connections = external_connections[record.src_ip] = set()
+            connections.add(record.connection_string())
+        
+        return external_connections
+
+    def parse_lines_for_flows(self, lines, external_connections=None):
+        """Parse log lines into (ip -> connection strings after filters, every external→internal record)"""
+        if external_connections is None:
+            external_connections = {}
+        records = []
+        
+        # Flows keep blocked and ignored protocols too, only the check map is filtered
+        for record in self.iter_records(lines, apply_filters=False):
+            records.append(record)
+            if self.is_filtered(record):
+                continue
+            connections = external_connections.get(record.src_ip)
+            if connections is None:
+                connections = external_connections[record.src_ip] = set()
+            connections.add(record.connection_string())
+        
+        return external_connections, records
+
+    def is_filtered(self, record):
+        """Whether the block/protocol filters exclude a record from checking"""
+        return (self.ignore_blocked and record.action == 'block') or record.protocol in self.ignored_protocols
+
+    def iter_records(self, lines, apply_filters=True):
+        """Yield FilterRecords for external→internal lines, optionally applying block/protocol filters"""
+        parse_record = self.parse_record
+        ignore_blocked = apply_filters and self.ignore_blocked
+        ignored_protocols = self.ignored_protocols if apply_filters else ()
+        
+        for line in lines:
+            # Substring checks reject other programs and non-IPv4 records before any split
+            if 'filterlog' not in line or IPV4_MARKER not in line:
+                continue
             
+            record = parse_record(line)
+            if record is None:
+                continue
+            if ignore_blocked and record.action == 'block':
+                continue
+            if record.protocol in ignored_protocols:
+                continue
+            yield record
+
+    def parse_record(self, line):
+        """Single-pass parse of one filterlog line into a FilterRecord, None if not external→internal IPv4"""
+        header_end = line.find('] ')
+        if header_end == -1:
             return None
-            
-        except Exception as e:
-            log_message(f"Error parsing log line for connections: {str(e)}")
+        
+        # Bounded split: only the columns up to the destination port are needed
+        fields = line[header_end + 2:].rstrip().split(',', FIELD_DST_PORT + 1)
+        if len(fields) < MIN_FIELDS:
             return None
- 
-    def _parse_log_line(self, line):
-        """Parse a single log line and return external IP if valid"""
-        try:
-            # Extract CSV data after syslog header
-            if '] ' not in line:
-                return None
-            
-            csv_part = line.split('] ', 1)[1]
-            fields = csv_part.split(',')
-            
-            if len(fields) < 20:
-                return None
-            
-            action = fields[6].strip() if len(fields) > 6 else ''
-            ip_version = fields[8].strip() if len(fields) > 8 else ''
-            
-            # Only IPv4
-            if ip_version != '4':
-                return None
-            
-            # Skip blocked if configured
-            if self.config['ignore_blocked_connections'] and action.lower() == 'block':
-                return None
-            
-            # Parse protocol and skip ignored protocols
-            if len(fields) > 15:
-                try:
-                    proto_num = int(fields[15].strip()) if fields[15].strip() else 0
-                    proto_name = self._get_protocol_name(proto_num)
-                    
-                    if proto_name and proto_name.lower() in [p.lower() for p in self.config['ignore_protocols']]:
-                        return None
-                except (ValueError, IndexError):
-                    pass
-            
-            # Get source and destination IPs
-            src_ip = fields[18].strip() if len(fields) > 18 else ''
-            dst_ip = fields[19].strip() if len(fields) > 19 else ''
-            
-            if not src_ip or not dst_ip:
-                return None
-            
-            return self._validate_external_to_internal(src_ip, dst_ip)
-            
-        except Exception:
+        
+        # Only IPv4
+        if fields[FIELD_IP_VERSION] != '4':
+            return None
+        
+        src_ip = fields[FIELD_SRC_IP]
+        dst_ip = fields[FIELD_DST_IP]
+        if not src_ip or not dst_ip:
+            return None
+        
+        if not self.classifier.external_to_internal(src_ip, dst_ip):
             return None
-     
+        
+        protocol = fields[FIELD_PROTOCOL]
+        return FilterRecord(
+            line[:header_end].replace('[', '').strip(),
+            fields[FIELD_ACTION].lower(),
+            int(protocol) if protocol.isdigit() else 0,
+            src_ip,
+            dst_ip,
+            fields[FIELD_SRC_PORT],
+            fields[FIELD_DST_PORT]
+        )
+    
     def _get_protocol_name(self, proto_num):
         """Convert protocol number to name"""
-        protocol_map = {1: 'icmp', 2: 'igmp', 6: 'tcp', 17: 'udp'}
-        return protocol_map.get(proto_num, '')
+        return PROTOCOL_NAMES.get(proto_num, '')
     
     def _validate_external_to_internal(self, src_ip, dst_ip):
-        """Validate that this is external→internal traffic"""
-        try:
-            src_ip_obj = ipaddress.ip_address(src_ip)
-            dst_ip_obj = ipaddress.ip_address(dst_ip)
-            
-            # Skip invalid source IPs
-            if (src_ip_obj.is_loopback or src_ip_obj.is_multicast or 
-                src_ip_obj.is_reserved or src_ip_obj.is_link_local):
-                return None
-            
-            # Check if source IP is external
-            src_is_external = not src_ip_obj.is_private
-            for network in self.lan_networks:
-                if src_ip_obj in network:
-                    src_is_external = False
-                    break
-            
-            # Check if destination IP is internal
-            dst_is_internal = dst_ip_obj.is_private
-            for network in self.lan_networks:
-                if dst_ip_obj in network:
-                    dst_is_internal = True
-                    break
-            
-            # Only process: External Source → Internal Destination
-            if src_is_external and dst_is_internal:
-                return src_ip
-                
-        except ValueError:
-            pass
-        
-        return None
+        """Validate that this is external→internal traffic (precompiled range lookup, memoised)"""
+        return self.classifier.external_to_internal(src_ip, dst_ip)
     
-    def list_external_to_internal_connections(self):
+    def list_external_to_internal_connections(self, since=None, until=None):
         """List ALL external→internal connections with detailed info including ports"""
         if not os.path.exists(self.config['log_file']):
             return {'status': 'error', 'message': f"Log file not found: {self.config['log_file']}"}
@@ -260,17 +232,20 @@ class FirewallLogParser:
         unique_external_ips = set()
         
         try:
-            with open(self.config['log_file'], 'r', encoding='utf-8', errors='ignore') as f:
-                lines = f.readlines()[-500:]  # Last 500 lines for comprehensive view
-                
-                for line in lines:
-                    if 'filterlog' not in line:
-                        continue
-                    
-                    connection_info = self._parse_connection_details(line)
-                    if connection_info:
-                        connections.append(connection_info)
-                        unique_external_ips.add(connection_info['external_ip'])
+            lines = self._read_lines(500, since, until)  # Last 500 lines unless a time window is given
+            
+            # Comprehensive view: blocked and ignored protocols are listed too
+            for record in self.iter_records(lines, apply_filters=False):
+                connections.append({
+                    'timestamp': record.timestamp,
+                    'external_ip': record.src_ip,
+                    'internal_ip': record.dst_ip,
+                    'external_port': record.src_port,
+                    'internal_port': record.dst_port,
+                    'protocol': record.protocol_name,
+                    'action': record.action
+                })
+                unique_external_ips.add(record.src_ip)
         
         except Exception as e:
             return {'status': 'error', 'message': f'Error reading log: {str(e)}'}
@@ -286,53 +261,6 @@ class FirewallLogParser:
             'message': f'Found {len(unique_connections)} unique connections from {len(unique_external_ips)} external IPs'
         }
     
-    def _parse_connection_details(self, line):
-        """Parse detailed connection information from log line including ports"""
-        try:
-            if '] ' not in line:
-                return None
-            
-            timestamp = line.split(']')[0].replace('[', '').strip()
-            csv_part = line.split('] ', 1)[1]
-            fields = csv_part.split(',')
-            
-            if len(fields) < 21:
-                return None
-            
-            action = fields[6].strip()
-            ip_version = fields[8].strip()
-            protocol = fields[15].strip() if len(fields) > 15 else ''
-            
-            if ip_version != '4':
-                return None
-            
-            src_ip = fields[18].strip() if len(fields) > 18 else ''
-            dst_ip = fields[19].strip() if len(fields) > 19 else ''
-            src_port = fields[20].strip() if len(fields) > 20 else ''
-            dst_port = fields[21].strip() if len(fields) > 21 else ''
-            
-            if not src_ip or not dst_ip:
-                return None
-            
-            # Validate external→internal
-            if self._validate_external_to_internal(src_ip, dst_ip):
-                protocol_name = self._get_protocol_name(int(protocol)) if protocol.isdigit() else protocol
-                
-                return {
-                    'timestamp': timestamp,
-                    'external_ip': src_ip,
-                    'internal_ip': dst_ip,
-                    'external_port': src_port,
-                    'internal_port': dst_port,
-                    'protocol': protocol_name or protocol,
-                    'action': action
-                }
-                
-        except Exception:
-            pass
-        
-        return None
-    
     def _deduplicate_connections(self, connections):
         """Remove duplicate connections and sort"""
         unique_connections = []
@@ -345,23 +273,3 @@ class FirewallLogParser:
                 unique_connections.append(conn)
         
         return unique_connections
-        """Parse line for debugging purposes with error handling including ports"""
-        try:
-            if '] ' in line:
-                csv_part = line.split('] ', 1)[1]
-                fields = csv_part.split(',')
-                
-                if len(fields) >= 20:
-                    return {
-                        'action': fields[6].strip(),
-                        'direction': fields[7].strip(),
-                        'protocol': fields[16].strip() if len(fields) > 16 else '',
-                        'src_ip': fields[18].strip(),
-                        'dst_ip': fields[19].strip(),
-                        'src_port': fields[20].strip() if len(fields) > 20 else '',
-                        'dst_port': fields[21].strip() if len(fields) > 21 else ''
-                    }
-        except Exception as e:
-            return {'error': str(e), 'line': line[:100]}
-        
-        return None
\ No newline at end of file
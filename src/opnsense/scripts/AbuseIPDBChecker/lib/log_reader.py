@@ -0,0 +1,313 @@
+#!/usr/local/bin/python3
+
+"""
+Log Reader Module
+Handles incremental (tail) reading of the firewall log with offset and rotation tracking,
+streaming of rotated/compressed log archives and seeking by timestamp
+"""
+
+import os
+import re
+import bz2
+import glob
+import gzip
+import json
+from datetime import datetime
+from .core_utils import log_message, DB_DIR
+
+TAIL_STATE_FILE = os.path.join(DB_DIR, 'log_tail_state.json')
+SEEK_LINEAR_THRESHOLD = 8192  # bytes left before the binary search switches to a linear scan
+SEEK_MAX_PROBE_LINES = 64  # lines inspected after a probe to find a parsable timestamp
+
+class LogTailReader:
+    """Incremental reader that only returns lines appended since the previous read"""
+
+    def __init__(self, log_file, state_file=None, max_bytes=16 * 1024 * 1024):
+        self.log_file = log_file
+        self.state_file = state_file
+        self.max_bytes = max_bytes  # Upper bound per read, the rest is picked up next call
+        self._handle = None
+        self.inode = None
+        self.offset = 0
+        self._pending = b''  # Trailing partial line waiting for its newline
+        self._saved_state = self._load_state()
+
+    def _load_state(self):
+        """Load persisted inode/offset so a restart resumes where it stopped"""
+        if not self.state_file or not os.path.exists(self.state_file):
+            return None
+
+        try:
+            with open(self.state_file, 'r') as f:
+                state = json.load(f)
+            if state.get('log_file') != self.log_file:
+                return None
+            return state
+        except Exception as e:
+            log_message(f"Ignoring unreadable log tail state: {str(e)}")
+            return None
+
+    def _save_state(self):
+        """Persist inode/offset atomically"""
+        if not self.state_file or self.inode is None:
+            return
+
+        try:
+            tmp_file = f"{self.state_file}.tmp"
+            with open(tmp_file, 'w') as f:
+                # Resume at the start of any held-back partial line
+                offset = self.offset - len(self._pending)
+                json.dump({'log_file': self.log_file, 'inode': self.inode, 'offset': offset}, f)
+            os.replace(tmp_file, self.state_file)
+        except Exception as e:
+            log_message(f"Error saving log tail state: {str(e)}")
+
+    def _open(self, from_start):
+        """Open the log file and position at the saved offset, start or end"""
+        self._handle = open(self.log_file, 'rb')
+        st = os.fstat(self._handle.fileno())
+        self.inode = st.st_ino
+
+        saved = self._saved_state
+        self._saved_state = None
+
+        if saved and saved.get('inode') == st.st_ino and 0 <= saved.get('offset', -1) <= st.st_size:
+            self.offset = saved['offset']
+        elif from_start:
+            self.offset = 0
+        else:
+            # First start without usable state - only follow new activity
+            self.offset = st.st_size
+
+        self._handle.seek(self.offset)
+
+    def _close(self):
+        """Close the current file handle"""
+        if self._handle:
+            try:
+                self._handle.close()
+            except Exception:
+                pass
+        self._handle = None
+
+    def _drain(self, budget):
+        """Read up to budget bytes from the current handle"""
+        data = self._handle.read(budget)
+        self.offset += len(data)
+        return data
+
+    def read_new_lines(self):
+        """Return complete lines appended since the last call, handling truncation and rotation"""
+        chunks = [self._pending]
+        self._pending = b''
+        budget = self.max_bytes
+
+        try:
+            if self._handle is None:
+                if not os.path.exists(self.log_file):
+                    return []
+                self._open(from_start=False)
+
+            try:
+                st = os.stat(self.log_file)
+            except FileNotFoundError:
+                st = None  # Rotated away and not yet recreated - keep draining old handle
+
+            if st is not None and st.st_ino == self.inode and st.st_size < self.offset:
+                log_message(f"Log file truncated, restarting from beginning: {self.log_file}")
+                self._handle.seek(0)
+                self.offset = 0
+                chunks = []
+
+            data = self._drain(budget)
+            chunks.append(data)
+            budget -= len(data)
+
+            if st is not None and st.st_ino != self.inode and budget > 0:
+                # Old file fully consumed, switch to the new one
+                log_message(f"Log file rotated, following new file: {self.log_file}")
+                if not b''.join(chunks).endswith(b'\n'):
+                    chunks.append(b'\n')
+                self._close()
+                self._open(from_start=True)
+                chunks.append(self._drain(budget))
+
+        except Exception as e:
+            log_message(f"Error tailing log file: {str(e)}")
+            self._close()
+            return []
+
+        data = b''.join(chunks)
+        if not data:
+            return []
+
+        # Hold back an incomplete trailing line until its newline arrives
+        last_newline = data.rfind(b'\n')
+        if last_newline == -1:
+            self._pending = data
+            lines_data = b''
+        else:
+            self._pending = data[last_newline + 1:]
+            lines_data = data[:last_newline]
+
+        self._save_state()
+
+        if not lines_data:
+            return []
+        return lines_data.decode('utf-8', errors='ignore').split('\n')
+
+    def close(self):
+        """Release the file handle and persist the position"""
+        self._save_state()
+        self._close()
+
+def read_last_lines(log_file, count, block_size=65536):
+    """Read the last count lines by seeking backwards instead of loading the whole file"""
+    with open(log_file, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        blocks = []
+        newlines = 0
+
+        while position > 0 and newlines <= count:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            block = f.read(read_size)
+            blocks.append(block)
+            newlines += block.count(b'\n')
+
+    data = b''.join(reversed(blocks))
+    lines = data.decode('utf-8', errors='ignore').splitlines()
+    return lines[-count:] if len(lines) > count else lines
+
+def parse_syslog_timestamp(line):
+    """Return the epoch time of an RFC 5424 (<134>1 2025-06-12T10:15:30+02:00 ...) or
+    BSD (Jun 12 10:15:30 ...) syslog line, None if it has no recognisable timestamp"""
+    try:
+        if line.startswith('<'):
+            # Skip '<PRI>VERSION '
+            line = line[line.index(' ') + 1:]
+
+        if line[:4].isdigit():
+            token = line.split(' ', 1)[0]
+            if token.endswith('Z'):
+                token = token[:-1] + '+00:00'
+            return datetime.fromisoformat(token).timestamp()
+
+        parsed = datetime.strptime(line[:15], '%b %d %H:%M:%S')
+        now = datetime.now()
+        parsed = parsed.replace(year=now.year)
+        if parsed > now:
+            # December entries read in January
+            parsed = parsed.replace(year=now.year - 1)
+        return parsed.timestamp()
+    except (ValueError, IndexError):
+        return None
+
+def _probe_timestamp(f, offset):
+    """Timestamp and start offset of the first timestamped line starting after offset"""
+    f.seek(offset)
+    if offset > 0:
+        f.readline()  # Resync to the next line start
+    position = f.tell()
+
+    for _ in range(SEEK_MAX_PROBE_LINES):
+        line = f.readline()
+        if not line:
+            break
+        timestamp = parse_syslog_timestamp(line.decode('utf-8', errors='ignore'))
+        if timestamp is not None:
+            return timestamp, position
+        position += len(line)
+
+    return None, position
+
+def find_offset_for_time(log_file, since):
+    """Binary search the time-ordered log for the offset of the first line at or after since"""
+    with open(log_file, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        low, high = 0, f.tell()
+
+        # Invariant: every line starting before low is older than since
+        while high - low > SEEK_LINEAR_THRESHOLD:
+            middle = (low + high) // 2
+            timestamp, line_start = _probe_timestamp(f, middle)
+            if timestamp is not None and timestamp < since:
+                low = line_start
+            else:
+                high = middle
+
+        f.seek(low)
+        position = low
+        for line in f:
+            timestamp = parse_syslog_timestamp(line.decode('utf-8', errors='ignore'))
+            if timestamp is not None and timestamp >= since:
+                break
+            position += len(line)
+
+    return position
+
+def read_lines_between(log_file, since=None, until=None):
+    """Stream lines logged in [since, until] using O(log n) seeks to find the start"""
+    start = find_offset_for_time(log_file, since) if since is not None else 0
+
+    with open(log_file, 'rb') as f:
+        f.seek(start)
+        for raw_line in f:
+            line = raw_line.decode('utf-8', errors='ignore')
+            if until is not None:
+                timestamp = parse_syslog_timestamp(line)
+                if timestamp is not None and timestamp > until:
+                    break
+            yield line
+
+def find_rotated_logs(log_file, pattern=None):
+    """Find the log file and its rotated archives, oldest first"""
+    if not pattern:
+        # OPNsense rotates /var/log/filter/latest.log into filter_YYYYMMDD.log[.gz|.bz2]
+        pattern = os.path.join(os.path.dirname(log_file), 'filter_*.log*')
+
+    candidates = glob.glob(pattern)
+    if os.path.exists(log_file):
+        candidates.append(log_file)
+
+    # latest.log is usually a symlink to today's file, only read each file once
+    paths = {}
+    for path in candidates:
+        if os.path.isfile(path):
+            paths.setdefault(os.path.realpath(path), path)
+
+    return sorted(paths.values(), key=_log_sort_key)
+
+def _log_sort_key(path):
+    """Sort by the date embedded in the file name, falling back to modification time"""
+    match = re.search(r'(\d{8})', os.path.basename(path))
+    if match:
+        try:
+            return (datetime.strptime(match.group(1), '%Y%m%d').timestamp(), path)
+        except ValueError:
+            pass
+    try:
+        return (os.path.getmtime(path), path)
+    except OSError:
+        return (0, path)
+
+def open_log_file(path):
+    """Open a plain, gzip or bzip2 log file as a streaming text file"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', errors='ignore')
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rt', encoding='utf-8', errors='ignore')
+    return open(path, 'r', encoding='utf-8', errors='ignore')
+
+def iter_log_lines(paths):
+    """Stream lines from several log files in order with constant memory"""
+    for path in paths:
+        try:
+            with open_log_file(path) as f:
+                for line in f:
+                    yield line
+        except (OSError, EOFError) as e:
+            # Truncated archives still yield the lines read so far
+            log_message(f"Error reading log archive {path}: {str(e)}")
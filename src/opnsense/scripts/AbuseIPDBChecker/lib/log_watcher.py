@@ -0,0 +1,211 @@
+#!/usr/local/bin/python3
+
+"""
+Log Watcher Module
+Wakes the daemon when the firewall log changes (kqueue on FreeBSD, inotify on Linux,
+stat polling as fallback)
+"""
+
+import os
+import sys
+import time
+import select
+from .core_utils import log_message
+
+def sleep_unless_woken(seconds, wake_fd=None):
+    """Sleep, returning True early once wake_fd becomes readable (daemon shutdown)"""
+    if wake_fd is None:
+        time.sleep(seconds)
+        return False
+    return bool(select.select([wake_fd], [], [], seconds)[0])
+
+class PollingLogWatcher:
+    """Fallback watcher that stats the log file with an adaptive interval"""
+
+    name = 'polling'
+
+    def __init__(self, log_file, min_interval=0.1, max_interval=2.5, wake_fd=None):
+        self.log_file = log_file
+        self.wake_fd = wake_fd  # Readable when the daemon is stopping, ends any wait early
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self._interval = min_interval
+        self._signature = self._stat()
+
+    def _stat(self):
+        """Identity and size of the log file, None if missing"""
+        try:
+            st = os.stat(self.log_file)
+            return (st.st_ino, st.st_size, st.st_mtime)
+        except OSError:
+            return None
+
+    def wait(self, timeout):
+        """Block until the log changes or timeout expires, returns True on change"""
+        deadline = time.monotonic() + timeout
+
+        while True:
+            signature = self._stat()
+            if signature != self._signature:
+                self._signature = signature
+                self._interval = self.min_interval
+                return True
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+
+            # Back off while the log stays quiet
+            if sleep_unless_woken(min(self._interval, remaining), self.wake_fd):
+                return False
+            self._interval = min(self._interval * 2, self.max_interval)
+
+    def close(self):
+        """Nothing to release for polling"""
+        pass
+
+class KqueueLogWatcher:
+    """FreeBSD kqueue watcher on the log file and its directory"""
+
+    name = 'kqueue'
+
+    def __init__(self, log_file, wake_fd=None):
+        self.log_file = log_file
+        self.wake_fd = wake_fd  # Readable when the daemon is stopping, ends any wait early
+        self._kq = select.kqueue()
+        self._fds = []
+        self._target = None  # Real path of the watched file, latest.log is a symlink moved daily
+        if wake_fd is not None:
+            self._kq.control([select.kevent(wake_fd, filter=select.KQ_FILTER_READ, flags=select.KQ_EV_ADD)], 0, 0)
+        self._arm()
+
+    def _arm(self):
+        """(Re)register vnode events for the current log file and directory"""
+        self._release_fds()
+        fflags = (select.KQ_NOTE_WRITE | select.KQ_NOTE_EXTEND | select.KQ_NOTE_DELETE |
+                  select.KQ_NOTE_RENAME | select.KQ_NOTE_ATTRIB)
+        events = []
+        self._target = os.path.realpath(self.log_file)
+
+        # Directory events catch rotation and re-creation of the log file
+        for path in (os.path.dirname(self._target), self._target):
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except OSError:
+                continue
+            self._fds.append(fd)
+            events.append(select.kevent(fd, filter=select.KQ_FILTER_VNODE,
+                                        flags=select.KQ_EV_ADD | select.KQ_EV_CLEAR, fflags=fflags))
+
+        if events:
+            self._kq.control(events, 0, 0)
+
+    def _release_fds(self):
+        """Close watched descriptors, which also removes their kevents"""
+        for fd in self._fds:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        self._fds = []
+
+    def wait(self, timeout):
+        """Block until the log changes or timeout expires, returns True on change"""
+        if not self._fds:
+            self._arm()
+            if not self._fds:
+                sleep_unless_woken(timeout, self.wake_fd)
+                return False
+
+        events = self._kq.control(None, 16, timeout)
+        if any(e.ident == self.wake_fd for e in events):
+            return False
+
+        # The symlink may point at a new daily file while the old one is left untouched
+        retargeted = os.path.realpath(self.log_file) != self._target
+        if retargeted or len(self._fds) < 2 or \
+                any(e.fflags & (select.KQ_NOTE_DELETE | select.KQ_NOTE_RENAME) for e in events):
+            # Log file rotated or (re)created - follow the new file
+            self._arm()
+        return bool(events) or retargeted
+
+    def close(self):
+        """Release the kqueue and descriptors"""
+        self._release_fds()
+        self._kq.close()
+
+class InotifyLogWatcher:
+    """Linux inotify watcher on the directories holding the log file"""
+
+    name = 'inotify'
+
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    def __init__(self, log_file, wake_fd=None):
+        import ctypes
+        import ctypes.util
+
+        self.log_file = log_file
+        self.wake_fd = wake_fd  # Readable when the daemon is stopping, ends any wait early
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+        mask = (self.IN_MODIFY | self.IN_ATTRIB | self.IN_CLOSE_WRITE | self.IN_MOVED_FROM |
+                self.IN_MOVED_TO | self.IN_CREATE | self.IN_DELETE)
+        watched = 0
+        # Watch both the symlink directory and the real target directory
+        for directory in {os.path.dirname(log_file), os.path.dirname(os.path.realpath(log_file))}:
+            if self._libc.inotify_add_watch(self._fd, os.fsencode(directory), mask) >= 0:
+                watched += 1
+
+        if not watched:
+            os.close(self._fd)
+            raise OSError(ctypes.get_errno(), f'inotify_add_watch failed for {log_file}')
+
+        self._poller = select.poll()
+        self._poller.register(self._fd, select.POLLIN)
+        if wake_fd is not None:
+            self._poller.register(wake_fd, select.POLLIN)
+
+    def wait(self, timeout):
+        """Block until the log directory changes or timeout expires, returns True on change"""
+        ready = self._poller.poll(max(0, int(timeout * 1000)))
+        if not ready or any(fd == self.wake_fd for fd, _ in ready):
+            return False
+
+        # Drain queued events, the reader works out what actually changed
+        try:
+            while os.read(self._fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        """Release the inotify descriptor"""
+        try:
+            os.close(self._fd)
+        except OSError:
+            pass
+
+def create_log_watcher(log_file, poll_interval=2.5, wake_fd=None):
+    """Pick the best available watch backend for this platform"""
+    try:
+        if hasattr(select, 'kqueue'):
+            return KqueueLogWatcher(log_file, wake_fd)
+        if sys.platform.startswith('linux'):
+            return InotifyLogWatcher(log_file, wake_fd)
+    except Exception as e:
+        log_message(f"Event-driven log watching unavailable, falling back to polling: {str(e)}")
+
+    return PollingLogWatcher(log_file, max_interval=poll_interval, wake_fd=wake_fd)
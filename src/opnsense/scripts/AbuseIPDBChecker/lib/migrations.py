@@ -0,0 +1,167 @@
+#!/usr/local/bin/python3
+
+"""
+Schema Migrations Module
+Ordered schema migrations tracked with PRAGMA user_version, shared by
+DatabaseManager and setup_database.py
+"""
+
+from .core_utils import log_message
+
+def _table_columns(c, table):
+    """Column names of an existing table"""
+    c.execute(f'PRAGMA table_info({table})')
+    return [column[1] for column in c.fetchall()]
+
+def _migrate_base_schema(c):
+    """checked_ips, threats and stats, upgrading databases created before versioning"""
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS checked_ips (
+        ip TEXT PRIMARY KEY,
+        first_seen TEXT,
+        last_checked TEXT,
+        check_count INTEGER,
+        threat_level INTEGER DEFAULT 0,
+        country TEXT DEFAULT 'Unknown',
+        destination_port TEXT DEFAULT '',
+        connection_details TEXT DEFAULT ''
+    )
+    ''')
+
+    columns = _table_columns(c, 'checked_ips')
+    if 'country' not in columns:
+        c.execute("ALTER TABLE checked_ips ADD COLUMN country TEXT DEFAULT 'Unknown'")
+    if 'threat_level' not in columns:
+        c.execute('ALTER TABLE checked_ips ADD COLUMN threat_level INTEGER DEFAULT 0')
+        if 'is_threat' in columns:
+            # Old binary threats become malicious
+            c.execute('UPDATE checked_ips SET threat_level = 2 WHERE is_threat = 1')
+    if 'destination_port' not in columns:
+        c.execute("ALTER TABLE checked_ips ADD COLUMN destination_port TEXT DEFAULT ''")
+    if 'connection_details' not in columns:
+        c.execute("ALTER TABLE checked_ips ADD COLUMN connection_details TEXT DEFAULT ''")
+
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS threats (
+        ip TEXT PRIMARY KEY,
+        abuse_score INTEGER,
+        reports INTEGER,
+        last_seen TEXT,
+        categories TEXT,
+        country TEXT,
+        threat_level INTEGER DEFAULT 2,
+        marked_safe BOOLEAN DEFAULT 0,
+        marked_safe_date TEXT DEFAULT '',
+        marked_safe_by TEXT DEFAULT '',
+        FOREIGN KEY (ip) REFERENCES checked_ips(ip)
+    )
+    ''')
+
+    threat_columns = _table_columns(c, 'threats')
+    if 'threat_level' not in threat_columns:
+        c.execute('ALTER TABLE threats ADD COLUMN threat_level INTEGER DEFAULT 2')
+    if 'marked_safe' not in threat_columns:
+        c.execute('ALTER TABLE threats ADD COLUMN marked_safe BOOLEAN DEFAULT 0')
+    if 'marked_safe_date' not in threat_columns:
+        c.execute("ALTER TABLE threats ADD COLUMN marked_safe_date TEXT DEFAULT ''")
+    if 'marked_safe_by' not in threat_columns:
+        c.execute("ALTER TABLE threats ADD COLUMN marked_safe_by TEXT DEFAULT ''")
+
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS stats (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )
+    ''')
+    c.executemany('INSERT OR IGNORE INTO stats (key, value) VALUES (?, ?)', [
+        ('last_check', 'Never'),
+        ('daily_checks', '0'),
+        ('total_checks', '0'),
+        ('last_reset', '')
+    ])
+
+def _migrate_flows(c):
+    """Parsed flows written by the daemon, queried by the UI instead of the raw log"""
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS flows (
+        ts INTEGER NOT NULL,
+        src INTEGER NOT NULL,
+        dst INTEGER NOT NULL,
+        dst_port INTEGER,
+        protocol INTEGER,
+        action INTEGER
+    )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_flows_ts ON flows (ts)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_flows_src_ts ON flows (src, ts)')
+
+def _migrate_api_cache(c):
+    """API response cache and the cross-process in-flight lookup leases"""
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS api_cache (
+        ip TEXT PRIMARY KEY,
+        report TEXT,
+        negative INTEGER DEFAULT 0,
+        fetched_at INTEGER NOT NULL,
+        expires_at INTEGER NOT NULL
+    )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_api_cache_expires ON api_cache (expires_at)')
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS api_inflight (
+        ip TEXT PRIMARY KEY,
+        owner TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    )
+    ''')
+
+def _migrate_hot_query_indexes(c):
+    """Indexes for UI pagination, the alias export, recheck scans and statistics counts"""
+    # Lets queries filter with marked_safe = 0 instead of an OR that defeats the index
+    c.execute('UPDATE threats SET marked_safe = 0 WHERE marked_safe IS NULL')
+    # All-IPs page order and the last_checked range scan for rechecks
+    c.execute('CREATE INDEX IF NOT EXISTS idx_checked_ips_last_checked ON checked_ips (last_checked, ip)')
+    # Suspicious/malicious counts and the threat level filter of joined threat queries
+    c.execute('CREATE INDEX IF NOT EXISTS idx_checked_ips_threat_level ON checked_ips (threat_level)')
+    # Threats page order (active first, newest first) and the marked safe count, ip descending so
+    # cursor pages seek on (last_seen, ip)
+    c.execute('CREATE INDEX IF NOT EXISTS idx_threats_marked_safe_last_seen ON threats (marked_safe, last_seen DESC, ip DESC)')
+    # Alias export order among active threats
+    c.execute('CREATE INDEX IF NOT EXISTS idx_threats_score ON threats (marked_safe, abuse_score DESC, last_seen DESC, ip)')
+
+# Applied in order, migration N leaves the database at user_version N. Only ever append.
+MIGRATIONS = [
+    _migrate_base_schema,
+    _migrate_flows,
+    _migrate_api_cache,
+    _migrate_hot_query_indexes
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def get_schema_version(conn):
+    """Schema version stored in the database header"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate(conn):
+    """Apply pending migrations in one transaction, returns the resulting schema version"""
+    # Steady state: a single header read
+    version = get_schema_version(conn)
+    if version >= SCHEMA_VERSION:
+        return version
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        # Another process may have migrated while we waited for the lock
+        version = get_schema_version(conn)
+        c = conn.cursor()
+        for number in range(version + 1, SCHEMA_VERSION + 1):
+            MIGRATIONS[number - 1](c)
+            log_message(f"Applied database migration {number}: {MIGRATIONS[number - 1].__doc__}")
+        c.execute(f'PRAGMA user_version = {max(version, SCHEMA_VERSION)}')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return max(version, SCHEMA_VERSION)
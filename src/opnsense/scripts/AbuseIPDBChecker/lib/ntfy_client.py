@@ -63,74 +63,11 @@ class NtfyClient:
             return {'status': 'skipped', 'reason': 'notification disabled for this threat level'}
         
         try:
-            # Determine threat text and action (no emojis)
-            if threat_level == 2:
-                threat_text = "MALICIOUS"
-                action = "Added to MaliciousIPs alias"
-            elif threat_level == 1:
-                threat_text = "SUSPICIOUS" 
-                action = "Monitored (not blocked)"
-            else:
+            notification = self._build_threat_notification(ip_address, abuse_score, threat_level, country,
+                                                            connection_details, is_new_threat)
+            if notification is None:
                 return {'status': 'skipped', 'reason': 'threat level too low'}
-            
-            # Build notification title (no emojis)
-            status_text = "NEW" if is_new_threat else "UPDATED"
-            title = f"{status_text} {threat_text} IP Detected"
-
-            # Build message content
-            message_parts = [
-                f"Host: {ip_address}",
-                f"Threat Level: {threat_text} ({abuse_score}%)"
-            ]
-
-            # Add country with flag
-            country_flag = self._get_country_flag(country)
-            country_display = f"{country} {country_flag}".strip() if country_flag else (country or "Unknown")
-            message_parts.append(f"Country: {country_display}")
-
-            # Determine action based on threat level and config
-            if threat_level == 2:  # Malicious
-                if self.config.get('alias_enabled', True):
-                    action = "Added to MaliciousIPs alias"
-                else:
-                    action = "Detected (alias disabled)"
-            elif threat_level == 1:  # Suspicious
-                if self.config.get('alias_enabled', True) and self.config.get('alias_include_suspicious', False):
-                    action = "Added to MaliciousIPs alias"
-                else:
-                    action = "Monitored (not blocked)"
-            else:
-                action = "Monitored"
-
-            message_parts.append(f"Action: {action}")
-
-            # Add connection details if enabled and available
-            if self.include_connection_details and connection_details:
-                conn_info = self._format_connection_details(connection_details)
-                if conn_info['target_host'] and conn_info['ports_info']:
-                    message_parts.append(f"Connection: to {conn_info['target_host']} ({conn_info['ports_info']})")
-                elif conn_info['ports_info']:
-                    message_parts.append(f"Connections: {conn_info['ports_info']}")
-                elif conn_info['target_host']:
-                    message_parts.append(f"Target: {conn_info['target_host']}")
-
-            message = "\n".join(message_parts)
-            
-            # Prepare headers with explicit UTF-8
-            headers = {
-                'Content-Type': 'text/plain; charset=utf-8',
-                'User-Agent': 'OPNsense-AbuseIPDB-Checker/1.0',
-                'Title': title,
-                'Priority': str(self.priority),
-                'Tags': 'warning,security,firewall'
-            }
-            
-            # Add authentication if token provided
-            if self.token:
-                headers['Authorization'] = f'Bearer {self.token}'
-            
-            # Add click action to view IP details
-            headers['Click'] = f'https://www.abuseipdb.com/check/{ip_address}'
+            headers, message, threat_text = notification
             
             # Send notification with explicit UTF-8 encoding
             response = requests.post(
@@ -139,23 +76,7 @@ class NtfyClient:
                 headers=headers,
                 timeout=10
             )
-            
-            if response.status_code == 200:
-                log_message(f"ntfy notification sent successfully for {ip_address} ({threat_text})")
-                return {
-                    'status': 'success',
-                    'message': f'Notification sent for {ip_address}',
-                    'threat_level': threat_text,
-                    'abuse_score': abuse_score
-                }
-            else:
-                error_msg = f"ntfy notification failed: HTTP {response.status_code} - {response.text}"
-                log_message(error_msg)
-                return {
-                    'status': 'error',
-                    'message': error_msg,
-                    'http_code': response.status_code
-                }
+            return self._notification_result(response, ip_address, threat_text, abuse_score)
                 
         except requests.exceptions.RequestException as e:
             error_msg = f"ntfy notification request failed: {str(e)}"
@@ -174,6 +95,98 @@ class NtfyClient:
                 'exception': str(e)
             }
 
+    def _build_threat_notification(self, ip_address, abuse_score, threat_level, country='Unknown',
+                                   connection_details='', is_new_threat=False):
+        """Build (headers, message, threat_text) for a threat notification, None below suspicious"""
+        # Determine threat text and action (no emojis)
+        if threat_level == 2:
+            threat_text = "MALICIOUS"
+            action = "Added to MaliciousIPs alias"
+        elif threat_level == 1:
+            threat_text = "SUSPICIOUS" 
+            action = "Monitored (not blocked)"
+        else:
+            return None
+        
+        # Build notification title (no emojis)
+        status_text = "NEW" if is_new_threat else "UPDATED"
+        title = f"{status_text} {threat_text} IP Detected"
+
+        # Build message content
+        message_parts = [
+            f"Host: {ip_address}",
+            f"Threat Level: {threat_text} ({abuse_score}%)"
+        ]
+
+        # Add country with flag
+        country_flag = self._get_country_flag(country)
+        country_display = f"{country} {country_flag}".strip() if country_flag else (country or "Unknown")
+        message_parts.append(f"Country: {country_display}")
+
+        # Determine action based on threat level and config
+        if threat_level == 2:  # Malicious
+            if self.config.get('alias_enabled', True):
+                action = "Added to MaliciousIPs alias"
+            else:
+                action = "Detected (alias disabled)"
+        elif threat_level == 1:  # Suspicious
+            if self.config.get('alias_enabled', True) and self.config.get('alias_include_suspicious', False):
+                action = "Added to MaliciousIPs alias"
+            else:
+                action = "Monitored (not blocked)"
+        else:
+            action = "Monitored"
+
+        message_parts.append(f"Action: {action}")
+
+        # Add connection details if enabled and available
+        if self.include_connection_details and connection_details:
+            conn_info = self._format_connection_details(connection_details)
+            if conn_info['target_host'] and conn_info['ports_info']:
+                message_parts.append(f"Connection: to {conn_info['target_host']} ({conn_info['ports_info']})")
+            elif conn_info['ports_info']:
+                message_parts.append(f"Connections: {conn_info['ports_info']}")
+            elif conn_info['target_host']:
+                message_parts.append(f"Target: {conn_info['target_host']}")
+
+        message = "\n".join(message_parts)
+        
+        # Prepare headers with explicit UTF-8
+        headers = {
+            'Content-Type': 'text/plain; charset=utf-8',
+            'User-Agent': 'OPNsense-AbuseIPDB-Checker/1.0',
+            'Title': title,
+            'Priority': str(self.priority),
+            'Tags': 'warning,security,firewall'
+        }
+        
+        # Add authentication if token provided
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        
+        # Add click action to view IP details
+        headers['Click'] = f'https://www.abuseipdb.com/check/{ip_address}'
+        return headers, message, threat_text
+
+    def _notification_result(self, response, ip_address, threat_text, abuse_score):
+        """Status dict for an ntfy publish response"""
+        if response.status_code == 200:
+            log_message(f"ntfy notification sent successfully for {ip_address} ({threat_text})")
+            return {
+                'status': 'success',
+                'message': f'Notification sent for {ip_address}',
+                'threat_level': threat_text,
+                'abuse_score': abuse_score
+            }
+        else:
+            error_msg = f"ntfy notification failed: HTTP {response.status_code} - {response.text}"
+            log_message(error_msg)
+            return {
+                'status': 'error',
+                'message': error_msg,
+                'http_code': response.status_code
+            }
+
     def _format_connection_details(self, connection_details):
         """Format connection details for notification - returns dict with target_host and ports_info"""
         if not connection_details:
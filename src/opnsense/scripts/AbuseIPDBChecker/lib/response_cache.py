@@ -0,0 +1,174 @@
+#!/usr/local/bin/python3
+
+"""
+Response Cache Module
+Persistent TTL cache of AbuseIPDB check responses with negative caching and stale-while-revalidate
+"""
+
+import os
+import json
+import time
+import uuid
+import socket
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .core_utils import log_message, classify_threat_level
+
+# Cache lookup states
+CACHE_MISS = 'miss'  # Never cached
+CACHE_EXPIRED = 'expired'  # Cached once, too old to serve
+CACHE_FRESH = 'fresh'
+CACHE_STALE = 'stale'  # Expired but inside the stale window, served while revalidating
+CACHE_NEGATIVE = 'negative'  # API rejected the address (422)
+LEASE_POLL_INTERVAL = 0.25  # Seconds between checks while another process looks up the same IP
+
+class ResponseCache:
+    """Raw check reports stored in the api_cache table with per-threat-level TTLs"""
+
+    def __init__(self, db_manager, config):
+        self.db_manager = db_manager
+        self.config = config
+        self.on_revalidated = None  # Called with (ip, report, api_requests) after a background refresh
+        self._revalidating = set()
+        self._lock = threading.Lock()
+        self._executor = None
+        self._tasks = set()  # Revalidations running on an asyncio event loop
+
+    def _ttl_seconds(self, report):
+        """TTL for a report by the threat level its score maps to"""
+        threat_level = classify_threat_level(report.get('abuseConfidenceScore', 0), self.config)
+        if threat_level >= 2:
+            hours = self.config.get('cache_ttl_malicious_hours', 72)
+        elif threat_level == 1:
+            hours = self.config.get('cache_ttl_suspicious_hours', 24)
+        else:
+            hours = self.config.get('cache_ttl_clean_hours') or self.config.get('check_frequency', 7) * 24
+        return hours * 3600
+
+    def lookup(self, ip):
+        """Return (state, report) for an IP, report is None unless the state is fresh or stale"""
+        try:
+            entry = self.db_manager.get_api_cache_entry(ip)
+        except Exception as e:
+            log_message(f"Error reading response cache for {ip}: {str(e)}")
+            return CACHE_MISS, None
+        if entry is None:
+            return CACHE_MISS, None
+
+        now = time.time()
+        if entry['negative']:
+            return (CACHE_NEGATIVE, None) if now < entry['expires_at'] else (CACHE_EXPIRED, None)
+
+        try:
+            report = json.loads(entry['report'])
+        except (TypeError, ValueError):
+            return CACHE_EXPIRED, None
+
+        if now < entry['expires_at']:
+            return CACHE_FRESH, report
+        if now < entry['expires_at'] + self.config.get('cache_stale_hours', 24) * 3600:
+            return CACHE_STALE, report
+        return CACHE_EXPIRED, None
+
+    def store(self, ip, report):
+        """Cache a successful check response"""
+        now = int(time.time())
+        try:
+            self.db_manager.store_api_cache_entry(ip, json.dumps(report), False, now, now + self._ttl_seconds(report))
+        except Exception as e:
+            log_message(f"Error writing response cache for {ip}: {str(e)}")
+
+    def store_invalid(self, ip):
+        """Negatively cache an address the API rejected"""
+        now = int(time.time())
+        try:
+            expires_at = now + self.config.get('cache_ttl_invalid_hours', 720) * 3600
+            self.db_manager.store_api_cache_entry(ip, None, True, now, expires_at)
+        except Exception as e:
+            log_message(f"Error writing response cache for {ip}: {str(e)}")
+
+    def acquire_lease(self, ip):
+        """Claim the lookup of an IP across processes, returns the lease token or None while someone else is fetching it"""
+        # Unique per acquisition, coroutines on one event loop share a process and thread
+        token = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"
+        try:
+            if self.db_manager.acquire_inflight_lease(ip, token, self.config.get('api_inflight_lease_seconds', 60)):
+                return token
+            return None
+        except Exception as e:
+            # Coalescing is best effort, never block a lookup on it
+            log_message(f"Error acquiring lookup lease for {ip}: {str(e)}")
+            return token
+
+    def release_lease(self, ip, token):
+        """Release a lease taken by acquire_lease"""
+        try:
+            self.db_manager.release_inflight_lease(ip, token)
+        except Exception as e:
+            log_message(f"Error releasing lookup lease for {ip}: {str(e)}")
+
+    def shared_result(self, ip):
+        """(state, report) once the lease holder stored a usable response, None while still waiting"""
+        state, report = self.lookup(ip)
+        if state in (CACHE_FRESH, CACHE_NEGATIVE):
+            return state, report
+        return None
+
+    def revalidate(self, ip, fetch):
+        """Refresh a stale entry in the background, at most one refresh per IP at a time"""
+        with self._lock:
+            if ip in self._revalidating:
+                return
+            self._revalidating.add(ip)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='abuseipdb-revalidate')
+            self._executor.submit(self._revalidate, ip, fetch)
+
+    def _revalidate(self, ip, fetch):
+        """Background worker: fetch stores the fresh response and returns (report, api_requests), then notify the owner"""
+        try:
+            report, api_requests = fetch(ip)
+            log_message(f"Revalidated cached response for {ip}")
+            if self.on_revalidated and report:
+                self.on_revalidated(ip, report, api_requests)
+        except Exception as e:
+            log_message(f"Background revalidation failed for {ip}: {str(e)}")
+        finally:
+            with self._lock:
+                self._revalidating.discard(ip)
+
+    def revalidate_async(self, ip, fetch):
+        """asyncio counterpart of revalidate, fetch is a coroutine function"""
+        with self._lock:
+            if ip in self._revalidating:
+                return
+            self._revalidating.add(ip)
+        task = asyncio.get_running_loop().create_task(self._revalidate_async(ip, fetch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _revalidate_async(self, ip, fetch):
+        """Background task: fetch stores the fresh response and returns (report, api_requests), then notify the owner"""
+        try:
+            report, api_requests = await fetch(ip)
+            log_message(f"Revalidated cached response for {ip}")
+            if self.on_revalidated and report:
+                self.on_revalidated(ip, report, api_requests)
+        except Exception as e:
+            log_message(f"Background revalidation failed for {ip}: {str(e)}")
+        finally:
+            with self._lock:
+                self._revalidating.discard(ip)
+
+    async def wait_async(self):
+        """Finish revalidations running on the current event loop"""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def wait(self):
+        """Finish pending background revalidations"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
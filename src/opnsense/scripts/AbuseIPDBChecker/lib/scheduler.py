@@ -0,0 +1,73 @@
+#!/usr/local/bin/python3
+
+"""
+Priority Scheduler Module
+Orders pending IPs so a limited API quota is spent on the most valuable lookups first
+"""
+
+import math
+import time
+from .core_utils import log_message
+
+SENSITIVE_PORTS = {22, 23, 445, 1433, 3306, 3389, 5900}  # SSH, Telnet, SMB, MSSQL, MySQL, RDP, VNC
+
+# Score weights
+WEIGHT_HITS = 10  # Per doubling of the hit count
+WEIGHT_PORT = 5  # Per distinct destination port, capped at MAX_SCORED_PORTS
+WEIGHT_SENSITIVE = 25  # Any connection to a sensitive port
+WEIGHT_RECENCY = 20  # Halves every RECENCY_HALF_LIFE seconds since last seen
+WEIGHT_PREVIOUS_THREAT = 40  # Already in the threats table
+MAX_SCORED_PORTS = 10
+RECENCY_HALF_LIFE = 3600
+
+def destination_ports(connection_strings):
+    """Distinct destination ports from 'src:port accessing dst:port' connection strings"""
+    ports = set()
+    for connection in connection_strings:
+        port = connection.rsplit(':', 1)[-1]
+        if port.isdigit():
+            ports.add(int(port))
+    return ports
+
+class PriorityScheduler:
+    """Scores pending IPs by hits, port spread, sensitive ports, recency and threat history"""
+
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+
+    def score(self, entry, previous_threat, now=None):
+        """Priority of one pending IP entry ({'ports', 'hits', 'last_seen'}), higher is checked first"""
+        now = now or time.time()
+        ports = destination_ports(entry.get('ports') or ())
+        age = max(0, now - entry.get('last_seen', now))
+
+        score = WEIGHT_HITS * math.log2(1 + max(1, entry.get('hits', 1)))
+        score += WEIGHT_PORT * min(len(ports), MAX_SCORED_PORTS)
+        if ports & SENSITIVE_PORTS:
+            score += WEIGHT_SENSITIVE
+        score += WEIGHT_RECENCY * 0.5 ** (age / RECENCY_HALF_LIFE)
+        if previous_threat:
+            score += WEIGHT_PREVIOUS_THREAT
+        return score
+
+    def prioritize(self, ip_connections, threat_ips=None):
+        """Return the pending IPs as a dict ordered by descending priority.
+        threat_ips is the caller's cached threat history, loaded from the database when omitted."""
+        if threat_ips is None:
+            try:
+                threat_ips = self.db_manager.get_threat_ip_set()
+            except Exception as e:
+                log_message(f"Error loading threat history for scheduling: {str(e)}")
+                threat_ips = set()
+
+        now = time.time()
+        scores = {
+            ip: self.score(entry if isinstance(entry, dict) else {'ports': entry}, ip in threat_ips, now)
+            for ip, entry in ip_connections.items()
+        }
+        ordered = sorted(ip_connections, key=lambda ip: scores[ip], reverse=True)
+
+        if ordered:
+            top = ', '.join(f"{ip} ({scores[ip]:.0f})" for ip in ordered[:3])
+            log_message(f"Scheduled {len(ordered)} pending IPs by priority, top: {top}")
+        return {ip: ip_connections[ip] for ip in ordered}
@@ -29,9 +29,16 @@
     Initialize the SQLite database for AbuseIPDBChecker
 """
 import os
+import sys
 import sqlite3
 import json
 
+# Add lib directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'lib'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from lib.migrations import migrate
+
 DB_DIR = '/var/db/abuseipdbchecker'
 DB_FILE = os.path.join(DB_DIR, 'abuseipdb.db')
 
@@ -45,86 +52,22 @@ def ensure_dir_exists():
     return {'status': 'ok'}
 
 def setup_database():
-    """Initialize the SQLite database with migration support"""
+    """Initialize the SQLite database by applying the shared schema migrations"""
     try:
         # Ensure directory exists
         dir_result = ensure_dir_exists()
         if dir_result['status'] != 'ok':
             return dir_result
 
-        # Create database file
+        # Create database file and bring the schema up to date
         conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-
-        # Create tables with new schema
-        c.execute('''
-        CREATE TABLE IF NOT EXISTS checked_ips (
-            ip TEXT PRIMARY KEY,
-            first_seen TEXT,
-            last_checked TEXT,
-            check_count INTEGER,
-            threat_level INTEGER DEFAULT 0,
-            country TEXT DEFAULT 'Unknown'
-        )
-        ''')
-
-        # Migration: Add country column if missing
-        c.execute('PRAGMA table_info(checked_ips)')
-        columns = [column[1] for column in c.fetchall()]
-        if 'country' not in columns:
-            c.execute('ALTER TABLE checked_ips ADD COLUMN country TEXT DEFAULT "Unknown"')
-        
-        if 'threat_level' not in columns:
-            if 'is_threat' in columns:
-                # Migrate existing data using old threshold logic
-                c.execute('ALTER TABLE checked_ips ADD COLUMN threat_level INTEGER DEFAULT 0')
-                c.execute('UPDATE checked_ips SET threat_level = 2 WHERE is_threat = 1')  # Old threats become malicious
-                c.execute('UPDATE checked_ips SET threat_level = 0 WHERE is_threat = 0')  # Old safe remain safe
-            else:
-                # New installation
-                c.execute('ALTER TABLE checked_ips ADD COLUMN threat_level INTEGER DEFAULT 0')
-
-        # Rest of table creation...
-        c.execute('''
-        CREATE TABLE IF NOT EXISTS threats (
-            ip TEXT PRIMARY KEY,
-            abuse_score INTEGER,
-            reports INTEGER,
-            last_seen TEXT,
-            categories TEXT,
-            country TEXT,
-            threat_level INTEGER DEFAULT 2,
-            FOREIGN KEY (ip) REFERENCES checked_ips(ip)
-        )
-        ''')
-
-        # Add threat_level to threats table if missing
-        c.execute('PRAGMA table_info(threats)')
-        threat_columns = [column[1] for column in c.fetchall()]
-        if 'threat_level' not in threat_columns:
-            c.execute('ALTER TABLE threats ADD COLUMN threat_level INTEGER DEFAULT 2')
-
-        # Create stats table (unchanged)
-        c.execute('''
-        CREATE TABLE IF NOT EXISTS stats (
-            key TEXT PRIMARY KEY,
-            value TEXT
-        )
-        ''')
-
-        # Initialize stats
-        c.execute('INSERT OR IGNORE INTO stats (key, value) VALUES (?, ?)', ('last_check', 'Never'))
-        c.execute('INSERT OR IGNORE INTO stats (key, value) VALUES (?, ?)', ('daily_checks', '0'))
-        c.execute('INSERT OR IGNORE INTO stats (key, value) VALUES (?, ?)', ('total_checks', '0'))
-        c.execute('INSERT OR IGNORE INTO stats (key, value) VALUES (?, ?)', ('last_reset', ''))
-
-        conn.commit()
+        version = migrate(conn)
         conn.close()
 
         # Set correct permissions
         os.chmod(DB_FILE, 0o640)
 
-        return {'status': 'ok', 'message': 'Database initialized successfully with three-tier classification'}
+        return {'status': 'ok', 'message': f'Database initialized successfully (schema version {version})'}
     
     except Exception as e:
         return {'status': 'failed', 'message': f'Error initializing database: {str(e)}'}
@@ -0,0 +1,262 @@
+#!/usr/local/bin/python3
+
+"""
+API Client Tests
+Session pool, token bucket and circuit breaker of the AbuseIPDB client, the latter two on a fake clock
+
+Run from the repository root: python3 -m unittest discover -s tests
+"""
+
+import os
+import sys
+import unittest
+from datetime import date, timedelta
+from unittest import mock
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           'src', 'opnsense', 'scripts', 'AbuseIPDBChecker')
+sys.path.insert(0, SCRIPTS_DIR)
+
+import requests
+from lib.config_manager import ConfigManager
+from lib.api_client import AbuseIPDBClient, TokenBucket, CircuitBreaker, APIConnectionError
+
+class FakeClock:
+    """Stands in for the time module of lib.api_client, sleeping advances the clock"""
+
+    def __init__(self, now=1000000.0):
+        self.now = now
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    def advance(self, seconds):
+        self.now += seconds
+
+class SessionPoolTest(unittest.TestCase):
+    """Workers check out their own keep-alive session, a failure only resets the failing worker's"""
+
+    def setUp(self):
+        config = dict(ConfigManager().get_config(), api_key='test-key', blacklist_enabled=False)
+        self.client = AbuseIPDBClient(config)
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_concurrent_checkouts_get_distinct_sessions(self):
+        first = self.client._get_session()
+        second = self.client._get_session()
+        self.assertIsNot(first, second)
+        self.client._release_session(first)
+        # Released sessions are reused instead of reconnecting
+        self.assertIs(self.client._get_session(), first)
+        self.client._release_session(first)
+        self.client._release_session(second)
+
+    def test_connection_error_resets_only_failing_session(self):
+        in_use = self.client._get_session()
+        failing = self.client._get_session()
+        self.client._release_session(failing)
+
+        with mock.patch.object(requests.Session, 'close') as close, \
+                mock.patch.object(requests.Session, 'get', side_effect=requests.exceptions.ConnectionError('reset')):
+            with self.assertRaises(APIConnectionError):
+                self.client._api_get_attempt(self.client.api_endpoint, {}, '203.0.113.1')
+            self.assertEqual(close.call_count, 1)
+
+        # The failed session left the pool, the busy worker's session is untouched
+        self.assertEqual(self.client._idle_sessions, [])
+        self.client._release_session(in_use)
+        self.assertIs(self.client._get_session(), in_use)
+        self.client._release_session(in_use)
+
+    def test_api_key_change_replaces_sessions(self):
+        old = self.client._get_session()
+        self.client._release_session(old)
+        self.client.update_config(dict(self.client.config, api_key='other-key'))
+        session = self.client._get_session()
+        self.assertIsNot(session, old)
+        self.assertEqual(session.headers['Key'], 'other-key')
+        self.client._release_session(session)
+
+class TokenBucketTest(unittest.TestCase):
+    """Rate tokens, the daily budget and the server-reported quota"""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch('lib.api_client.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_refill_and_wait(self):
+        bucket = TokenBucket(2)
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertEqual(bucket.reserve(), 0)
+        # Empty: the next token is half a second away at 2 per second
+        self.assertAlmostEqual(bucket.reserve(), 0.5)
+        self.clock.advance(0.5)
+        self.assertEqual(bucket.reserve(), 0)
+
+        # acquire sleeps exactly until the refill
+        self.assertTrue(bucket.acquire())
+        self.assertAlmostEqual(sum(self.clock.sleeps), 0.5)
+
+    def test_refill_capped_at_capacity(self):
+        bucket = TokenBucket(2)
+        self.clock.advance(3600)
+        self.assertEqual([bucket.reserve() for _ in range(2)], [0, 0])
+        self.assertGreater(bucket.reserve(), 0)
+
+    def test_pause_after_429(self):
+        bucket = TokenBucket(2)
+        bucket.pause_until(self.clock.now + 5)
+        self.assertAlmostEqual(bucket.reserve(), 5)
+        self.clock.advance(5)
+        self.assertEqual(bucket.reserve(), 0)
+
+    def test_daily_limit(self):
+        bucket = TokenBucket(10, daily_limit=3)
+        bucket.set_daily_used(1)
+        self.assertEqual([bucket.reserve(), bucket.reserve()], [0, 0])
+        self.assertIsNone(bucket.reserve())
+        self.assertFalse(bucket.acquire())
+        self.assertEqual(bucket.remaining_today(), 0)
+        self.assertTrue(bucket.budget_spent())
+
+        # A new day restores the budget
+        bucket._day = date.today() - timedelta(days=1)
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertEqual(bucket.daily_used, 1)
+
+    def test_server_quota(self):
+        bucket = TokenBucket(10)
+        bucket.sync_quota(1, self.clock.now + 60)
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertIsNone(bucket.reserve())
+        self.assertTrue(bucket.budget_spent())
+
+        # The quota window rolls over at the reported reset
+        self.clock.advance(60)
+        self.assertFalse(bucket.budget_spent())
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertIsNone(bucket.quota_remaining)
+
+    def test_unmetered(self):
+        bucket = TokenBucket(10, daily_limit=1)
+        bucket.sync_quota(5, self.clock.now + 60)
+        bucket.set_daily_used(1)
+        self.assertIsNone(bucket.reserve())
+
+        # Unmetered requests only take a rate token, even with the budget spent
+        self.assertEqual(bucket.reserve(metered=False), 0)
+        self.assertEqual(bucket.daily_used, 1)
+        self.assertEqual(bucket.quota_remaining, 5)
+
+    def test_metered_outside_server_quota(self):
+        bucket = TokenBucket(10, daily_limit=5)
+        bucket.sync_quota(0, self.clock.now + 60)
+        self.assertIsNone(bucket.reserve())
+
+        # check-block spends the daily budget but not the check quota
+        self.assertEqual(bucket.reserve(track_quota=False), 0)
+        self.assertEqual(bucket.daily_used, 1)
+        self.assertEqual(bucket.quota_remaining, 0)
+
+class CircuitBreakerTest(unittest.TestCase):
+    """Closed -> open at the threshold -> half-open probe -> closed or re-opened with a longer cooldown"""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch('lib.api_client.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(failure_threshold=3, cooldown=60, max_cooldown=100)
+
+    def _trip(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+
+    def test_opens_at_threshold(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow())
+
+    def test_success_resets_failure_count(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.is_closed())
+
+    def test_single_probe_after_cooldown(self):
+        self._trip()
+        self.clock.advance(59)
+        self.assertFalse(self.breaker.allow())
+        self.clock.advance(1)
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        # Everyone else keeps failing fast while the probe is in flight
+        self.assertFalse(self.breaker.allow())
+
+        self.breaker.record_success()
+        self.assertTrue(self.breaker.is_closed())
+        self.assertIsNone(self.breaker.get_state()['retry_at'])
+
+    def test_failed_probe_doubles_cooldown(self):
+        self._trip()
+        self.clock.advance(60)
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(self.breaker.cooldown, 100)  # Doubled, capped at max_cooldown
+        self.clock.advance(99)
+        self.assertFalse(self.breaker.allow())
+        self.clock.advance(1)
+        self.assertTrue(self.breaker.allow())
+
+        # Recovery restores the base cooldown
+        self.breaker.record_success()
+        self._trip()
+        self.assertEqual(self.breaker.cooldown, 60)
+
+    def test_release_lets_next_caller_probe(self):
+        self._trip()
+        self.clock.advance(60)
+        self.assertTrue(self.breaker.allow())
+        self.breaker.release()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertTrue(self.breaker.allow())
+
+    def test_load_state(self):
+        self._trip()
+        state = self.breaker.get_state()
+
+        # A new process adopts the open circuit and fails fast until the persisted retry time
+        restored = CircuitBreaker(failure_threshold=3, cooldown=60)
+        restored.load_state(state)
+        self.assertFalse(restored.allow())
+        self.assertEqual(restored.trips, 1)
+        self.clock.advance(60)
+        self.assertTrue(restored.allow())
+        restored.record_success()
+        self.assertTrue(restored.is_closed())
+
+        # Closed or empty state is ignored
+        fresh = CircuitBreaker()
+        fresh.load_state({'state': CircuitBreaker.CLOSED, 'retry_at': None})
+        fresh.load_state(None)
+        self.assertTrue(fresh.allow())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+#!/usr/local/bin/python3
+
+"""
+Daemon Tests
+Shutdown handling and batch storage of the daemon
+
+Run from the repository root: python3 -m unittest discover -s tests
+"""
+
+import os
+import sys
+import time
+import signal
+import tempfile
+import threading
+import unittest
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           'src', 'opnsense', 'scripts', 'AbuseIPDBChecker')
+sys.path.insert(0, SCRIPTS_DIR)
+
+from lib.config_manager import ConfigManager
+from lib.database import DatabaseManager
+from lib.daemon import DaemonManager
+
+class DaemonShutdownTest(unittest.TestCase):
+    """A shutdown signal ends the idle wait and the loop runs its cleanup"""
+
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory(prefix='abuseipdb-daemon-')
+        log_file = os.path.join(self.work_dir.name, 'latest.log')
+        open(log_file, 'w').close()
+
+        config_manager = ConfigManager()
+        config = dict(config_manager.get_config(), log_file=log_file)
+        config_manager.get_config = lambda: config
+        config_manager.reload = lambda: None
+        config_manager.validate_config = lambda: {'errors': [], 'warnings': []}
+
+        self.db = DatabaseManager(os.path.join(self.work_dir.name, 'daemon.db'))
+        self.closed = threading.Event()
+        db_close = self.db.close
+        self.db.close = lambda: (self.closed.set(), db_close())
+        self.daemon = DaemonManager(config_manager, self.db)
+        self.handlers = {signum: signal.getsignal(signum) for signum in (signal.SIGTERM, signal.SIGINT)}
+
+    def tearDown(self):
+        for signum, handler in self.handlers.items():
+            signal.signal(signum, handler)
+        self.work_dir.cleanup()
+
+    def test_signal_stops_loop_with_cleanup(self):
+        timer = threading.Timer(0.5, self.daemon._signal_handler, (signal.SIGTERM, None))
+        timer.start()
+        started = time.monotonic()
+        self.daemon.start_daemon()
+        timer.join()
+
+        # Returned well before the 60s idle back-off, through the cleanup instead of sys.exit
+        self.assertLess(time.monotonic() - started, 10)
+        self.assertTrue(self.closed.is_set())
+        self.assertIsNone(self.daemon._wake_fds)
+
+class StoreVerdictsFallbackTest(unittest.TestCase):
+    """A failing row makes the daemon store the batch one by one instead of losing it"""
+
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory(prefix='abuseipdb-daemon-')
+        self.db = DatabaseManager(os.path.join(self.work_dir.name, 'daemon.db'))
+        self.daemon = DaemonManager(ConfigManager(), self.db)
+
+    def tearDown(self):
+        self.db.close()
+        self.work_dir.cleanup()
+
+    def _verdict(self, ip, threat_level, abuse_score):
+        return {'ip': ip, 'threat_level': threat_level, 'abuse_score': abuse_score, 'country': 'NL',
+                'reports': 1, 'categories': '', 'connection_details': ''}
+
+    def test_one_failing_row(self):
+        bad = self._verdict('192.0.2.9', 2, 90)
+        del bad['country']
+        # The failing row comes first, the batch counters must still be stored once
+        verdicts = [bad, self._verdict('192.0.2.1', 2, 90), self._verdict('192.0.2.2', 0, 0)]
+        stored = self.daemon._store_verdicts(verdicts, {'daily_checks': 3, 'total_checks': 3},
+                                             {'last_check': '2026-01-01 00:00:00'})
+
+        self.assertEqual(len(stored), 3)
+        self.assertIsNone(self.db.get_checked_ip('192.0.2.9'))
+        self.assertIsNotNone(self.db.get_threat('192.0.2.1'))
+        self.assertIsNotNone(self.db.get_checked_ip('192.0.2.2'))
+        self.assertEqual(self.db.get_stat('daily_checks'), '3')
+        self.assertEqual(self.db.get_stat('total_checks'), '3')
+        self.assertEqual(self.db.get_stat('last_check'), '2026-01-01 00:00:00')
+
+    def test_counters_kept_when_every_row_fails(self):
+        bad = [self._verdict('192.0.2.8', 0, 0), self._verdict('192.0.2.9', 0, 0)]
+        for verdict in bad:
+            del verdict['country']
+        self.daemon._store_verdicts(bad, {'daily_checks': 2})
+        self.assertEqual(self.db.get_stat('daily_checks'), '2')
+
+if __name__ == '__main__':
+    unittest.main()
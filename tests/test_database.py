@@ -0,0 +1,107 @@
+#!/usr/local/bin/python3
+
+"""
+Database Tests
+Batch storage of check verdicts and counter statistics
+
+Run from the repository root: python3 -m unittest discover -s tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           'src', 'opnsense', 'scripts', 'AbuseIPDBChecker')
+sys.path.insert(0, SCRIPTS_DIR)
+
+from lib.database import DatabaseManager, STAT_INCREMENT_SQL
+
+def verdict(ip, threat_level, abuse_score=0, connection_details=''):
+    """Verdict dict as built by the daemon for write_verdicts"""
+    return {
+        'ip': ip,
+        'threat_level': threat_level,
+        'abuse_score': abuse_score,
+        'country': 'NL',
+        'reports': 2,
+        'categories': 'Port Scan',
+        'connection_details': connection_details
+    }
+
+class WriteVerdictsTest(unittest.TestCase):
+    """write_verdicts stores checked_ips, threats and stats in one transaction"""
+
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory(prefix='abuseipdb-db-')
+        self.db = DatabaseManager(os.path.join(self.work_dir.name, 'verdicts.db'))
+
+    def tearDown(self):
+        self.db.close()
+        self.work_dir.cleanup()
+
+    def test_new_ips(self):
+        previous = self.db.write_verdicts([
+            verdict('192.0.2.1', 0, 5, '192.0.2.1:22 -> 10.0.0.1:50000 (TCP)'),
+            verdict('192.0.2.2', 2, 90)
+        ])
+        self.assertEqual(previous, set())
+
+        clean = self.db.get_checked_ip('192.0.2.1')
+        self.assertEqual((clean['check_count'], clean['threat_level']), (1, 0))
+        self.assertEqual(clean['connection_details'], '192.0.2.1:22 -> 10.0.0.1:50000 (TCP)')
+        self.assertIsNone(self.db.get_threat('192.0.2.1'))
+
+        threat = self.db.get_threat('192.0.2.2')
+        self.assertEqual((threat['abuse_score'], threat['marked_safe']), (90, 0))
+
+    def test_existing_ips(self):
+        self.db.write_verdicts([verdict('192.0.2.1', 1, 50, 'a:1'), verdict('192.0.2.2', 2, 90)])
+        previous = self.db.write_verdicts([verdict('192.0.2.1', 2, 80, 'b:2'), verdict('192.0.2.2', 0, 10)])
+        self.assertEqual(previous, {'192.0.2.1', '192.0.2.2'})
+
+        updated = self.db.get_checked_ip('192.0.2.1')
+        self.assertEqual((updated['check_count'], updated['threat_level']), (2, 2))
+        self.assertEqual(set(updated['connection_details'].split('|')), {'a:1', 'b:2'})
+        self.assertEqual(self.db.get_threat('192.0.2.1')['abuse_score'], 80)
+        # No longer a threat
+        self.assertIsNone(self.db.get_threat('192.0.2.2'))
+
+    def test_marked_safe_preserved(self):
+        self.db.write_verdicts([verdict('192.0.2.3', 2, 90)])
+        self.assertTrue(self.db.mark_ip_safe('192.0.2.3'))
+        self.db.write_verdicts([verdict('192.0.2.3', 2, 95)])
+
+        threat = self.db.get_threat('192.0.2.3')
+        self.assertEqual((threat['abuse_score'], threat['marked_safe']), (95, 1))
+
+    def test_stat_increments(self):
+        self.db.write_verdicts([verdict('192.0.2.1', 0)], {'daily_checks': 2, 'total_checks': 1},
+                               {'last_check': '2026-01-01 00:00:00'})
+        self.db.write_verdicts([verdict('192.0.2.2', 0)], {'daily_checks': 3, 'total_checks': 1})
+        self.db.increment_stats({'daily_checks': 1})
+
+        self.assertEqual(self.db.get_stat('daily_checks'), '6')
+        self.assertEqual(self.db.get_stat('total_checks'), '2')
+        self.assertEqual(self.db.get_stat('last_check'), '2026-01-01 00:00:00')
+
+    def test_stat_increment_sql(self):
+        conn = self.db.get_connection()
+        with conn:
+            conn.execute(STAT_INCREMENT_SQL, ('new_counter', '4'))
+            conn.execute(STAT_INCREMENT_SQL, ('new_counter', '5'))
+        self.assertEqual(self.db.get_stat('new_counter'), '9')
+
+    def test_failed_batch_rolls_back(self):
+        bad = verdict('192.0.2.9', 0)
+        del bad['country']
+        with self.assertRaises(KeyError):
+            self.db.write_verdicts([verdict('192.0.2.1', 2, 90), bad], {'daily_checks': 1})
+
+        self.assertIsNone(self.db.get_checked_ip('192.0.2.1'))
+        self.assertIsNone(self.db.get_threat('192.0.2.1'))
+        self.assertEqual(self.db.get_stat('daily_checks', '0'), '0')
+
+if __name__ == '__main__':
+    unittest.main()
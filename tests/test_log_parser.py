@@ -0,0 +1,55 @@
+#!/usr/local/bin/python3
+
+"""
+Log Parser Tests
+Single-pass parsing of filterlog records
+
+Run from the repository root: python3 -m unittest discover -s tests
+"""
+
+import os
+import sys
+import unittest
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           'src', 'opnsense', 'scripts', 'AbuseIPDBChecker')
+sys.path.insert(0, SCRIPTS_DIR)
+
+from lib.config_manager import ConfigManager
+from lib.log_parser import FirewallLogParser, MIN_FIELDS
+
+HEADER = '<134>1 2026-06-12T10:00:00+00:00 fw filterlog 4242 - [meta sequenceId="1"] '
+TCP_FIELDS = '77,,,02f4bab031b57d1e30553ce08e0ec131,igb0,match,block,in,4,0x0,,64,12345,0,DF,6,tcp,60,45.33.32.156,192.168.1.10,51234,22,0,S,1234,,64240,,mss'
+
+class ParseRecordTest(unittest.TestCase):
+    """parse_record returns a FilterRecord for complete external→internal lines only"""
+
+    def setUp(self):
+        config = dict(ConfigManager().get_config(), lan_subnets=['192.168.1.0/24'])
+        self.parser = FirewallLogParser(config)
+
+    def test_complete_record(self):
+        record = self.parser.parse_record(HEADER + TCP_FIELDS)
+        self.assertEqual((record.action, record.protocol, record.src_ip, record.dst_ip), ('block', 6, '45.33.32.156', '192.168.1.10'))
+        self.assertEqual((record.src_port, record.dst_port), ('51234', '22'))
+        self.assertEqual(record.connection_string(), '45.33.32.156:51234 accessing 192.168.1.10:22')
+
+    def test_truncated_record(self):
+        fields = TCP_FIELDS.split(',')
+        # Cut off before the destination port, or right after the addresses
+        for count in (MIN_FIELDS - 1, MIN_FIELDS - 2):
+            with self.subTest(fields=count):
+                self.assertIsNone(self.parser.parse_record(HEADER + ','.join(fields[:count])))
+        # Exactly the port columns is enough
+        self.assertIsNotNone(self.parser.parse_record(HEADER + ','.join(fields[:MIN_FIELDS])))
+
+    def test_truncated_line_skipped_by_iter_records(self):
+        truncated = HEADER + ','.join(TCP_FIELDS.split(',')[:MIN_FIELDS - 1])
+        records = list(self.parser.iter_records([truncated, HEADER + TCP_FIELDS], apply_filters=False))
+        self.assertEqual(len(records), 1)
+
+    def test_internal_source_rejected(self):
+        self.assertIsNone(self.parser.parse_record(HEADER + TCP_FIELDS.replace('45.33.32.156', '192.168.1.20')))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,201 @@
+#!/usr/local/bin/python3
+
+"""
+Log Reader Tests
+Incremental tailing and timestamp seeking in the firewall log
+
+Run from the repository root: python3 -m unittest discover -s tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from unittest import mock
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           'src', 'opnsense', 'scripts', 'AbuseIPDBChecker')
+sys.path.insert(0, SCRIPTS_DIR)
+
+from lib.log_reader import (LogTailReader, find_offset_for_time, read_lines_between, parse_syslog_timestamp,
+                            SEEK_LINEAR_THRESHOLD)
+
+LOG_START = datetime(2026, 6, 12, 10, 0, 0, tzinfo=timezone.utc).timestamp()
+
+def write_log(path, line_count):
+    """Filter log with one line per second from LOG_START, returns (line start offsets, lines)"""
+    offsets, lines = [], []
+    position = 0
+    with open(path, 'wb') as f:
+        for index in range(line_count):
+            stamp = datetime.fromtimestamp(LOG_START + index, timezone.utc).isoformat()
+            line = f"<134>1 {stamp} fw filterlog 4242 - [meta sequenceId=\"{index}\"] 77,,,rule,igb0,match,pass,in,4,0x0\n"
+            offsets.append(position)
+            lines.append(line)
+            data = line.encode()
+            f.write(data)
+            position += len(data)
+            if index % 50 == 49:
+                # Lines without a timestamp must not confuse the search
+                position += f.write(b'continuation without timestamp\n')
+    return offsets, lines
+
+class LogTailReaderTest(unittest.TestCase):
+    """Only lines appended since the previous read, across truncation, rotation and restarts"""
+
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory(prefix='abuseipdb-tail-')
+        self.log_file = os.path.join(self.work_dir.name, 'latest.log')
+        self.state_file = os.path.join(self.work_dir.name, 'tail_state.json')
+        self._append('old 1\nold 2\n')
+
+    def tearDown(self):
+        self.work_dir.cleanup()
+
+    def _append(self, text):
+        with open(self.log_file, 'a') as f:
+            f.write(text)
+
+    def _reader(self):
+        reader = LogTailReader(self.log_file, self.state_file)
+        self.addCleanup(reader.close)
+        return reader
+
+    def test_first_start_follows_new_lines_only(self):
+        reader = self._reader()
+        self.assertEqual(reader.read_new_lines(), [])
+        self._append('new 1\nnew 2\n')
+        self.assertEqual(reader.read_new_lines(), ['new 1', 'new 2'])
+        self.assertEqual(reader.read_new_lines(), [])
+
+    def test_partial_line_held_back(self):
+        reader = self._reader()
+        reader.read_new_lines()
+        self._append('new 1\nhal')
+        self.assertEqual(reader.read_new_lines(), ['new 1'])
+        self._append('f\n')
+        self.assertEqual(reader.read_new_lines(), ['half'])
+
+    def test_truncation(self):
+        reader = self._reader()
+        reader.read_new_lines()
+        with open(self.log_file, 'w') as f:
+            f.write('fresh\n')
+        # Same inode, smaller than the offset: start over from the beginning
+        self.assertEqual(reader.read_new_lines(), ['fresh'])
+
+    def test_rotation(self):
+        reader = self._reader()
+        reader.read_new_lines()
+        self._append('before rotation\n')
+        os.rename(self.log_file, self.log_file + '.0')
+        with open(self.log_file, 'w') as f:
+            f.write('after rotation\n')
+
+        # The rest of the old file first, then the new file from its start
+        self.assertEqual(reader.read_new_lines(), ['before rotation', 'after rotation'])
+        self.assertEqual(reader.inode, os.stat(self.log_file).st_ino)
+        self._append('next\n')
+        self.assertEqual(reader.read_new_lines(), ['next'])
+
+    def test_restores_offset_from_state_file(self):
+        reader = LogTailReader(self.log_file, self.state_file)
+        reader.read_new_lines()
+        self._append('seen\n')
+        self.assertEqual(reader.read_new_lines(), ['seen'])
+        self._append('unfin')
+        reader.read_new_lines()
+        reader.close()
+
+        # Written while stopped, picked up by the next process, including the held-back partial line
+        self._append('ished\nwhile stopped\n')
+        self.assertEqual(self._reader().read_new_lines(), ['unfinished', 'while stopped'])
+
+    def test_state_of_replaced_file_ignored(self):
+        reader = LogTailReader(self.log_file, self.state_file)
+        reader.read_new_lines()
+        reader.close()
+
+        # Created before the old file is unlinked, so the inode cannot be reused
+        with open(self.log_file + '.new', 'w') as f:
+            f.write('replacement 1\n')
+        os.replace(self.log_file + '.new', self.log_file)
+        # Another inode: the saved offset does not apply, follow new activity only
+        reader = self._reader()
+        self.assertEqual(reader.read_new_lines(), [])
+        self._append('replacement 2\n')
+        self.assertEqual(reader.read_new_lines(), ['replacement 2'])
+
+class FindOffsetForTimeTest(unittest.TestCase):
+    """Linear scan below SEEK_LINEAR_THRESHOLD bytes, binary search above"""
+
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory(prefix='abuseipdb-log-')
+
+    def tearDown(self):
+        self.work_dir.cleanup()
+
+    def _log(self, line_count):
+        path = os.path.join(self.work_dir.name, f'filter_{line_count}.log')
+        offsets, lines = write_log(path, line_count)
+        return path, offsets, lines
+
+    def _check_offsets(self, path, offsets):
+        last = len(offsets) - 1
+        self.assertEqual(find_offset_for_time(path, LOG_START), 0)
+        self.assertEqual(find_offset_for_time(path, LOG_START + last), offsets[last])
+        self.assertEqual(find_offset_for_time(path, LOG_START - 3600), 0)
+        self.assertEqual(find_offset_for_time(path, LOG_START + last + 1), os.path.getsize(path))
+        # Between two lines: the next one
+        self.assertEqual(find_offset_for_time(path, LOG_START + 6.5), offsets[7])
+
+    def test_small_file(self):
+        path, offsets, _ = self._log(20)
+        self.assertLess(os.path.getsize(path), SEEK_LINEAR_THRESHOLD)
+        self._check_offsets(path, offsets)
+
+    def test_large_file(self):
+        path, offsets, _ = self._log(3000)
+        self.assertGreater(os.path.getsize(path), 10 * SEEK_LINEAR_THRESHOLD)
+        self._check_offsets(path, offsets)
+        # Every line start is found, including right after untimestamped lines
+        for index in range(0, 3000, 37):
+            self.assertEqual(find_offset_for_time(path, LOG_START + index), offsets[index])
+
+    def test_read_lines_between(self):
+        path, _, lines = self._log(3000)
+        self.assertEqual(list(read_lines_between(path, LOG_START + 1200, LOG_START + 1204)), lines[1200:1205])
+        self.assertEqual(list(read_lines_between(path, LOG_START - 60, LOG_START + 1)), lines[:2])
+        # Through to the end of the file, untimestamped lines included
+        self.assertEqual(list(read_lines_between(path, LOG_START + 2998)),
+                         lines[2998:] + ['continuation without timestamp\n'])
+        self.assertEqual(list(read_lines_between(path, LOG_START + 3000)), [])
+
+class ParseSyslogTimestampTest(unittest.TestCase):
+    """RFC 5424 and BSD timestamps"""
+
+    def test_rfc5424(self):
+        self.assertEqual(parse_syslog_timestamp('<134>1 2026-06-12T10:00:00+00:00 fw filterlog'), LOG_START)
+        self.assertEqual(parse_syslog_timestamp('<134>1 2026-06-12T12:00:00+02:00 fw filterlog'), LOG_START)
+        self.assertEqual(parse_syslog_timestamp('2026-06-12T10:00:00Z fw filterlog'), LOG_START)
+
+    def test_unparsable(self):
+        self.assertIsNone(parse_syslog_timestamp('continuation without timestamp'))
+        self.assertIsNone(parse_syslog_timestamp(''))
+
+    def test_bsd_year_rollover(self):
+        class NewYear(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return cls(2026, 1, 1, 0, 5, 0)
+
+        with mock.patch('lib.log_reader.datetime', NewYear):
+            # December entries read just after midnight belong to the previous year
+            self.assertEqual(parse_syslog_timestamp('Dec 31 23:59:59 fw filterlog: 77,,,rule'),
+                             datetime(2025, 12, 31, 23, 59, 59).timestamp())
+            self.assertEqual(parse_syslog_timestamp('Jan  1 00:01:00 fw filterlog: 77,,,rule'),
+                             datetime(2026, 1, 1, 0, 1, 0).timestamp())
+
+if __name__ == '__main__':
+    unittest.main()
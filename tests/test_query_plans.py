@@ -0,0 +1,69 @@
+#!/usr/local/bin/python3
+
+"""
+Query Plan Tests
+Fail when a hot UI/daemon query stops using an index on a populated database
+
+Run from the repository root: python3 -m unittest discover -s tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           'src', 'opnsense', 'scripts', 'AbuseIPDBChecker')
+sys.path.insert(0, SCRIPTS_DIR)
+
+import benchmark
+from lib.database import DatabaseManager
+
+PLAN_TEST_ROWS = 100000  # Enough rows for realistic threats/marked safe partitions, seeds in a few seconds
+
+class QueryPlanTest(unittest.TestCase):
+    """EXPLAIN QUERY PLAN of every hot query path, as run by benchmark.py plans"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.work_dir = tempfile.TemporaryDirectory(prefix='abuseipdb-plans-')
+        db_file = os.path.join(cls.work_dir.name, 'plans.db')
+        benchmark._seed_database(db_file, False, PLAN_TEST_ROWS)
+
+        db = DatabaseManager(db_file)
+        conn = db.get_connection()
+        statements = []
+        # Bound parameters are inlined in traced statements, so each can be explained as is
+        conn.set_trace_callback(statements.append)
+        try:
+            benchmark._run_hot_queries(db)
+        finally:
+            conn.set_trace_callback(None)
+
+        cls.plans = [
+            (' '.join(statement.split()), [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {statement}')])
+            for statement in statements if statement.lstrip().upper().startswith('SELECT')
+        ]
+        db.close()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.work_dir.cleanup()
+
+    def test_hot_queries_traced(self):
+        """Every page, count and export query was captured"""
+        self.assertGreaterEqual(len(self.plans), 20)
+
+    def test_no_full_scans_or_temp_sorts(self):
+        """No SCAN without an index and no temp B-tree sort on large tables"""
+        for query, plan in self.plans:
+            with self.subTest(query=query[:120]):
+                self.assertEqual(benchmark._plan_violations(plan), [], f"{query}\n{plan}")
+
+    def test_cursor_pages_seek(self):
+        """Keyset pages seek on the (timestamp, ip) row value instead of skipping rows"""
+        seeks = [detail for _, plan in self.plans for detail in plan if ',ip)<(' in detail or ',ip)>(' in detail]
+        self.assertEqual(len(seeks), 4, seeks)
+
+if __name__ == '__main__':
+    unittest.main()
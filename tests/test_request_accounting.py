@@ -0,0 +1,119 @@
+#!/usr/local/bin/python3
+
+"""
+Request Accounting Tests
+Every AbuseIPDB request, background revalidations included, is counted in daily_checks exactly once
+
+Run from the repository root: python3 -m unittest discover -s tests
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+import unittest
+from unittest import mock
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           'src', 'opnsense', 'scripts', 'AbuseIPDBChecker')
+sys.path.insert(0, SCRIPTS_DIR)
+
+import requests
+from lib.config_manager import ConfigManager
+from lib.database import DatabaseManager
+from lib.daemon import DaemonManager
+from lib.api_client import AbuseIPDBClient
+
+STALE_IP = '203.0.113.10'
+
+def _response(data):
+    """Mock 200 API response carrying the given 'data' object"""
+    response = mock.Mock(status_code=200, headers={})
+    response.json.return_value = {'data': data}
+    return response
+
+def _check_response(ip, score):
+    """Mock 200 response of the check endpoint"""
+    return _response({'ipAddress': ip, 'abuseConfidenceScore': score, 'countryCode': 'NL', 'totalReports': 3})
+
+class RevalidationAccountingTest(unittest.TestCase):
+    """A stale cache hit inside a daemon batch spends one request and counts it once"""
+
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory(prefix='abuseipdb-accounting-')
+        self.db = DatabaseManager(os.path.join(self.work_dir.name, 'accounting.db'))
+
+        config_manager = ConfigManager()
+        self.config = dict(config_manager.get_config(), api_key='test-key', blacklist_enabled=False,
+                           api_use_asyncio=False, daily_check_limit=1000)
+        config_manager.get_config = lambda: self.config
+        self.daemon = DaemonManager(config_manager, self.db)
+
+        # Expired an hour ago, still inside the stale window
+        now = int(time.time())
+        report = {'ipAddress': STALE_IP, 'abuseConfidenceScore': 0, 'countryCode': 'NL', 'totalReports': 0}
+        self.db.store_api_cache_entry(STALE_IP, json.dumps(report), False, now - 7200, now - 3600)
+
+    def tearDown(self):
+        self.db.close()
+        self.work_dir.cleanup()
+
+    def test_stale_entry_counted_once(self):
+        store_batch = self.daemon._store_batch
+
+        def store_after_revalidation(verdicts, api_requests, api_client):
+            # Worst case for double counting: the refresh lands before the batch is stored
+            api_client.cache.wait()
+            return store_batch(verdicts, api_client.take_request_count() + api_requests, api_client)
+
+        self.daemon._store_batch = store_after_revalidation
+        with mock.patch.object(requests.Session, 'get', return_value=_check_response(STALE_IP, 80)) as get:
+            result = self.daemon._check_ips_with_api_and_connections(
+                {STALE_IP: ['203.0.113.10:443 -> 192.0.2.1:55000 (TCP)']}, self.config)
+            # Same as daemon shutdown: let the revalidation finish, then count what the batch missed
+            self.daemon.api_client.close()
+            self.daemon._count_remaining_requests(self.daemon.api_client)
+
+        self.assertEqual(result['ips_checked'], 1)
+        self.assertEqual(get.call_count, 1)
+        self.assertEqual(int(self.db.get_stat('daily_checks', '0')), 1)
+        # The refreshed response replaced the stale one
+        refreshed = self.db.get_api_cache_entry(STALE_IP)
+        self.assertGreater(refreshed['expires_at'], time.time())
+        self.assertEqual(json.loads(refreshed['report'])['abuseConfidenceScore'], 80)
+
+class EndpointMeteringTest(unittest.TestCase):
+    """request_count, which feeds daily_checks, counts exactly the requests the bucket charged to daily_used"""
+
+    def setUp(self):
+        config = dict(ConfigManager().get_config(), api_key='test-key', blacklist_enabled=False, daily_check_limit=1000)
+        self.client = AbuseIPDBClient(config)
+        self.client.rate_limiter.sync_quota(500, time.time() + 3600)
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_check_is_metered_and_tracks_quota(self):
+        with mock.patch.object(requests.Session, 'get', return_value=_check_response(STALE_IP, 0)):
+            self.client.fetch_report(STALE_IP)
+        self.assertEqual(self.client.request_count, 1)
+        self.assertEqual(self.client.rate_limiter.daily_used, 1)
+        self.assertEqual(self.client.rate_limiter.quota_remaining, 499)
+
+    def test_check_block_is_metered_outside_check_quota(self):
+        with mock.patch.object(requests.Session, 'get', return_value=_response({'reportedAddress': []})):
+            self.client.check_block('203.0.113.0/24')
+        self.assertEqual(self.client.request_count, 1)
+        self.assertEqual(self.client.rate_limiter.daily_used, 1)
+        self.assertEqual(self.client.rate_limiter.quota_remaining, 500)
+
+    def test_blacklist_is_unmetered(self):
+        with mock.patch.object(requests.Session, 'get', return_value=_response([])):
+            self.client.fetch_blacklist()
+        self.assertEqual(self.client.request_count, 0)
+        self.assertEqual(self.client.rate_limiter.daily_used, 0)
+        self.assertEqual(self.client.take_request_count(), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+#!/usr/local/bin/python3
+
+"""
+Response Cache Tests
+Cross-process lookup leases and reuse of a response stored by the lease holder
+
+Run from the repository root: python3 -m unittest discover -s tests
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           'src', 'opnsense', 'scripts', 'AbuseIPDBChecker')
+sys.path.insert(0, SCRIPTS_DIR)
+
+import requests
+from lib.config_manager import ConfigManager
+from lib.database import DatabaseManager
+from lib.api_client import AbuseIPDBClient
+from lib.response_cache import ResponseCache, CACHE_FRESH, CACHE_NEGATIVE
+
+IP = '198.51.100.7'
+REPORT = {'ipAddress': IP, 'abuseConfidenceScore': 12, 'countryCode': 'DE', 'totalReports': 1}
+
+class LookupLeaseTest(unittest.TestCase):
+    """Two processes, each with its own connection to the same database"""
+
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory(prefix='abuseipdb-cache-')
+        db_file = os.path.join(self.work_dir.name, 'cache.db')
+        self.config = dict(ConfigManager().get_config(), api_key='test-key', blacklist_enabled=False,
+                           api_inflight_lease_seconds=60)
+        self.db_a = DatabaseManager(db_file)
+        self.db_b = DatabaseManager(db_file)
+        self.cache_a = ResponseCache(self.db_a, self.config)
+        self.cache_b = ResponseCache(self.db_b, self.config)
+
+    def tearDown(self):
+        self.db_a.close()
+        self.db_b.close()
+        self.work_dir.cleanup()
+
+    def test_second_acquirer_refused(self):
+        token = self.cache_a.acquire_lease(IP)
+        self.assertIsNotNone(token)
+        self.assertIsNone(self.cache_b.acquire_lease(IP))
+        # Leases are per IP
+        self.assertIsNotNone(self.cache_b.acquire_lease('198.51.100.8'))
+
+        self.cache_a.release_lease(IP, token)
+        self.assertIsNotNone(self.cache_b.acquire_lease(IP))
+
+    def test_tokens_unique_per_acquisition(self):
+        token = self.cache_a.acquire_lease(IP)
+        self.cache_a.release_lease(IP, token)
+        self.assertNotEqual(self.cache_a.acquire_lease(IP), token)
+
+    def test_release_with_wrong_token_is_noop(self):
+        token = self.cache_a.acquire_lease(IP)
+        self.cache_b.release_lease(IP, token + 'x')
+        self.assertIsNone(self.cache_b.acquire_lease(IP))
+
+    def test_expired_lease_stolen(self):
+        stale_token = self.cache_a.acquire_lease(IP)
+        with mock.patch('lib.database.time.time', return_value=time.time() + 61):
+            token = self.cache_b.acquire_lease(IP)
+        self.assertIsNotNone(token)
+
+        # The previous holder's late release leaves the new lease in place
+        self.cache_a.release_lease(IP, stale_token)
+        self.assertIsNone(self.cache_a.acquire_lease(IP))
+        self.cache_b.release_lease(IP, token)
+        self.assertIsNotNone(self.cache_a.acquire_lease(IP))
+
+    def test_shared_result_fresh_or_negative_only(self):
+        self.assertIsNone(self.cache_b.shared_result(IP))
+
+        now = int(time.time())
+        self.db_a.store_api_cache_entry(IP, json.dumps(REPORT), False, now - 7200, now - 3600)
+        self.assertIsNone(self.cache_b.shared_result(IP))  # Stale, still waiting on the holder
+
+        self.cache_a.store(IP, REPORT)
+        self.assertEqual(self.cache_b.shared_result(IP), (CACHE_FRESH, REPORT))
+
+        self.cache_a.store_invalid(IP)
+        self.assertEqual(self.cache_b.shared_result(IP), (CACHE_NEGATIVE, None))
+
+    def test_waiter_reuses_holder_response(self):
+        client = AbuseIPDBClient(self.config)
+        client.cache = self.cache_b
+        token = self.cache_a.acquire_lease(IP)
+
+        def finish_lookup():
+            self.cache_a.store(IP, REPORT)
+            self.cache_a.release_lease(IP, token)
+
+        holder = threading.Timer(0.3, finish_lookup)
+        holder.start()
+        try:
+            with mock.patch.object(requests.Session, 'get') as get:
+                report, api_requests = client._fetch_report(IP)
+        finally:
+            holder.join()
+            client.close()
+
+        self.assertEqual(report, REPORT)
+        self.assertEqual(api_requests, 0)
+        get.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+#!/usr/local/bin/python3
+
+"""
+Scheduler Tests
+Priority order of pending IPs and the cut-off once the API budget is smaller than the queue
+
+Run from the repository root: python3 -m unittest discover -s tests
+"""
+
+import os
+import sys
+import time
+import tempfile
+import unittest
+from unittest import mock
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           'src', 'opnsense', 'scripts', 'AbuseIPDBChecker')
+sys.path.insert(0, SCRIPTS_DIR)
+
+import requests
+from lib.config_manager import ConfigManager
+from lib.database import DatabaseManager
+from lib.daemon import DaemonManager
+from lib.scheduler import PriorityScheduler
+
+def pending(hits=1, ports=(443,), age=0):
+    """Pending IP entry as collected by the daemon"""
+    return {
+        'ports': [f'10.0.0.1:{port}' for port in ports],
+        'hits': hits,
+        'last_seen': time.time() - age
+    }
+
+class PriorityOrderTest(unittest.TestCase):
+    """Weights: threat history, hit count, port spread, sensitive ports and recency"""
+
+    def setUp(self):
+        self.db = mock.Mock()
+        self.db.get_threat_ip_set.return_value = set()
+        self.scheduler = PriorityScheduler(self.db)
+
+    def test_known_threat_first(self):
+        ordered = self.scheduler.prioritize({'192.0.2.1': pending(), '192.0.2.2': pending()}, {'192.0.2.2'})
+        self.assertEqual(list(ordered), ['192.0.2.2', '192.0.2.1'])
+        # Given threat history is used as is
+        self.db.get_threat_ip_set.assert_not_called()
+
+    def test_threat_history_loaded_when_not_given(self):
+        self.db.get_threat_ip_set.return_value = {'192.0.2.2'}
+        ordered = self.scheduler.prioritize({'192.0.2.1': pending(), '192.0.2.2': pending()})
+        self.assertEqual(list(ordered), ['192.0.2.2', '192.0.2.1'])
+
+    def test_hit_count_first(self):
+        ordered = self.scheduler.prioritize({
+            '192.0.2.1': pending(hits=1),
+            '192.0.2.2': pending(hits=200),
+            '192.0.2.3': pending(hits=10)
+        }, set())
+        self.assertEqual(list(ordered), ['192.0.2.2', '192.0.2.3', '192.0.2.1'])
+
+    def test_sensitive_ports_and_spread(self):
+        ordered = self.scheduler.prioritize({
+            '192.0.2.1': pending(ports=(443,)),
+            '192.0.2.2': pending(ports=(22,)),
+            '192.0.2.3': pending(ports=(80, 443, 8080, 8443))
+        }, set())
+        self.assertEqual(list(ordered)[0], '192.0.2.2')
+        self.assertEqual(list(ordered)[-1], '192.0.2.1')
+
+    def test_recent_first(self):
+        ordered = self.scheduler.prioritize({'192.0.2.1': pending(age=7200), '192.0.2.2': pending(age=0)}, set())
+        self.assertEqual(list(ordered), ['192.0.2.2', '192.0.2.1'])
+
+    def test_entries_kept(self):
+        entries = {'192.0.2.1': pending(), '192.0.2.2': pending(hits=5)}
+        ordered = self.scheduler.prioritize(entries, set())
+        self.assertEqual(ordered, entries)
+
+class BudgetCutoffTest(unittest.TestCase):
+    """With fewer checks available than pending IPs only the top ones reach the API"""
+
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory(prefix='abuseipdb-scheduler-')
+        self.db = DatabaseManager(os.path.join(self.work_dir.name, 'scheduler.db'))
+        config_manager = ConfigManager()
+        self.config = dict(config_manager.get_config(), api_key='test-key', blacklist_enabled=False,
+                           api_use_asyncio=False, daily_check_limit=1000)
+        config_manager.get_config = lambda: self.config
+        self.daemon = DaemonManager(config_manager, self.db)
+
+    def tearDown(self):
+        if self.daemon.api_client:
+            self.daemon.api_client.close()
+        self.db.close()
+        self.work_dir.cleanup()
+
+    def test_max_checks_below_pending(self):
+        # One IP per /24, so every IP costs one check request
+        entries = {f'198.51.{index}.7': pending(hits=2 ** index) for index in range(5)}
+        ordered = PriorityScheduler(self.db).prioritize(entries, self.daemon._get_threat_ips())
+
+        def check(url, params=None, timeout=None):
+            response = mock.Mock(status_code=200, headers={})
+            response.json.return_value = {'data': {'ipAddress': params['ipAddress'], 'abuseConfidenceScore': 0,
+                                                   'countryCode': 'NL', 'totalReports': 0}}
+            return response
+
+        with mock.patch.object(requests.Session, 'get', side_effect=check) as get:
+            result = self.daemon._check_ips_with_api_and_connections(ordered, self.config, max_checks=2)
+
+        requested = {call.kwargs['params']['ipAddress'] for call in get.call_args_list}
+        self.assertEqual(requested, {'198.51.4.7', '198.51.3.7'})
+        self.assertEqual(result['ips_checked'], 2)
+        self.assertEqual(result['deferred'], ['198.51.2.7', '198.51.1.7', '198.51.0.7'])
+        self.assertEqual(self.db.get_stat('daily_checks'), '2')
+
+    def test_threat_history_follows_stored_verdicts(self):
+        self.assertEqual(self.daemon._get_threat_ips(), set())
+        verdict = {'ip': '192.0.2.1', 'threat_level': 2, 'abuse_score': 90, 'country': 'NL',
+                   'reports': 1, 'categories': '', 'connection_details': ''}
+        self.daemon._store_verdicts([verdict])
+        self.assertEqual(self.daemon._get_threat_ips(), {'192.0.2.1'})
+
+        self.daemon._store_verdicts([dict(verdict, threat_level=0, abuse_score=0)])
+        self.assertEqual(self.daemon._get_threat_ips(), set())
+
+if __name__ == '__main__':
+    unittest.main()